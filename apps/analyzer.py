@@ -1,9 +1,199 @@
 import streamlit as st
 import pandas as pd
 import os
+import io
 import re
+import numpy as np
 from collections import Counter
-from config import JINLING_ROOM_TYPES, YATAI_ROOM_TYPES, APP_NAME
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from config import APP_NAME
+from utils import lookup_buildings
+
+# ==============================================================================
+# --- [团队到店统计] 报表解析 ---
+# ==============================================================================
+GROUP_HEADER_MARK = '团体名称:'
+GROUP_DESC_MARK = '团体/单位/旅行社/订房中心：'
+MARKET_CODE_MARK = '市场码：'
+COLUMN_HEADER_MARKS = ('房号', '姓名', '人数')
+SUBTOTAL_MARK = '小计'
+GROUP_NAME_PATTERN = r'团体名称:\s*(.*?)(?:\s*市场码：|$)'
+GROUP_DESC_PATTERN = r'团体/单位/旅行社/订房中心：(.*)'
+MARKET_CODE_PATTERN = r'市场码：\s*([\w-]+)'
+UNKNOWN_GROUP_NAME = "未知团队"
+UNPARSED_GROUP_NAME = "未知团队(解析失败)"
+NO_MARKET_CODE = "无"
+# 操，报表少于这个数就直接串行跑，起进程池的开销不划算
+TEAM_REPORT_POOL_MIN_FILES = 3
+
+def build_row_strings(df_raw):
+    """操，每行非空单元格去空格后用空格连起来，整张表一次 stack + groupby 搞定。"""
+    cells = df_raw.stack().dropna().astype(str).str.strip()
+    cells = cells[cells != '']
+    row_str = cells.groupby(level=0).agg(' '.join)
+    return row_str.reindex(df_raw.index, fill_value='')
+
+def parse_team_report(df_raw):
+    """
+    操，把一张团队报表 (header=None 按文本读进来的) 解析成预订明细表，每行带 团队名称、市场码。
+    行的种类按优先级打标签：团体名称行 > 团体描述行 > 市场码行 > 列标题行 > 其他；
+    团队名称、市场码、"本团已经出现过列标题" 都用 ffill 往下带，其他行里不是小计的就是预订行。
+    列位置用文件最后一个团队的列标题 (跟以前逐行解析的结果一致)。没有预订行返回空表。
+    """
+    row_str = build_row_strings(df_raw)
+    non_empty = row_str != ''
+    is_group = non_empty & row_str.str.contains(GROUP_HEADER_MARK, regex=False)
+    is_desc = non_empty & ~is_group & row_str.str.contains(GROUP_DESC_MARK, regex=False)
+    is_market = non_empty & ~is_group & ~is_desc & row_str.str.contains(MARKET_CODE_MARK, regex=False)
+    is_header = non_empty & ~is_group & ~is_desc & ~is_market
+    for mark in COLUMN_HEADER_MARKS:
+        is_header &= row_str.str.contains(mark, regex=False)
+    is_other = non_empty & ~(is_group | is_desc | is_market | is_header)
+    group_id = is_group.cumsum()
+
+    # --- 团队名称：团体名称行给基础名，描述行在本团内往后累加 ---
+    base_name = pd.Series(np.nan, index=df_raw.index, dtype=object)
+    base_name[is_group] = row_str[is_group].str.extract(GROUP_NAME_PATTERN, expand=False).str.strip().fillna(UNPARSED_GROUP_NAME)
+    base_name = base_name.ffill().fillna(UNKNOWN_GROUP_NAME)
+
+    name_suffix = pd.Series(np.nan, index=df_raw.index, dtype=object)
+    name_suffix[is_group] = ''
+    desc_text = row_str[is_desc].str.extract(GROUP_DESC_PATTERN, expand=False)
+    running_suffix = {}
+    for idx, desc in desc_text[desc_text.notna() & (desc_text != '')].items():
+        # 操，描述行一张表就几行，这里逐行累加无所谓
+        running_suffix[group_id[idx]] = running_suffix.get(group_id[idx], '') + " " + desc.strip()
+        name_suffix[idx] = running_suffix[group_id[idx]]
+    group_name = base_name + name_suffix.ffill().fillna('')
+
+    # --- 市场码：团体名称行先重置成"无"再看本行有没有，市场码行有就覆盖 ---
+    market_code = pd.Series(np.nan, index=df_raw.index, dtype=object)
+    market_code[is_group] = row_str[is_group].str.extract(MARKET_CODE_PATTERN, expand=False).str.strip().fillna(NO_MARKET_CODE)
+    market_rows = row_str[is_market].str.extract(MARKET_CODE_PATTERN, expand=False).str.strip().dropna()
+    market_code[market_rows.index] = market_rows
+    market_code = market_code.ffill().fillna(NO_MARKET_CODE)
+
+    # --- 预订行：本团出现过列标题之后、不是小计的其他行 ---
+    header_seen = pd.Series(np.nan, index=df_raw.index)
+    header_seen[is_group] = 0
+    header_seen[is_header] = 1
+    header_seen = header_seen.ffill().fillna(0).astype(bool)
+    is_booking = is_other & header_seen & ~row_str.str.contains(SUBTOTAL_MARK, regex=False)
+    if not is_booking.any():
+        return pd.DataFrame()
+
+    column_map = {}
+    last_group_headers = df_raw[is_header & (group_id == group_id.iloc[-1])]
+    for _, row in last_group_headers.iterrows():
+        for i, col in enumerate(row):
+            if pd.notna(col):
+                column_map[re.sub(r'\s+', '', str(col))] = i
+
+    booking_rows = df_raw[is_booking]
+    columns = {'团队名称': group_name[is_booking], '市场码': market_code[is_booking]}
+    for col_name, col_index in column_map.items():
+        columns[col_name] = booking_rows.iloc[:, col_index]
+    return pd.DataFrame(columns).reset_index(drop=True)
+
+def summarize_team_bookings(file_base_name, df, unknown_codes_collection):
+    """按文件名决定有效状态，统计总房数/人数和会议团、GTO 的楼栋分布，返回一行结论。"""
+    df['状态'] = df['状态'].astype(str).str.strip()
+
+    if '在住' in file_base_name:
+        valid_statuses = ['R', 'I']
+    elif '离店' in file_base_name or '次日离店' in file_base_name or '后天' in file_base_name:
+        valid_statuses = ['I', 'R', 'O']
+    else:
+        valid_statuses = ['R']
+
+    df_active = df[df['状态'].isin(valid_statuses)].copy()
+
+    df_counted = df_active.copy()
+    df_counted['房数'] = pd.to_numeric(df_counted['房数'], errors='coerce').fillna(0)
+    df_counted['人数'] = pd.to_numeric(df_counted['人数'], errors='coerce').fillna(0)
+    df_counted['房类'] = df_counted['房类'].astype(str).str.strip()
+
+    total_rooms = int(df_counted['房数'].sum())
+    total_guests = int(df_counted['人数'].sum())
+
+    # 操，楼栋统一查房型目录，目录里没有的代码记进未知房型
+    df_counted['准确楼栋'] = lookup_buildings(df_counted['房类'], unknown_codes_collection)
+
+    meeting_df = df_counted[df_counted['市场码'].str.startswith(('MGM', 'MTC'), na=False)].copy()
+    meeting_group_count = int(meeting_df['团队名称'].nunique())
+    total_meeting_rooms = int(meeting_df['房数'].sum())
+    meeting_jinling_rooms = int(meeting_df[meeting_df['准确楼栋'] == '金陵楼']['房数'].sum())
+    meeting_yatai_rooms = int(meeting_df[meeting_df['准确楼栋'] == '亚太楼']['房数'].sum())
+
+    gto_df = df_counted[df_counted['市场码'].str.startswith('GTO', na=False)].copy()
+    gto_group_count = int(gto_df['团队名称'].nunique())
+    total_gto_rooms = int(gto_df['房数'].sum())
+    gto_jinling_rooms = int(gto_df[gto_df['准确楼栋'] == '金陵楼']['房数'].sum())
+    gto_yatai_rooms = int(gto_df[gto_df['准确楼栋'] == '亚太楼']['房数'].sum())
+
+    summary_parts = [f"【{file_base_name}】: 有效总房数 {total_rooms} 间 (共 {total_guests} 人)"]
+    if meeting_group_count > 0:
+        summary_parts.append(f"，其中会议/公司团队房({meeting_group_count}个, 共{total_meeting_rooms}间)分布: 金陵楼 {meeting_jinling_rooms} 间, 亚太楼 {meeting_yatai_rooms} 间.")
+    else:
+        summary_parts.append("，(无会议/公司团队房).")
+    if total_gto_rooms > 0:
+        summary_parts.append(f" | 旅行社(GTO)房({gto_group_count}个, {total_gto_rooms}间)分布: 金陵楼 {gto_jinling_rooms} 间, 亚太楼 {gto_yatai_rooms} 间.")
+    else:
+        summary_parts.append(" | (无GTO旅行社房).")
+
+    return "".join(summary_parts)
+
+def analyze_team_report(file_name, file_content):
+    """
+    操，单个报表从内存里的字节直接解析统计，不落临时文件。进程池里跑，别碰 st。
+    返回 (这个文件的结论, 这个文件里的未知房型 Counter)。
+    """
+    file_base_name = os.path.splitext(os.path.basename(file_name))[0]
+    unknown_codes = Counter()
+    try:
+        df_raw = pd.read_excel(io.BytesIO(file_content), header=None, dtype=str)
+        df = parse_team_report(df_raw)
+        if df.empty:
+            return f"【{file_base_name}】: 未解析到有效预订数据行。总房数 0 间。", unknown_codes
+        return summarize_team_bookings(file_base_name, df, unknown_codes), unknown_codes
+    except Exception as e:
+        return f"【{file_base_name}】处理失败，操，出错了: {e}", unknown_codes
+
+def iter_team_report_analyses(named_contents, max_workers=None):
+    """
+    批量分析报表：文件多就丢进进程池并行跑，少就串行。
+    named_contents 是 [(文件名, 字节内容), ...]，按完成顺序逐个 yield (原来的位置, 结论, 未知房型 Counter)。
+    """
+    if len(named_contents) < TEAM_REPORT_POOL_MIN_FILES:
+        for position, (file_name, file_content) in enumerate(named_contents):
+            yield (position, *analyze_team_report(file_name, file_content))
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(analyze_team_report, file_name, file_content): position
+            for position, (file_name, file_content) in enumerate(named_contents)
+        }
+        for future in as_completed(futures):
+            yield (futures[future], *future.result())
+
+def analyze_reports_ultimate(named_contents, max_workers=None, progress_callback=None):
+    """
+    智能解析并动态定位列，对包含多个团队的Excel报告进行详细统计。
+    操，逻辑还是你原来那套，解析改成整表向量化，多个文件并行跑，结论按上传顺序排好，未知房型合并计数。
+    progress_callback(已完成数, 总数) 每做完一个文件调一次，给界面刷进度条用。
+    """
+    unknown_codes_collection = Counter()
+    if not named_contents:
+        return ["未上传任何文件进行分析。"], unknown_codes_collection
+
+    final_summary_lines = [None] * len(named_contents)
+    for done_count, (position, summary_line, unknown_codes) in enumerate(iter_team_report_analyses(named_contents, max_workers), start=1):
+        final_summary_lines[position] = summary_line
+        unknown_codes_collection.update(unknown_codes)
+        if progress_callback:
+            progress_callback(done_count, len(named_contents))
+    return final_summary_lines, unknown_codes_collection
 
 def run_analyzer_app():
     """Renders the Streamlit UI for the Team Arrival Statistics tool."""
@@ -17,150 +207,17 @@ def run_analyzer_app():
         key="analyzer_uploader"
     )
 
-    def analyze_reports_ultimate(file_paths):
-        """
-        智能解析并动态定位列，对包含多个团队的Excel报告进行详细统计。
-        操，这段代码现在用回你原来那个牛逼的逻辑了，保证好使。
-        """
-        jinling_room_types = JINLING_ROOM_TYPES
-        yatai_room_types = YATAI_ROOM_TYPES
-        unknown_codes_collection = Counter()
-        final_summary_lines = []
-
-        if not file_paths:
-            return ["未上传任何文件进行分析。"], unknown_codes_collection
-        
-        for file_path in file_paths:
-            file_base_name = os.path.splitext(os.path.basename(file_path))[0]
-            try:
-                df_raw = pd.read_excel(file_path, header=None, dtype=str)
-                all_bookings = []
-                current_group_name = "未知团队"
-                current_market_code = "无"
-                column_map = {}
-                header_row_index = -1
-
-                for index, row in df_raw.iterrows():
-                    row_str = ' '.join(str(cell).strip() for cell in row.dropna() if str(cell).strip())
-                    if not row_str:
-                        continue
-
-                    if '团体名称:' in row_str:
-                        match = re.search(r'团体名称:\s*(.*?)(?:\s*市场码：|$)', row_str)
-                        current_group_name = match.group(1).strip() if match else "未知团队(解析失败)"
-                        column_map, header_row_index, current_market_code = {}, -1, "无"
-                        
-                        market_match = re.search(r'市场码：\s*([\w-]+)', row_str)
-                        if market_match:
-                            current_market_code = market_match.group(1).strip()
-                        continue
-                    
-                    if '团体/单位/旅行社/订房中心：' in row_str:
-                        desc_match = re.search(r'团体/单位/旅行社/订房中心：(.*)', row_str)
-                        if desc_match and desc_match.group(1):
-                            current_group_name += " " + desc_match.group(1).strip()
-                        continue
-
-                    if '市场码：' in row_str and not '团体名称:' in row_str:
-                        match = re.search(r'市场码：\s*([\w-]+)', row_str)
-                        if match:
-                            current_market_code = match.group(1).strip()
-                        continue
-
-                    if '房号' in row_str and '姓名' in row_str and '人数' in row_str:
-                        header_row_index = index
-                        for i, col in enumerate(row):
-                            if pd.notna(col):
-                                column_map[re.sub(r'\s+', '', str(col))] = i
-                        continue
-
-                    if header_row_index != -1 and index > header_row_index and not row.dropna().empty:
-                        if '小计' not in row_str:
-                            all_bookings.append({'团队名称': current_group_name, '市场码': current_market_code, 'data': row})
-                
-                if not all_bookings:
-                    final_summary_lines.append(f"【{file_base_name}】: 未解析到有效预订数据行。总房数 0 间。")
-                    continue 
-
-                processed_rows = []
-                for item in all_bookings:
-                    row_data = item['data']
-                    processed_row = {'团队名称': item['团队名称'], '市场码': item['市场码']}
-                    for col_name, col_index in column_map.items():
-                        processed_row[col_name] = row_data.get(col_index)
-                    processed_rows.append(processed_row)
-                df = pd.DataFrame(processed_rows)
-
-                df['状态'] = df['状态'].astype(str).str.strip()
-                
-                if '在住' in file_base_name:
-                    valid_statuses = ['R', 'I']
-                elif '离店' in file_base_name or '次日离店' in file_base_name or '后天' in file_base_name:
-                    valid_statuses = ['I', 'R', 'O']
-                else:
-                    valid_statuses = ['R']
-                
-                df_active = df[df['状态'].isin(valid_statuses)].copy()
-
-                df_counted = df_active.copy()
-                df_counted['房数'] = pd.to_numeric(df_counted['房数'], errors='coerce').fillna(0)
-                df_counted['人数'] = pd.to_numeric(df_counted['人数'], errors='coerce').fillna(0)
-                df_counted['房类'] = df_counted['房类'].astype(str).str.strip()
-
-                total_rooms = int(df_counted['房数'].sum())
-                total_guests = int(df_counted['人数'].sum())
-
-                def assign_building(room_type):
-                    if room_type in yatai_room_types: return '亚太楼'
-                    if room_type in jinling_room_types: return '金陵楼'
-                    if room_type and room_type.lower() != 'nan':
-                        unknown_codes_collection.update([room_type])
-                    return '其他楼'
-                df_counted['准确楼栋'] = df_counted['房类'].apply(assign_building)
-
-                meeting_df = df_counted[df_counted['市场码'].str.startswith(('MGM', 'MTC'), na=False)].copy()
-                meeting_group_count = int(meeting_df['团队名称'].nunique())
-                total_meeting_rooms = int(meeting_df['房数'].sum())
-                meeting_jinling_rooms = int(meeting_df[meeting_df['准确楼栋'] == '金陵楼']['房数'].sum())
-                meeting_yatai_rooms = int(meeting_df[meeting_df['准确楼栋'] == '亚太楼']['房数'].sum())
-
-                gto_df = df_counted[df_counted['市场码'].str.startswith('GTO', na=False)].copy()
-                gto_group_count = int(gto_df['团队名称'].nunique())
-                total_gto_rooms = int(gto_df['房数'].sum())
-                gto_jinling_rooms = int(gto_df[gto_df['准确楼栋'] == '金陵楼']['房数'].sum())
-                gto_yatai_rooms = int(gto_df[gto_df['准确楼栋'] == '亚太楼']['房数'].sum())
-
-                summary_parts = [f"【{file_base_name}】: 有效总房数 {total_rooms} 间 (共 {total_guests} 人)"]
-                if meeting_group_count > 0:
-                    summary_parts.append(f"，其中会议/公司团队房({meeting_group_count}个, 共{total_meeting_rooms}间)分布: 金陵楼 {meeting_jinling_rooms} 间, 亚太楼 {meeting_yatai_rooms} 间.")
-                else:
-                    summary_parts.append("，(无会议/公司团队房).")
-                if total_gto_rooms > 0:
-                    summary_parts.append(f" | 旅行社(GTO)房({gto_group_count}个, {total_gto_rooms}间)分布: 金陵楼 {gto_jinling_rooms} 间, 亚太楼 {gto_yatai_rooms} 间.")
-                else:
-                    summary_parts.append(" | (无GTO旅行社房).")
-                
-                final_summary_lines.append("".join(summary_parts))
-
-            except Exception as e:
-                final_summary_lines.append(f"【{file_base_name}】处理失败，操，出错了: {e}")
-
-        return final_summary_lines, unknown_codes_collection
-
     if uploaded_files:
-        temp_dir = "./temp_uploaded_files"
-        os.makedirs(temp_dir, exist_ok=True)
-        file_paths = []
-        for uploaded_file in uploaded_files:
-            temp_file_path = os.path.join(temp_dir, uploaded_file.name)
-            with open(temp_file_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
-            file_paths.append(temp_file_path)
-
         if st.button("开始分析", type="primary"):
-            with st.spinner("正在用你原来牛逼的逻辑分析中..."):
-                summaries, unknown_codes = analyze_reports_ultimate(file_paths)
-            
+            # 操，直接拿内存里的字节丢给进程池，不再写临时文件
+            named_contents = [(uploaded_file.name, uploaded_file.getvalue()) for uploaded_file in uploaded_files]
+            progress_bar = st.progress(0.0, text="正在用你原来牛逼的逻辑分析中...")
+            def show_progress(done_count, total):
+                progress_bar.progress(done_count / total, text=f"正在用你原来牛逼的逻辑分析中... ({done_count}/{total})")
+            summaries, unknown_codes = analyze_reports_ultimate(named_contents, progress_callback=show_progress)
+            progress_bar.empty()
+
+
             st.subheader("分析结果")
             for summary in summaries:
                 st.write(summary)
@@ -169,12 +226,6 @@ def run_analyzer_app():
                 st.subheader("侦测到的未知房型代码 (请检查是否需要更新规则)")
                 for code, count in unknown_codes.items():
                     st.write(f"代码: '{code}' (出现了 {count} 次)")
-            
-            for f_path in file_paths:
-                try:
-                    os.remove(f_path)
-                except OSError:
-                    pass
     else:
         st.info("请上传一个或多个 Excel 文件以开始分析。")
 
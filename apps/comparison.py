@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 import unicodedata
 import re
+from utils import parse_date_column
 
 # ==============================================================================
 # --- Helper Functions ---
@@ -32,15 +33,13 @@ def process_and_standardize(df, mapping, case_insensitive=False, room_type_equiv
 
     # --- Date Standardization ---
     def robust_date_parser(series):
-        def process_date(date_str):
-            if pd.isna(date_str): return pd.NaT
-            date_str = str(date_str).strip()
-            # Handle MM/DD format, assume a future year for sorting if year is missing
-            if re.match(r'^\d{1,2}/\d{1,2}', date_str):
-                date_part = date_str.split(' ')[0]
-                return f"2025-{date_part.replace('/', '-')}" # Use a consistent placeholder year
-            return date_str
-        return pd.to_datetime(series.apply(process_date), errors='coerce').dt.strftime('%Y-%m-%d')
+        text = series.astype(str).str.strip().where(series.notna())
+        # Handle MM/DD format, assume a future year for sorting if year is missing
+        month_day = text.str.match(r'^\d{1,2}/\d{1,2}(?:\s|$)', na=False)
+        date_part = text.str.split(' ').str[0].str.replace('/', '-')
+        text = text.mask(month_day, '2025-' + date_part) # Use a consistent placeholder year
+        parsed, _ = parse_date_column(text)
+        return parsed.dt.strftime('%Y-%m-%d')
 
     if 'start_date' in standard_df:
         standard_df['start_date'] = robust_date_parser(standard_df['start_date'])
@@ -2,70 +2,265 @@ import streamlit as st
 import pandas as pd
 import re
 import fitz  # 操, PyMuPDF
-import io
 import base64
 import email # 操, 用来读 .eml
 from email.policy import default
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from config import CTRIP_PDF_SYSTEM_COLUMN_MAP # 操, 导入配置
-from utils import find_and_rename_columns, to_excel # 操, 导入公用函数
+from utils import load_order_export, order_export_input, to_excel, content_hash, PARSE_CACHE # 操, 导入公用函数
 
-def parse_pdf_text(pdf_bytes):
+# 操，正则表达式：
+# (\d{16})     : 专门抓16位数字的订单号 (你说的)
+# (.*?)        : 抓中间所有的垃圾信息，非贪婪模式 (携程有时候订单号和入住者之间没空格)
+# \s(-?\d+\.\d{2}) : 抓带正负号和小数点的结算价
+ORDER_PRICE_PATTERN = re.compile(r"(\d{16})(.*?)\s(-?\d+\.\d{2})")
+ORDER_ID_PATTERN = re.compile(r"(\d{16})")
+# 操，一页最后没配上价格的尾巴最多带这么多字符到下一页，对付跨页的记录
+PAGE_CARRY_CHARS = 512
+# 操，页数到这个数才开进程池抽文本，每个进程一次抽这么多页
+PDF_POOL_MIN_PAGES = 40
+PDF_PAGES_PER_CHUNK = 20
+# 操，调试框里只给看前面这么多字，几百页全塞进去浏览器要卡死
+DEBUG_TEXT_CHARS = 5000
+
+# 操，解析模式：文本正则 (老办法) / 版面坐标 (按词坐标对齐列)
+PDF_PARSE_MODE_TEXT = "text"
+PDF_PARSE_MODE_LAYOUT = "layout"
+PDF_PARSE_MODE_LABELS = {PDF_PARSE_MODE_TEXT: "文本正则", PDF_PARSE_MODE_LAYOUT: "版面坐标"}
+# 操，版面模式：词的纵向中心差不多在一条线上就算同一行，单位是PDF点
+ROW_Y_TOLERANCE = 3.0
+LAYOUT_ORDER_PATTERN = re.compile(r"(\d{16})(?!\d)")
+LAYOUT_PRICE_PATTERN = re.compile(r"-?\d+\.\d{2}")
+PRICE_HEADER_KEYWORDS = ('结算价', '结算金额')
+
+def _page_content(page, kind):
+    if kind == "words":
+        # 操，(x0, y0, x1, y1, 词, 块号, 行号, 词号)，只留前五个，省得来回传
+        return [word[:5] for word in page.get_text("words")]
+    # 操，把所有换行替换成空格，对付那些傻逼换行
+    return page.get_text("text").replace('\n', ' ') + " "
+
+def _extract_pages(pdf_bytes, start, stop, kind):
+    """进程池里跑的活：打开PDF，抽出 [start, stop) 这几页的文本或词坐标。"""
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as pdf_doc:
+        return [_page_content(pdf_doc.load_page(i), kind) for i in range(start, stop)]
+
+def iter_pages(pdf_bytes, kind="text", max_workers=None):
+    """
+    一页一页地吐出PDF内容 (kind="text" 给文本，kind="words" 给词坐标)，
+    页数多的时候分块丢进进程池并行抽，吐出来的顺序不变。
     """
-    操, 这个函数专门从PDF的二进制数据里把订单号和价格抠出来。
-    新逻辑：会把所有订单和价格都扒下来，然后按订单号分组求和，抵消掉那些一正一负的傻逼订单。
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as pdf_doc:
+        page_count = len(pdf_doc)
+        if page_count < PDF_POOL_MIN_PAGES:
+            for page_num in range(page_count):
+                yield _page_content(pdf_doc.load_page(page_num), kind)
+            return
+
+    starts = list(range(0, page_count, PDF_PAGES_PER_CHUNK))
+    stops = [min(start + PDF_PAGES_PER_CHUNK, page_count) for start in starts]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for chunk in executor.map(_extract_pages, repeat(pdf_bytes), starts, stops, repeat(kind)):
+            yield from chunk
+
+def iter_pdf_records(page_texts):
+    """
+    逐页匹配 (订单号, 结算价字符串)，不再把整本PDF拼成一个大字符串。
+    每页最后没配上的尾巴 (最多 PAGE_CARRY_CHARS 个字符) 接到下一页前面，跨页的记录也能抓到。
+    """
+    carry = ""
+    for page_text in page_texts:
+        buffer = carry + page_text
+        last_end = 0
+        for match in ORDER_PRICE_PATTERN.finditer(buffer):
+            yield match.group(1), match.group(3)
+            last_end = match.end()
+        carry = buffer[last_end:][-PAGE_CARRY_CHARS:]
+
+def iter_layout_records(page_words):
     """
-    text = ""
+    版面模式：按词的纵坐标把一页的词分成行，每行里找16位订单号和价格列，一页只扫一遍，不用正则回溯。
+    表头里有 '结算价' 时按它的横坐标取最近的价格；没有表头就取订单号右边的第一个价格。
+    表头位置会沿用到后面的页，携程的表跨页时表头只在第一页。
+    """
+    price_header_x = None
+    for words in page_words:
+        rows = {}
+        for x0, y0, x1, y1, word in words:
+            row_key = round((y0 + y1) / 2 / ROW_Y_TOLERANCE)
+            rows.setdefault(row_key, []).append((x0, x1, word))
+            if any(keyword in word for keyword in PRICE_HEADER_KEYWORDS):
+                price_header_x = (x0 + x1) / 2
+
+        for row_words in rows.values():
+            order_id, order_right = None, None
+            prices = []
+            for x0, x1, word in row_words:
+                token = word.replace(',', '').lstrip('¥￥')
+                order_match = LAYOUT_ORDER_PATTERN.match(token) if order_id is None else None
+                if order_match:
+                    order_id, order_right = order_match.group(1), x1
+                elif LAYOUT_PRICE_PATTERN.fullmatch(token):
+                    prices.append((x0, x1, token))
+            if order_id is None or not prices:
+                continue
+
+            if price_header_x is not None:
+                price = min(prices, key=lambda p: abs((p[0] + p[1]) / 2 - price_header_x))[2]
+            else:
+                right_prices = [p for p in prices if p[0] >= order_right]
+                if not right_prices:
+                    continue
+                price = min(right_prices, key=lambda p: p[0])[2]
+            yield order_id, price
+
+def extract_pdf_records(pdf_bytes, mode=PDF_PARSE_MODE_TEXT):
+    """
+    操, 从PDF的二进制数据里把 (订单号, 结算价) 原始记录扒出来，还没做正负抵消。
+    返回 {'records': 原始订单表, 'debug_text': 前一段调试文本, 'order_ids_seen': 出现过的订单号}，
+    出错时返回错误信息字符串。不碰 Streamlit。
+    """
+    debug_text = []
+    debug_len = 0
+    order_ids_seen = set()
+    text_found = False
+
+    def tap_pages(pages):
+        # 操，边流边记：留一小段调试文本，顺手记下出现过的订单号
+        nonlocal debug_len, text_found
+        for page in pages:
+            page_text = page if mode == PDF_PARSE_MODE_TEXT else " ".join(word[4] for word in page) + " "
+            if page_text.strip():
+                text_found = True
+            if debug_len < DEBUG_TEXT_CHARS:
+                debug_text.append(page_text[:DEBUG_TEXT_CHARS - debug_len])
+                debug_len += len(debug_text[-1])
+            order_ids_seen.update(ORDER_ID_PATTERN.findall(page_text))
+            yield page
+
     try:
-        # 操, 打开PDF
-        pdf_doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        for page_num in range(len(pdf_doc)):
-            page = pdf_doc.load_page(page_num)
-            # 操，把所有换行替换成空格，对付那些傻逼换行
-            text += page.get_text("text").replace('\n', ' ') + " "
-        pdf_doc.close()
+        if mode == PDF_PARSE_MODE_LAYOUT:
+            records = list(iter_layout_records(tap_pages(iter_pages(pdf_bytes, kind="words"))))
+        else:
+            records = list(iter_pdf_records(tap_pages(iter_pages(pdf_bytes, kind="text"))))
     except Exception as e:
         return f"操，PyMuPDF库在读取PDF时出错了: {e}"
 
-    if not text:
+    if not text_found:
         return "操，PDF是空的或者读不出来字。"
 
-    st.text_area("--- 调试：从PDF读出的原始文本 (已替换换行) ---", text, height=150)
-
-    # 操，新版正则表达式：
-    # (\d{16})     : 专门抓16位数字的订单号 (你说的)
-    # \s(.*?)\s      : 抓中间所有的垃圾信息，非贪婪模式
-    # (-?\d+\.\d{2}) : 抓带正负号和小数点的结算价
-    # 妈的，携程有时候订单号和入住者之间没空格，老子把中间的 \s 改成 (.*?)
-    matches = re.findall(r"(\d{16})(.*?)\s(-?\d+\.\d{2})", text)
-
-    if not matches:
-        st.warning("操，在PDF里没找到 '16位订单号 ... 价格' 这种格式的数据。")
-        # 操，尝试只抓订单号，万一价格匹配不上呢
-        order_ids_only = re.findall(r"(\d{16})", text)
-        st.info(f"只抓到这些16位订单号 (没抓到价格): {list(set(order_ids_only))}")
-        return pd.DataFrame(columns=['订单号', '结算价']) # 返回个空的DataFrame
-
     # 操，把抓到的数据放进DataFrame
-    pdf_data = pd.DataFrame(matches, columns=['订单号', '详情', '结算价_str'])
-    
+    pdf_data = pd.DataFrame(records, columns=['订单号', '结算价_str'])
     # 操，把价格转成数字，转不了的都算0
     pdf_data['结算价'] = pd.to_numeric(pdf_data['结算价_str'], errors='coerce').fillna(0)
-    
-    st.info("--- 调试：从PDF扒下来的原始订单和价格 ---")
-    st.dataframe(pdf_data[['订单号', '结算价']], use_container_width=True)
-    
-    # --- 核心逻辑：分组求和 ---
-    st.info("--- 开始对账：按订单号聚合结算价 (正负抵消) ---")
-    # 操，按订单号分组，把结算价加起来
-    aggregated_df = pdf_data.groupby('订单号')['结算价'].sum().reset_index()
-    
-    # 操，只保留那些最后结算价不是0的订单
-    final_pdf_df = aggregated_df[aggregated_df['结算价'] != 0].copy()
-    
-    st.success("--- 聚合完成！下面是结算价不为0的最终订单 ---")
-    st.dataframe(final_pdf_df, use_container_width=True)
-    
-    return final_pdf_df
+    return {
+        "records": pdf_data[['订单号', '结算价']],
+        "debug_text": "".join(debug_text),
+        "order_ids_seen": sorted(order_ids_seen),
+    }
+
+def _pdf_cache_key(pdf_bytes, mode):
+    return f"pdf:{mode}:" + content_hash(pdf_bytes)
+
+def _remember_pdf_records(cache_key, result):
+    """解析结果写缓存，出错的错误信息不缓存。"""
+    if isinstance(result, str):
+        return result
+    PARSE_CACHE.set(cache_key, result)
+    return dict(result, from_cache=False)
+
+def load_pdf_records(pdf_bytes, mode=PDF_PARSE_MODE_TEXT):
+    """
+    带缓存的 extract_pdf_records：同一个PDF重复上传时直接用缓存里的订单表，不再重新解析。
+    不碰 Streamlit。多返回一个 from_cache 标记给界面提示用。
+    """
+    cache_key = _pdf_cache_key(pdf_bytes, mode)
+    result = PARSE_CACHE.get(cache_key)
+    if result is not None:
+        return dict(result, from_cache=True)
+    return _remember_pdf_records(cache_key, extract_pdf_records(pdf_bytes, mode))
+
+def pdf_page_count(pdf_bytes):
+    """页数，打不开的当0页 (交给解析的时候再报错)。"""
+    try:
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as pdf_doc:
+            return len(pdf_doc)
+    except Exception:
+        return 0
+
+def parse_statement_pdfs(statement_pdfs, mode=PDF_PARSE_MODE_TEXT, max_workers=None):
+    """
+    操，一堆对账单一起解析，解析完一个吐一个 (下标, 结果)，结果跟 load_pdf_records 的一样。不碰 Streamlit。
+    缓存里有的直接吐；小PDF一个文件一个任务丢进进程池，几封邮件的附件同时解析；
+    页数到 PDF_POOL_MIN_PAGES 的大PDF等池子跑完再一个一个解析，iter_pages 自己开分页的进程池，不套娃。
+    """
+    small, large = [], []
+    for index, (_, _, pdf_bytes) in enumerate(statement_pdfs):
+        cached = PARSE_CACHE.get(_pdf_cache_key(pdf_bytes, mode))
+        if cached is not None:
+            yield index, dict(cached, from_cache=True)
+        elif pdf_page_count(pdf_bytes) >= PDF_POOL_MIN_PAGES:
+            large.append(index)
+        else:
+            small.append(index)
+
+    if small:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(extract_pdf_records, statement_pdfs[i][2], mode): i for i in small}
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = f"操，解析时出错了: {e}"
+                yield index, _remember_pdf_records(_pdf_cache_key(statement_pdfs[index][2], mode), result)
+
+    for index in large:
+        try:
+            result = load_pdf_records(statement_pdfs[index][2], mode)
+        except Exception as e:
+            result = f"操，解析时出错了: {e}"
+        yield index, result
+
+def collect_statement_pdfs(uploaded_files):
+    """
+    操，把上传的一堆 .eml 和 .pdf 摊平成 [(来源邮件, 附件名, PDF字节), ...]。
+    直接传的PDF，来源邮件就写它自己的文件名。返回 (PDF列表, 出错信息列表)。
+    """
+    statement_pdfs, errors = [], []
+    for uploaded_file in uploaded_files:
+        if uploaded_file.name.lower().endswith(".pdf"):
+            statement_pdfs.append((uploaded_file.name, uploaded_file.name, uploaded_file.getvalue()))
+            continue
+        try:
+            # 操，读 .eml 文件
+            msg = email.message_from_bytes(uploaded_file.getvalue(), policy=default)
+            found_pdf = False
+            for part in msg.walk():
+                if part.get_content_type() == "application/pdf":
+                    found_pdf = True
+                    pdf_name = part.get_filename() or "未命名.pdf"
+                    statement_pdfs.append((uploaded_file.name, pdf_name, part.get_payload(decode=True)))
+            if not found_pdf:
+                errors.append(f"操，邮件 '{uploaded_file.name}' 里一个PDF附件都没找到！")
+        except Exception as e:
+            errors.append(f"操，读取 '{uploaded_file.name}' 时出错了: {e}")
+    return statement_pdfs, errors
+
+def aggregate_statement_records(records_list):
+    """
+    操，所有对账单的原始记录一次 groupby：按订单号把结算价加起来 (正负抵消)，
+    顺便记下每个订单出自哪些邮件、哪些附件。只保留最后结算价不是0的订单。
+    """
+    all_records = pd.concat(records_list, ignore_index=True)
+    join_unique = lambda values: "、".join(dict.fromkeys(values))
+    aggregated_df = all_records.groupby('订单号', sort=False).agg(
+        结算价=('结算价', 'sum'),
+        来源邮件=('来源邮件', join_unique),
+        来源附件=('来源附件', join_unique),
+    ).reset_index()
+    return aggregated_df[aggregated_df['结算价'] != 0].reset_index(drop=True)
 
 
 def run_ctrip_pdf_checker_app():
@@ -75,69 +270,71 @@ def run_ctrip_pdf_checker_app():
     st.title(f"携程PDF审单 (邮件套PDF)")
     st.markdown("""
     操，这个工具是专门对付携程那个傻逼`.eml`邮件里藏着`.pdf`附件的对账单的。
-    1.  上传包含PDF附件的 `.eml` 邮件文件。
+    1.  上传包含PDF附件的 `.eml` 邮件文件，或者直接上传 `.pdf` 对账单 (都可以一次传一堆)。
     2.  上传你从系统导出的订单Excel (xlsx)。
-    3.  老子会从PDF里把**16位订单号**和**结算价**抠出来，**自动抵消正负订单**，然后去Excel里找匹配的**第三方预订号**。
-    4.  最后给你一份干净的对账Excel。
+    3.  老子会从所有PDF里把**16位订单号**和**结算价**抠出来，跨对账单**自动抵消正负订单**，然后去Excel里找匹配的**第三方预订号**。
+    4.  最后给你一份干净的对账Excel，每个订单来自哪封邮件、哪个附件都写清楚。
+
+    PDF解析模式：**文本正则** 是老办法，把文字拼起来用正则配对；**版面坐标** 按每个词在页面上的位置分行、按列取订单号和结算价，表格排版规整的对账单用这个更稳。
     """)
 
     col1, col2 = st.columns(2)
     with col1:
-        eml_file = st.file_uploader("1. 上传 `.eml` 邮件文件", type=["eml"])
+        statement_files = st.file_uploader("1. 上传 `.eml` 邮件 / `.pdf` 对账单 (可多选)", type=["eml", "pdf"], accept_multiple_files=True)
     with col2:
-        system_excel = st.file_uploader("2. 上传系统订单 Excel (.xlsx)", type=["xlsx"])
+        system_excel = order_export_input("2. 上传系统订单 Excel (.xlsx)", key="pdf_system_uploader")
+    parse_mode = st.radio("PDF解析模式", options=list(PDF_PARSE_MODE_LABELS.keys()), format_func=PDF_PARSE_MODE_LABELS.get, horizontal=True)
 
-    if st.button("开始对账", type="primary", disabled=(not eml_file or not system_excel)):
-        pdf_df_list = []
-        
-        try:
-            # 操，读 .eml 文件
-            msg = email.message_from_bytes(eml_file.getvalue(), policy=default)
-            
-            found_pdf = False
-            for part in msg.walk():
-                if part.get_content_type() == "application/pdf":
-                    found_pdf = True
-                    pdf_name = part.get_filename() or "未命名.pdf"
-                    st.success(f"找到一个PDF: {pdf_name}")
-                    
-                    # 操，获取PDF的二进制内容
-                    pdf_bytes = part.get_payload(decode=True)
-                    
-                    # 操，调用新函数解析PDF
-                    with st.spinner(f"正在读取 '{pdf_name}' 里的数据..."):
-                        result_df = parse_pdf_text(io.BytesIO(pdf_bytes))
-                        
-                        if isinstance(result_df, str):
-                            st.error(result_df) # 操，出错了
-                        elif result_df.empty:
-                            st.warning(f"'{pdf_name}' 里没找到有效的、结算价不为0的订单。")
-                        else:
-                            pdf_df_list.append(result_df)
-            
-            if not found_pdf:
-                st.error("操，你传的邮件里一个PDF附件都没找到！")
-                st.stop()
-        
-        except Exception as e:
-            st.error(f"操，读取 .eml 文件时出错了: {e}")
+    if st.button("开始对账", type="primary", disabled=(not statement_files or not system_excel)):
+        statement_pdfs, collect_errors = collect_statement_pdfs(statement_files)
+        for error in collect_errors:
+            st.error(error)
+        if not statement_pdfs:
+            st.error("操，你传的文件里一个PDF都没找到！")
             st.stop()
-    
-        if not pdf_df_list:
+        st.success(f"一共找到 {len(statement_pdfs)} 个PDF对账单，开始解析...")
+
+        parsed_records = {}
+        progress_bar = st.progress(0.0, text="正在解析PDF...")
+        # 操，用进程池不用线程：PyMuPDF 多线程同时开几个文档不安全，还占着 GIL，开线程白搭
+        parsed = parse_statement_pdfs(statement_pdfs, parse_mode)
+        for done_count, (index, result) in enumerate(parsed, start=1):
+            source_name, pdf_name, _ = statement_pdfs[index]
+            progress_bar.progress(done_count / len(statement_pdfs), text=f"正在解析PDF... ({done_count}/{len(statement_pdfs)})")
+            if isinstance(result, str):
+                st.error(f"'{source_name}' / '{pdf_name}': {result}") # 操，出错了
+                continue
+
+            pdf_data = result['records']
+            with st.expander(f"调试：'{source_name}' / '{pdf_name}' ({len(pdf_data)} 条原始记录{'，来自缓存' if result['from_cache'] else ''})"):
+                st.text_area(f"从PDF读出的原始文本 (已替换换行，只显示前{DEBUG_TEXT_CHARS}字)", result['debug_text'], height=150, key=f"debug_{index}_{source_name}_{pdf_name}")
+                st.dataframe(pdf_data, use_container_width=True)
+            if pdf_data.empty:
+                st.warning(f"操，在 '{source_name}' / '{pdf_name}' 里没找到 '16位订单号 ... 价格' 这种格式的数据。")
+                # 操，尝试只抓订单号，万一价格匹配不上呢
+                st.info(f"只抓到这些16位订单号 (没抓到价格): {result['order_ids_seen']}")
+                continue
+            parsed_records[index] = pdf_data.assign(来源邮件=source_name, 来源附件=pdf_name)
+        progress_bar.empty()
+        # 操，谁先解析完不一定，按上传顺序排回来，来源邮件/附件的拼接顺序才稳定
+        records_list = [parsed_records[index] for index in sorted(parsed_records)]
+
+        if not records_list:
             st.error("操，所有PDF都读完了，但没找到任何有效的订单数据。")
             st.stop()
-        
-        # 操，把所有PDF里读出来的数据合并到一起
-        all_pdf_data = pd.concat(pdf_df_list).drop_duplicates(subset=['订单号']).reset_index(drop=True)
+
+        # --- 核心逻辑：所有对账单一起分组求和 ---
+        all_pdf_data = aggregate_statement_records(records_list)
+        if all_pdf_data.empty:
+            st.error("操，所有PDF都读完了，正负抵消以后没有结算价不为0的订单。")
+            st.stop()
+        st.success(f"--- 聚合完成！{len(records_list)} 个对账单里结算价不为0的订单一共 {len(all_pdf_data)} 个 ---")
         
         # --- 开始处理系统Excel ---
         try:
             with st.spinner("正在读取系统Excel..."):
-                system_df = pd.read_excel(system_excel, dtype=str) # 操，全当成文本读
-                system_df.columns = system_df.columns.str.strip() # 操，去他妈的空格
-            
-            # 操，动态查找并重命名列
-            missing_cols = find_and_rename_columns(system_df, CTRIP_PDF_SYSTEM_COLUMN_MAP)
+                # 操，共用的订单导入，列名映射和类型转换都在里面做了，同一份文件只解析一次
+                system_df, missing_cols = load_order_export(system_excel, CTRIP_PDF_SYSTEM_COLUMN_MAP, snapshot=True)
             if missing_cols:
                 st.error(f"操，你的系统Excel文件里少了这些列: {', '.join(missing_cols)}")
                 st.stop()
@@ -178,7 +375,9 @@ def run_ctrip_pdf_checker_app():
             '离开',
             '预订号',
             '结算价',  # 操，这个就是PDF里来的
-            '第三方预订号'
+            '第三方预订号',
+            '来源邮件',
+            '来源附件'
         ]]
         
         # 操，重命名一下结算价，免得你搞混
@@ -194,4 +393,3 @@ def run_ctrip_pdf_checker_app():
             file_name="ctrip_pdf_audit_result.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
-
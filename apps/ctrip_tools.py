@@ -2,15 +2,80 @@ import streamlit as st
 import pandas as pd
 import re
 import numpy as np
-from utils import find_and_rename_columns, to_excel
+from collections import deque
+from utils import load_order_export, order_export_input, to_excel, parse_date_column
 # 操，就是下面这行引用写错了，现在改对了
 from config import (
     CTRIP_DATE_COMPARE_SYSTEM_COLS, 
     CTRIP_DATE_COMPARE_CTRIP_COLS, 
     CTRIP_AUDIT_COLUMN_MAP_CTRIP, 
-    CTRIP_AUDIT_COLUMN_MAP_SYSTEM
+    CTRIP_AUDIT_COLUMN_MAP_SYSTEM,
+    ORDER_EXPORT_UPLOAD_TYPES
 )
 
+# ==============================================================================
+# --- [携程审单] 匹配引擎 ---
+# ==============================================================================
+MATCH_ROUND_LABELS = ['第三方预订号', '确认号/预订号', '客人姓名']
+UNMATCHED_ROUND_LABEL = '未匹配'
+
+def clean_confirmation_number(number):
+    if pd.isna(number): return None
+    digits = re.findall(r'\d+', str(number))
+    return ''.join(digits) if digits else None
+
+def clean_third_party_number(number):
+    if pd.isna(number): return None
+    number_str = str(number).strip()
+    return re.sub(r'R\d+$', '', number_str)
+
+def build_key_index(values):
+    """把一列值建成 值 -> 行位置队列 的哈希索引，空值不进索引。"""
+    index = {}
+    for pos, value in enumerate(values):
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            continue
+        index.setdefault(value, deque()).append(pos)
+    return index
+
+def take_first_unmatched(index, key, system_matched):
+    """从索引里取出该键下第一条还没被匹配过的系统订单位置，没有就返回 -1。"""
+    positions = index.get(key)
+    while positions:
+        pos = positions.popleft()
+        if not system_matched[pos]:
+            return pos
+    return -1
+
+def match_orders_in_rounds(ctrip_df, system_df):
+    """
+    携程审单的三轮匹配：第三方预订号 -> 纯数字确认号 -> 客人姓名。
+    每个匹配键只建一次哈希索引，按优先级逐轮消费，系统订单一旦被匹配就不会再用，
+    同一个键有多条系统订单时按原表顺序取第一条没用过的。
+    返回 (每行携程订单匹配到的系统订单位置, 每行的匹配轮次)，没匹配上的位置为 -1。
+    """
+    system_matched = np.zeros(len(system_df), dtype=bool)
+    matched_pos = np.full(len(ctrip_df), -1, dtype=np.int64)
+    match_round = np.full(len(ctrip_df), UNMATCHED_ROUND_LABEL, dtype=object)
+
+    rounds = [
+        (ctrip_df['订单号'].astype(str).str.strip(), system_df['清洗后第三方预定号']),
+        (ctrip_df['纯数字确认号'], system_df['预订号']),
+        (ctrip_df['客人姓名'], system_df['姓名']),
+    ]
+    for round_label, (ctrip_keys, system_keys) in zip(MATCH_ROUND_LABELS, rounds):
+        index = build_key_index(system_keys.tolist())
+        for i, key in enumerate(ctrip_keys.tolist()):
+            if matched_pos[i] >= 0 or not key or (isinstance(key, float) and np.isnan(key)):
+                continue
+            pos = take_first_unmatched(index, key, system_matched)
+            if pos >= 0:
+                system_matched[pos] = True
+                matched_pos[i] = pos
+                match_round[i] = round_label
+    return matched_pos, match_round
+
+
 # ==============================================================================
 # --- APP: 携程对日期 ---
 # ==============================================================================
@@ -25,18 +90,18 @@ def run_ctrip_date_comparison_app():
 
     col1, col2 = st.columns(2)
     with col1:
-        system_file_uploaded = st.file_uploader("上传您的 System Order (.xlsx)", type=["xlsx"], key="system_uploader")
+        system_file_uploaded = st.file_uploader("上传您的 System Order (.xlsx)", type=ORDER_EXPORT_UPLOAD_TYPES, key="system_uploader")
     with col2:
-        ctrip_file_uploaded = st.file_uploader("上传您的 Ctrip Order (.xlsx)", type=["xlsx"], key="ctrip_uploader")
+        ctrip_file_uploaded = st.file_uploader("上传您的 Ctrip Order (.xlsx)", type=ORDER_EXPORT_UPLOAD_TYPES, key="ctrip_uploader")
 
     if st.button("开始比对", type="primary", disabled=(not system_file_uploaded or not ctrip_file_uploaded)):
         
         @st.cache_data
         def perform_comparison(system_file, ctrip_file):
             
-            def clean_data(file_buffer, cols_map, date_format=None):
+            def clean_data(file_buffer, cols_map):
                 try:
-                    df = pd.read_excel(file_buffer)
+                    df, _ = load_order_export(file_buffer)
                 except Exception as e:
                     st.error(f"读取文件失败: {e}")
                     return None
@@ -52,21 +117,20 @@ def run_ctrip_date_comparison_app():
                 
                 df_selected['预定号'] = df_selected['预定号'].astype(str).str.strip().str.upper()
                 
-                df_selected['入住日期_str'] = df_selected['入住日期'].astype(str)
-                df_selected['离店日期_str'] = df_selected['离店日期'].astype(str)
-
-                if date_format:
-                    df_selected['入住日期'] = pd.to_datetime(df_selected['入住日期_str'], format=date_format, errors='coerce').dt.date
-                    df_selected['离店日期'] = pd.to_datetime(df_selected['离店日期_str'], format=date_format, errors='coerce').dt.date
-                else:
-                    df_selected['入住日期'] = pd.to_datetime(df_selected['入住日期_str'], errors='coerce').dt.date
-                    df_selected['离店日期'] = pd.to_datetime(df_selected['离店日期_str'], errors='coerce').dt.date
+                # 操，系统导出的 YYMMDD 数字和携程的日期字符串都交给通用解析，格式自己检测
+                checkin, bad_checkin = parse_date_column(df_selected['入住日期'])
+                checkout, bad_checkout = parse_date_column(df_selected['离店日期'])
+                df_selected['入住日期'] = checkin.dt.date
+                df_selected['离店日期'] = checkout.dt.date
+                bad_date_rows = int((bad_checkin | bad_checkout).sum())
+                if bad_date_rows:
+                    st.warning(f"有 {bad_date_rows} 行的入住/离店日期无法识别，已跳过。")
                 
                 df_selected.dropna(subset=['预定号', '入住日期', '离店日期'], inplace=True)
-                return df_selected.drop(columns=['入住日期_str', '离店日期_str'])
+                return df_selected
 
             with st.spinner("正在处理和比对文件..."):
-                df_system = clean_data(system_file, CTRIP_DATE_COMPARE_SYSTEM_COLS, date_format='%y%m%d')
+                df_system = clean_data(system_file, CTRIP_DATE_COMPARE_SYSTEM_COLS)
                 df_ctrip = clean_data(ctrip_file, CTRIP_DATE_COMPARE_CTRIP_COLS)
 
                 if df_system is None or df_ctrip is None:
@@ -137,96 +201,49 @@ def run_ctrip_audit_app():
         - (1) **第三方预订号**
         - (2) **确认号/预订号**
         - (3) **客人姓名**
-    3.  最终生成包含 `订单号`, `客人姓名`, `到达`, `离开`, `房号`, `状态` 的审核结果。
+    3.  最终生成包含 `订单号`, `客人姓名`, `到达`, `离开`, `房号`, `状态`, `匹配轮次` 的审核结果。
     """)
 
     col1, col2 = st.columns(2)
     with col1:
-        ctrip_file_uploaded = st.file_uploader("上传携程订单.xlsx", type=["xlsx"], key="ctrip_audit_uploader_final")
+        ctrip_file_uploaded = st.file_uploader("上传携程订单.xlsx", type=ORDER_EXPORT_UPLOAD_TYPES, key="ctrip_audit_uploader_final")
     with col2:
-        system_file_uploaded = st.file_uploader("上传系统订单.xlsx", type=["xlsx"], key="system_audit_uploader_final")
+        system_file_uploaded = order_export_input("上传系统订单.xlsx", key="system_audit_uploader_final")
 
     def perform_audit_in_streamlit(ctrip_buffer, system_buffer):
-        
-        def clean_confirmation_number(number):
-            if pd.isna(number): return None
-            digits = re.findall(r'\d+', str(number))
-            return ''.join(digits) if digits else None
-
-        def clean_third_party_number(number):
-            if pd.isna(number): return None
-            number_str = str(number).strip()
-            return re.sub(r'R\d+$', '', number_str)
-
         try:
-            ctrip_df = pd.read_excel(ctrip_buffer, dtype={'订单号': str, '确认号': str})
-            system_df = pd.read_excel(system_buffer, dtype={'预订号': str, '第三方预定号': str, '第三方预订号': str})
+            # 操，携程表自己的房号/状态在没匹配上的时候要原样保留，映射里没有，得单独留着
+            ctrip_df, missing_ctrip_cols = load_order_export(ctrip_buffer, CTRIP_AUDIT_COLUMN_MAP_CTRIP, keep_cols=('房号', '状态'))
+            system_df, missing_system_cols = load_order_export(system_buffer, CTRIP_AUDIT_COLUMN_MAP_SYSTEM, snapshot=True)
             
             if ctrip_df.empty:
                 return "错误: 上传的携程订单文件为空或格式不正确。"
-            if system_df.empty:
-                return "错误: 上传的系统订单文件为空或格式不正确。"
 
-            ctrip_df.columns = ctrip_df.columns.str.strip()
-            system_df.columns = system_df.columns.str.strip()
-            
-            missing_ctrip_cols = find_and_rename_columns(ctrip_df, CTRIP_AUDIT_COLUMN_MAP_CTRIP)
             if missing_ctrip_cols: return f"错误: 携程订单文件中缺少必需的列: {', '.join(missing_ctrip_cols)}"
-            missing_system_cols = find_and_rename_columns(system_df, CTRIP_AUDIT_COLUMN_MAP_SYSTEM)
             if missing_system_cols: return f"错误: 系统订单文件中缺少必需的列: {', '.join(missing_system_cols)}"
             
-            ctrip_df['匹配的离开时间'] = np.nan
-            ctrip_df['匹配的房号'] = np.nan
-            ctrip_df['匹配的状态'] = np.nan
             ctrip_df['纯数字确认号'] = ctrip_df['确认号'].apply(clean_confirmation_number)
             system_df['清洗后第三方预定号'] = system_df['第三方预定号'].apply(clean_third_party_number)
             system_df['姓名'] = system_df['姓名'].astype(str).str.strip()
             ctrip_df['客人姓名'] = ctrip_df['客人姓名'].astype(str).str.strip()
-            system_df['is_matched'] = False
-            
-            # 第1轮
-            for i, ctrip_row in ctrip_df.iterrows():
-                ctrip_order_id = str(ctrip_row['订单号']).strip()
-                if ctrip_order_id:
-                    match = system_df[(system_df['清洗后第三方预定号'] == ctrip_order_id) & (~system_df['is_matched'])]
-                    if not match.empty:
-                        system_idx = match.index[0]
-                        ctrip_df.at[i, '匹配的离开时间'] = system_df.at[system_idx, '离开']
-                        ctrip_df.at[i, '匹配的房号'] = system_df.at[system_idx, '房号']
-                        ctrip_df.at[i, '匹配的状态'] = system_df.at[system_idx, '状态']
-                        system_df.at[system_idx, 'is_matched'] = True
-            # 第2轮
-            unmatched_round1 = ctrip_df[ctrip_df['匹配的房号'].isna()]
-            for i, ctrip_row in unmatched_round1.iterrows():
-                conf_num = ctrip_row['纯数字确认号']
-                if conf_num:
-                    match = system_df[(system_df['预订号'] == conf_num) & (~system_df['is_matched'])]
-                    if not match.empty:
-                        system_idx = match.index[0]
-                        ctrip_df.at[i, '匹配的离开时间'] = system_df.at[system_idx, '离开']
-                        ctrip_df.at[i, '匹配的房号'] = system_df.at[system_idx, '房号']
-                        ctrip_df.at[i, '匹配的状态'] = system_df.at[system_idx, '状态']
-                        system_df.at[system_idx, 'is_matched'] = True
-            # 第3轮
-            unmatched_round2 = ctrip_df[ctrip_df['匹配的房号'].isna()]
-            for i, ctrip_row in unmatched_round2.iterrows():
-                guest_name = ctrip_row['客人姓名']
-                if guest_name:
-                    match = system_df[(system_df['姓名'] == guest_name) & (~system_df['is_matched'])]
-                    if not match.empty:
-                        system_idx = match.index[0]
-                        ctrip_df.at[i, '匹配的离开时间'] = system_df.at[system_idx, '离开']
-                        ctrip_df.at[i, '匹配的房号'] = system_df.at[system_idx, '房号']
-                        ctrip_df.at[i, '匹配的状态'] = system_df.at[system_idx, '状态']
-                        system_df.at[system_idx, 'is_matched'] = True
-            
+
+            # 操，三轮匹配交给哈希索引引擎，一次建索引，线性跑完
+            matched_pos, match_round = match_orders_in_rounds(ctrip_df, system_df)
+            has_match = matched_pos >= 0
+
             for col in ['房号', '状态']:
                 if col not in ctrip_df.columns:
                     ctrip_df[col] = np.nan
-            ctrip_df['离开'] = ctrip_df['匹配的离开时间'].where(pd.notna(ctrip_df['匹配的离开时间']), ctrip_df['离开'])
-            ctrip_df['房号'] = ctrip_df['匹配的房号'].where(pd.notna(ctrip_df['匹配的房号']), ctrip_df['房号'])
-            ctrip_df['状态'] = ctrip_df['匹配的状态'].where(pd.notna(ctrip_df['匹配的状态']), ctrip_df['状态'])
-            final_df = ctrip_df[['订单号', '客人姓名', '到达', '离开', '房号', '状态']]
+            # 操，系统订单只有表头 (一条都没有) 的时候一个也匹配不上，携程的行原样带出去；
+            # 不判断的话拿下标 0 去空表里取值直接 IndexError
+            if has_match.any():
+                safe_pos = np.where(has_match, matched_pos, 0)
+                for col in ['离开', '房号', '状态']:
+                    matched_values = system_df[col].to_numpy(dtype=object)[safe_pos]
+                    use_matched = has_match & pd.notna(matched_values)
+                    ctrip_df[col] = np.where(use_matched, matched_values, ctrip_df[col].to_numpy(dtype=object))
+            ctrip_df['匹配轮次'] = match_round
+            final_df = ctrip_df[['订单号', '客人姓名', '到达', '离开', '房号', '状态', '匹配轮次']]
             return final_df
 
         except Exception as e:
@@ -1,24 +1,295 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import re
-import io
 import traceback
+from collections import namedtuple
 from datetime import timedelta, date
-from utils import to_excel # 操，从 utils 导入 to_excel
+from utils import (
+    to_excel, parse_date_column, lookup_buildings, content_hash,
+    load_order_export, read_table_bytes, ORDER_SNAPSHOTS, PYARROW_AVAILABLE
+) # 操，从 utils 导入 to_excel、通用日期解析、楼栋查询和系统订单读取
+from config import (
+    BUILDING_OTHER, BUILDING_JINLING, BUILDING_YATAI, DEFAULT_PRICE_BANDS,
+    STAY_RANGE_DEFAULT_DAYS, STAY_ROLLING_DEFAULT_DAYS, STAY_RANGE_MAX_DAYS,
+    PICKUP_COLUMN_MAP, ORDER_EXPORT_UPLOAD_TYPES, ORDER_EXPORT_CACHE_ENTRIES
+)
+from price_bands import parse_price_bands, sum_by_price_band, TOTAL_LABEL
+
+# 操，住店日期的三种选法
+STAY_MODE_LIST = "指定日期"
+STAY_MODE_RANGE = "日期范围"
+STAY_MODE_ROLLING = "滚动N天"
+STAY_DATE_MODES = [STAY_MODE_LIST, STAY_MODE_RANGE, STAY_MODE_ROLLING]
+# 操，算在住只看这些状态
+STAY_STATUSES = ['R', 'I']
+# 操，pickup 比的是 on-the-books：已经住完走了的 (O/S/D 离店) 也是实打实卖出去的间夜，照算；
+# 只有整行没了或者变成 X 之类的取消状态才算 取消，不然 I 变 O 的全成了假取消
+PICKUP_STAY_STATUSES = STAY_STATUSES + ['O', 'S', 'D']
+# 操，订单里市场码空着的统一成空字符串，下拉框里显示成这个
+BLANK_MARKET_LABEL = "(无市场码)"
+
+# 操，两种分析：单份订单的驾驶舱，和两份以上订单快照之间的 pickup 对比
+ANALYSIS_MODE_SINGLE = "单份订单分析"
+ANALYSIS_MODE_PICKUP = "Pickup 对比"
+ANALYSIS_MODES = [ANALYSIS_MODE_SINGLE, ANALYSIS_MODE_PICKUP]
+PICKUP_NEW = "新增"
+PICKUP_CANCELLED = "取消"
+PICKUP_MODIFIED = "修改"
+PICKUP_CHANGE_TYPES = [PICKUP_NEW, PICKUP_CANCELLED, PICKUP_MODIFIED]
+PICKUP_NET_LABEL = "净Pickup"
+# 操，这几列有一个变了就算 修改
+PICKUP_COMPARE_COLS = ['房类', '到达', '离开', '房数', '房价']
 
 # ==============================================================================
 # --- [数据分析] 核心逻辑 & UI ---
 # ==============================================================================
 
+# 操，在住立方体：group_keys 每行一个 (楼层, 市场码, 房价) 桶，occupancy 是 桶 × 天 的在住房数，
+# 第 0 列是 base_day (整数天号)。整个文件只建一次，按日期范围/市场码/价格区间查都是切片加求和。
+OccupancyCube = namedtuple('OccupancyCube', ['group_keys', 'base_day', 'occupancy'])
+
+def build_occupancy_cube(stays_df, group_cols=('楼层', '市场码', '房价'), rooms_col='房数'):
+    """
+    操，用差分数组算每日在住房数，不再把每个间夜展开成一行。
+    每个桶一行差分：到达那天 +房数，离开那天 -房数，按天 cumsum 就是每天在住。
+    stays_df 为空返回 None。分组键里有空值的也单独成一个桶 (dropna=False)，不然桶号是 NaN，差分数组没法下标。
+    """
+    group_cols = list(group_cols)
+    if stays_df.empty:
+        return None
+
+    grouped = stays_df.groupby(group_cols, sort=False, dropna=False)
+    group_ids = grouped.ngroup().to_numpy()
+    group_keys = stays_df.loc[grouped.head(1).index, group_cols].reset_index(drop=True)
+
+    start_days = to_day_keys(stays_df['到达'])
+    end_days = to_day_keys(stays_df['离开'])
+    base_day = int(start_days.min())
+    rooms = stays_df[rooms_col].to_numpy(dtype=np.int64)
+
+    n_days = int(end_days.max()) - base_day
+    diff = np.zeros((len(group_keys), n_days + 1), dtype=np.int64)
+    np.add.at(diff, (group_ids, start_days - base_day), rooms)
+    np.add.at(diff, (group_ids, end_days - base_day), -rooms)
+    occupancy = np.cumsum(diff[:, :-1], axis=1).astype(np.int32)
+    return OccupancyCube(group_keys, base_day, occupancy)
+
+def cube_day_range(cube):
+    """立方体覆盖的第一天和最后一天 (date)。"""
+    first_day, last_day = day_keys_to_dates([cube.base_day, cube.base_day + cube.occupancy.shape[1] - 1])
+    return first_day, last_day
+
+def slice_cube_days(cube, day_keys):
+    """取出指定天号的列，立方体外面的天补 0。"""
+    day_idx = np.asarray(day_keys, dtype=np.int64) - cube.base_day
+    inside = (day_idx >= 0) & (day_idx < cube.occupancy.shape[1])
+    values = np.zeros((cube.occupancy.shape[0], len(day_idx)), dtype=cube.occupancy.dtype)
+    values[:, inside] = cube.occupancy[:, day_idx[inside]]
+    return values
+
+def query_price_matrices(cube, day_keys, market_codes, bands_by_building):
+    """
+    操，从立方体里查价格分布矩阵：按市场码挑桶、按日期切列，每栋楼按价格区间把桶加起来。
+    返回 (所选范围内有在住的楼栋列表, {楼栋: 矩阵})，矩阵行是每一天，列是有数的区间 + 未分类 + 每日总计。
+    """
+    values = slice_cube_days(cube, day_keys)
+    selected = cube.group_keys['市场码'].isin(market_codes).to_numpy() & (values != 0).any(axis=1)
+    if not selected.any():
+        return [], {}
+    buildings = cube.group_keys['楼层'].astype(str).to_numpy()
+    prices = pd.to_numeric(cube.group_keys['房价'], errors='coerce').to_numpy(dtype=float)
+    dates = pd.Index(day_keys_to_dates(day_keys), name='住店日')
+
+    present_buildings = sorted(set(buildings[selected]))
+    matrices = {}
+    for building in present_buildings:
+        if building not in bands_by_building:
+            continue
+        rows = selected & (buildings == building)
+        label_order, totals = sum_by_price_band(prices[rows], values[rows], bands_by_building[building])
+        matrix = pd.DataFrame(totals.T, index=dates, columns=pd.Index(label_order, name='价格区间'))
+        matrix = matrix.loc[:, matrix.any(axis=0)]
+        matrix[TOTAL_LABEL] = matrix.sum(axis=1)
+        matrices[building] = matrix
+    return present_buildings, matrices
+
+def to_day_keys(dates):
+    """操，日期转成整数天号 (1970-01-01 起算)，筛选的时候比整数，不再比 Python 的 date 对象。"""
+    return np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+
+def day_keys_to_dates(day_keys):
+    return pd.to_datetime(np.asarray(day_keys, dtype=np.int64), unit='D').date
+
+def parse_date_keys(dates_str):
+    """解析逗号分隔的 YYYY/MM/DD 日期，返回排好序的整数天号元组，格式不对抛 ValueError。"""
+    date_strings = [d.strip() for d in dates_str.split(',') if d.strip()]
+    dates = [pd.to_datetime(d, format='%Y/%m/%d') for d in date_strings]
+    return tuple(sorted(set(to_day_keys(dates).tolist())))
+
+def day_key_range(start_date, end_date):
+    """start_date 到 end_date (含两端) 的整数天号元组，顺序反了自动调过来。"""
+    start_key, end_key = sorted(to_day_keys([start_date, end_date]).tolist())
+    return tuple(range(start_key, end_key + 1))
+
+def stay_day_picker(first_day, last_day, key_prefix):
+    """
+    操，住店日期的输入：指定几天 / 日期范围 / 起始日往后滚动 N 天，返回排好序的整数天号元组。
+    日期格式不对或者范围超过上限直接 st.stop()。
+    """
+    stay_mode = st.radio("住店日期选择方式", STAY_DATE_MODES, horizontal=True, key=f"{key_prefix}_date_mode")
+
+    selected_days = ()
+    if stay_mode == STAY_MODE_LIST:
+        dates_str = st.text_input("输入住店日期 (用逗号分隔, 格式: YYYY/MM/DD)", first_day.strftime('%Y/%m/%d'), key=f"{key_prefix}_date_input")
+        if dates_str:
+            try:
+                selected_days = parse_date_keys(dates_str)
+            except ValueError:
+                st.error("住店日期格式不正确，请输入 YYYY/MM/DD 格式。")
+                st.stop() # 操，格式错了就别往下跑了
+            except Exception as e:
+                st.error(f"处理住店日期时出错: {e}")
+                st.stop()
+    elif stay_mode == STAY_MODE_RANGE:
+        default_range_end = min(last_day, first_day + timedelta(days=STAY_RANGE_DEFAULT_DAYS - 1))
+        date_range = st.date_input("选择住店日期范围", value=(first_day, default_range_end), key=f"{key_prefix}_date_range")
+        if isinstance(date_range, (tuple, list)) and len(date_range) == 2:
+            selected_days = day_key_range(date_range[0], date_range[1])
+        else:
+            st.info("请选择范围的结束日期。")
+    else:
+        col_start, col_days = st.columns(2)
+        with col_start: rolling_start = st.date_input("起始住店日", value=first_day, key=f"{key_prefix}_rolling_start")
+        with col_days: rolling_days = st.number_input("往后看几天", min_value=1, max_value=STAY_RANGE_MAX_DAYS, value=STAY_ROLLING_DEFAULT_DAYS, step=1, key=f"{key_prefix}_rolling_days")
+        selected_days = day_key_range(rolling_start, rolling_start + timedelta(days=int(rolling_days) - 1))
+
+    if len(selected_days) > STAY_RANGE_MAX_DAYS:
+        st.error(f"住店日期最多选 {STAY_RANGE_MAX_DAYS} 天，请缩小范围。")
+        st.stop()
+    return selected_days
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def summarize_rooms_by_day(file_key, _df, day_col, statuses, day_keys, index_name):
+    """
+    操，到店/离店统计：按状态和日期筛选后按 (日期, 楼层) 汇总房数。
+    按 (文件, 列, 状态, 日期) 缓存，别的面板改了条件这里直接拿缓存。
+    """
+    mask = _df['状态'].isin(statuses).to_numpy() & np.isin(_df[day_col].to_numpy(), day_keys)
+    selected = _df[mask]
+    if selected.empty:
+        return pd.DataFrame()
+    summary = selected.groupby([day_col, '楼层'], observed=True)['房数'].sum().unstack(fill_value=0)
+    summary.index = day_keys_to_dates(summary.index)
+    summary.index.name = index_name
+    return summary
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def compute_price_matrices(file_key, _cube, stay_day_keys, market_codes, band_specs):
+    """
+    操，在住价格分布矩阵，直接查在住立方体。
+    band_specs 是 ((楼栋, 区间字符串), ...)，按 (文件, 日期, 市场码, 区间) 缓存。
+    返回 (所选范围内有在住的楼栋列表, {楼栋: 矩阵})。
+    """
+    bands_by_building = {building: parse_price_bands(spec) for building, spec in band_specs}
+    return query_price_matrices(_cube, stay_day_keys, market_codes, bands_by_building)
+
+# ==============================================================================
+# --- [数据分析] Pickup 对比 ---
+# ==============================================================================
+# 操，两份订单快照按 (预订号, 行序) 对上，分成 新增 / 取消 / 修改 三类，
+# 取消的房数取负，修改的是 旧的取负 + 新的取正，再丢进同一个在住立方体里算每天的间夜变化。
+
+@st.cache_data(show_spinner=False, max_entries=ORDER_EXPORT_CACHE_ENTRIES)
+def prepare_pickup_stays(file_key, _df):
+    """
+    操，把一份订单快照整理成 每个预订一行 的在住记录，只留 PICKUP_STAY_STATUSES、入住天数大于0、金陵楼/亚太楼的。
+    同一个预订号可能有好几行 (多个房型)，排好序编个行序一起当索引。按文件内容哈希缓存。
+    """
+    df = _df.dropna(subset=['预订号', '到达', '离开', '房价', '房数', '房类', '状态'])
+    df = pd.DataFrame({
+        '预订号': df['预订号'].astype(str),
+        '状态': df['状态'].astype(str).str.strip().str.upper(),
+        '房类': df['房类'].astype(str).str.strip().str.upper(),
+        '市场码': df['市场码'].fillna('').astype(str).str.strip(), # 操，空市场码同上，填成空字符串
+        '到达': df['到达'].dt.normalize(),
+        '离开': df['离开'].dt.normalize(),
+        '房数': df['房数'].astype(int),
+        '房价': df['房价'].astype(float),
+    })
+    df = df[df['状态'].isin(PICKUP_STAY_STATUSES) & (df['离开'] > df['到达'])]
+    df = df.assign(楼层=lookup_buildings(df['房类']))
+    df = df[df['楼层'] != BUILDING_OTHER].sort_values(['预订号', '到达', '房类', '房价'], kind='stable')
+    df['行序'] = df.groupby('预订号').cumcount()
+    return df.set_index(['预订号', '行序'])[['楼层', '市场码'] + PICKUP_COMPARE_COLS]
+
+def diff_snapshots(base_stays, compare_stays):
+    """
+    操，两份整理好的在住记录一次性对比。
+    返回 (带符号房数的变化明细, {变化类型: 预订行数})，明细的列跟在住记录一样，多一列 变化。
+    """
+    new_keys = compare_stays.index.difference(base_stays.index)
+    cancelled_keys = base_stays.index.difference(compare_stays.index)
+    common_keys = base_stays.index.intersection(compare_stays.index)
+    base_common = base_stays.loc[common_keys, PICKUP_COMPARE_COLS]
+    compare_common = compare_stays.loc[common_keys, PICKUP_COMPARE_COLS]
+    modified_keys = common_keys[(base_common != compare_common).any(axis=1).to_numpy()]
+
+    def signed(stays, keys, change, sign):
+        rows = stays.loc[keys]
+        return rows.assign(房数=rows['房数'] * sign, 变化=change)
+
+    deltas = pd.concat([
+        signed(compare_stays, new_keys, PICKUP_NEW, 1),
+        signed(base_stays, cancelled_keys, PICKUP_CANCELLED, -1),
+        signed(base_stays, modified_keys, PICKUP_MODIFIED, -1),
+        signed(compare_stays, modified_keys, PICKUP_MODIFIED, 1),
+    ], ignore_index=True)
+    counts = {PICKUP_NEW: len(new_keys), PICKUP_CANCELLED: len(cancelled_keys), PICKUP_MODIFIED: len(modified_keys)}
+    return deltas, counts
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def compute_pickup(base_key, compare_key, _base_stays, _compare_stays):
+    """
+    操，按 (基准快照, 对比快照) 缓存的 pickup 立方体，桶是 (楼层, 市场码, 变化)。
+    返回 (立方体, {变化类型: 预订行数})，两份一模一样的时候立方体是 None。
+    """
+    deltas, counts = diff_snapshots(_base_stays, _compare_stays)
+    return build_occupancy_cube(deltas, group_cols=('楼层', '市场码', '变化')), counts
+
+def query_pickup(cube, day_keys, market_codes):
+    """
+    操，从 pickup 立方体里查：每栋楼一张 每天 × (新增, 取消, 修改, 净Pickup) 的表，
+    再加一张所选日期内按 (楼层, 市场码) 汇总的表。返回 ({楼栋: 每日表}, 市场码汇总表)。
+    """
+    values = slice_cube_days(cube, day_keys)
+    keys = cube.group_keys
+    selected = keys['市场码'].isin(market_codes).to_numpy()
+    buildings = keys['楼层'].astype(str).to_numpy()
+    change_codes = pd.Categorical(keys['变化'], categories=PICKUP_CHANGE_TYPES).codes
+    dates = pd.Index(day_keys_to_dates(day_keys), name='住店日')
+
+    daily_tables = {}
+    for building in sorted(set(buildings[selected])):
+        rows = selected & (buildings == building)
+        totals = np.zeros((len(PICKUP_CHANGE_TYPES), values.shape[1]), dtype=values.dtype)
+        np.add.at(totals, change_codes[rows], values[rows])
+        table = pd.DataFrame(totals.T, index=dates, columns=PICKUP_CHANGE_TYPES)
+        table[PICKUP_NET_LABEL] = table.sum(axis=1)
+        daily_tables[building] = table
+
+    market_table = (
+        keys[selected].assign(间夜=values[selected].sum(axis=1))
+        .pivot_table(index=['楼层', '市场码'], columns='变化', values='间夜', aggfunc='sum', fill_value=0, observed=True)
+        .reindex(columns=PICKUP_CHANGE_TYPES, fill_value=0)
+    )
+    market_table.columns.name = None
+    market_table[PICKUP_NET_LABEL] = market_table.sum(axis=1)
+    return daily_tables, market_table[market_table.any(axis=1)]
+
 @st.cache_data
-def process_data_analysis(uploaded_file):
-    """处理上传的Excel文件，为数据分析做准备。"""
+def process_data_analysis(file_key, _file_content):
+    """处理上传的订单表 (Excel/CSV/Parquet)，为数据分析做准备。按文件内容哈希缓存。"""
     try:
-        df = pd.read_excel(uploaded_file)
-        # 操，统一列名为大写并去除空格
-        df.columns = [str(col).strip().upper() for col in df.columns]
-
         # 操，定义需要重命名的列和检查的列
         rename_map = {
             'ROOM CATEGORY': '房类', 'ROOMS': '房数', 'ARRIVAL': '到达',
@@ -34,6 +305,12 @@ def process_data_analysis(uploaded_file):
             '市场码': ['MARKET', '市场码'],
             '状态': ['STATUS', '状态']
         }
+        # 操，跟别的工具一样走共用的读取 (calamine 优先、全按文本读)，只解码上面这几列
+        wanted_cols = {name.strip().upper() for names in possible_names.values() for name in names}
+        df = read_table_bytes(_file_content, usecols=lambda col: str(col).strip().upper() in wanted_cols)
+        # 操，统一列名为大写并去除空格
+        df.columns = [str(col).strip().upper() for col in df.columns]
+
         actual_rename_map = {}
         required_cols_standard = ['状态', '房类', '房数', '到达', '离开', '房价', '市场码']
         missing_cols = []
@@ -61,63 +338,55 @@ def process_data_analysis(uploaded_file):
         df.rename(columns=actual_rename_map, inplace=True)
 
         # --- 操，开始处理数据 ---
-        df['到达_str'] = df['到达'].astype(str).str.split(' ').str[0]
-        df['离开_str'] = df['离开'].astype(str).str.split(' ').str[0]
-
-        # 操，尝试多种日期格式
-        df['到达'] = pd.to_datetime(df['到达_str'], format='%y/%m/%d', errors='coerce')
-        df['离开'] = pd.to_datetime(df['离开_str'], format='%y/%m/%d', errors='coerce')
-        # 操，如果第一种格式不行，试试 YYYY/MM/DD
-        df['到达'] = df['到达'].fillna(pd.to_datetime(df['到达_str'], format='%Y/%m/%d', errors='coerce'))
-        df['离开'] = df['离开'].fillna(pd.to_datetime(df['离开_str'], format='%Y/%m/%d', errors='coerce'))
-         # 操，再不行，试试 YYYY-MM-DD
-        df['到达'] = df['到达'].fillna(pd.to_datetime(df['到达_str'], format='%Y-%m-%d', errors='coerce'))
-        df['离开'] = df['离开'].fillna(pd.to_datetime(df['离开_str'], format='%Y-%m-%d', errors='coerce'))
+        # 操，日期格式整列检测一次再一次性转换，只要日期部分
+        df['到达'], bad_arrival = parse_date_column(df['到达'])
+        df['离开'], bad_departure = parse_date_column(df['离开'])
+        df['到达'] = df['到达'].dt.normalize()
+        df['离开'] = df['离开'].dt.normalize()
+        bad_date_rows = int((bad_arrival | bad_departure).sum())
+        if bad_date_rows:
+            st.warning(f"有 {bad_date_rows} 行的到达/离开日期无法识别，这些行已跳过。")
 
         df['房价'] = pd.to_numeric(df['房价'], errors='coerce')
         df['房数'] = pd.to_numeric(df['房数'], errors='coerce')
-        df['市场码'] = df['市场码'].astype(str).str.strip()
-        df['状态'] = df['状态'].astype(str).str.strip().str.upper() # 操，状态转大写去空格
+        # 操，pandas 3 的 astype(str) 会把空值留成 NaN，市场码空着的先填成空字符串，当一个单独的市场码
+        df['市场码'] = df['市场码'].fillna('').astype(str).str.strip().astype('category')
+        df['状态'] = df['状态'].astype(str).str.strip().str.upper().astype('category') # 操，状态转大写去空格
 
         # 操，删除关键列为空的行
         df.dropna(subset=['到达', '离开', '房价', '房数', '房类', '状态'], inplace=True)
         if df.empty:
             st.warning("清理后没有有效的数据行。请检查文件内容。")
-            return pd.DataFrame(), pd.DataFrame() # 返回空的DataFrame
+            return pd.DataFrame(), None # 返回空的DataFrame
 
         df['房数'] = df['房数'].astype(int)
 
-        # 操，楼层分配（这里可以用 config.py 里的列表，但为了独立先写死）
-        jinling_rooms = ['DETN', 'DKN', 'DQN', 'DQS', 'DSKN', 'DSTN', 'DTN', 'EKN', 'EKS', 'ESN', 'ESS', 'ETN', 'ETS', 'FSB', 'FSC', 'FSN', 'OTN', 'PSA', 'PSB', 'RSN', 'SKN', 'SQN', 'SQS', 'SSN', 'SSS', 'STN', 'STS']
-        yatai_rooms = ['JDEN', 'JDKN', 'JDKS', 'JEKN', 'JESN', 'JESS', 'JETN', 'JETS', 'JKN', 'JLKN', 'JTN', 'JTS', 'PSC', 'PSD', 'VCKD', 'VCKN']
-        room_to_building = {code: "金陵楼" for code in jinling_rooms}
-        room_to_building.update({code: "亚太楼" for code in yatai_rooms})
-
+        # 操，楼层分配统一查 config 里的房型目录
         df['房类'] = df['房类'].astype(str).str.strip().str.upper() # 房类也转大写去空格
-        df = df[df['房类'].isin(jinling_rooms + yatai_rooms)].copy() # 只保留已知房型
+        df['楼层'] = lookup_buildings(df['房类'])
+        df = df[df['楼层'] != BUILDING_OTHER].copy() # 只保留金陵楼/亚太楼的房型
         if df.empty:
             st.warning("文件中没有找到金陵楼或亚太楼的有效房型记录。")
-            return pd.DataFrame(), pd.DataFrame()
-
-        df['楼层'] = df['房类'].map(room_to_building)
+            return pd.DataFrame(), None
+        df['楼层'] = df['楼层'].cat.remove_unused_categories()
         df['入住天数'] = (df['离开'].dt.normalize() - df['到达'].dt.normalize()).dt.days
+        # 操，整数天号每个文件只算一次，后面所有筛选都比整数
+        df['到达日'] = to_day_keys(df['到达'])
+        df['离开日'] = to_day_keys(df['离开'])
 
         df_for_arrivals = df.copy() # 用于到店离店统计的原始数据
 
         # 操，准备每日在住数据，只选 R 和 I 状态且入住天数大于0
-        df_for_stays = df[(df['入住天数'] > 0) & (df['状态'].isin(['R', 'I']))].copy()
+        df_for_stays = df[(df['入住天数'] > 0) & (df['状态'].isin(STAY_STATUSES))].copy()
 
         if df_for_stays.empty:
             st.warning("没有找到状态为 'R' 或 'I' 且入住天数大于0的记录，无法生成每日在住矩阵。")
-            return df_for_arrivals, pd.DataFrame() # 返回空的在住DataFrame
+            return df_for_arrivals, None # 没有在住立方体
 
-        # 操，展开数据
-        df_repeated = df_for_stays.loc[df_for_stays.index.repeat(df_for_stays['入住天数'])]
-        date_offset = df_repeated.groupby(level=0).cumcount()
-        df_repeated['住店日'] = df_repeated['到达'].dt.normalize() + pd.to_timedelta(date_offset, unit='D')
-        expanded_df = df_repeated.drop(columns=['到达', '离开', '入住天数', '到达_str', '离开_str']).reset_index(drop=True)
+        # 操，不展开间夜了，直接按 (楼层, 市场码, 房价) 建好 每天 × 桶 的在住立方体
+        occupancy_cube = build_occupancy_cube(df_for_stays)
 
-        return df_for_arrivals, expanded_df.copy()
+        return df_for_arrivals, occupancy_cube
 
     except Exception as e:
         st.error(f"处理Excel文件时发生错误: {e}")
@@ -128,17 +397,24 @@ def process_data_analysis(uploaded_file):
 def run_data_analysis_app():
     """运行数据分析驾驶舱的Streamlit界面。"""
     st.title("金陵工具箱 - 数据分析驾驶舱")
-    uploaded_file = st.file_uploader("上传您的Excel文件 (包含状态, 房类, 房数, 到达, 离开, 房价, 市场码)", type=["xlsx", "xls"], key="data_analysis_uploader")
+    analysis_mode = st.radio("分析模式", ANALYSIS_MODES, horizontal=True, key="analysis_mode")
+    if analysis_mode == ANALYSIS_MODE_PICKUP:
+        run_pickup_analysis()
+        return
+
+    uploaded_file = st.file_uploader("上传您的Excel文件 (包含状态, 房类, 房数, 到达, 离开, 房价, 市场码)", type=ORDER_EXPORT_UPLOAD_TYPES, key="data_analysis_uploader")
 
     if not uploaded_file:
         st.info("请上传您的Excel文件以开始分析。")
         return
 
-    original_df, expanded_df = process_data_analysis(uploaded_file)
+    file_content = uploaded_file.getvalue()
+    file_key = content_hash(file_content)
+    original_df, occupancy_cube = process_data_analysis(file_key, file_content)
 
     if original_df is None: # 操，处理数据时就出错了
         return
-    if original_df.empty and (expanded_df is None or expanded_df.empty):
+    if original_df.empty and occupancy_cube is None:
         # st.warning("上传的文件中没有找到有效的数据记录，或未能处理成功。请检查文件内容和格式。") # process_data_analysis 里已经有提示了
         return
 
@@ -167,12 +443,9 @@ def run_data_analysis_app():
         arrival_summary = pd.DataFrame()
         if arrival_dates_str and selected_arrival_statuses:
             try:
-                date_strings = [d.strip() for d in arrival_dates_str.split(',') if d.strip()]
-                selected_arrival_dates = [pd.to_datetime(d, format='%Y/%m/%d').date() for d in date_strings]
-                arrival_df = original_df[(original_df['状态'].isin(selected_arrival_statuses)) & (original_df['到达'].dt.date.isin(selected_arrival_dates))].copy()
-                if not arrival_df.empty:
-                    arrival_summary = arrival_df.groupby([arrival_df['到达'].dt.date, '楼层'])['房数'].sum().unstack(fill_value=0)
-                    arrival_summary.index.name = "到店日期"
+                arrival_day_keys = parse_date_keys(arrival_dates_str)
+                arrival_summary = summarize_rooms_by_day(file_key, original_df, '到达日', tuple(sorted(selected_arrival_statuses)), arrival_day_keys, "到店日期")
+                if not arrival_summary.empty:
                     st.dataframe(arrival_summary)
                 else:
                     st.warning(f"在所选日期和状态内没有找到到店记录。")
@@ -200,12 +473,9 @@ def run_data_analysis_app():
         departure_summary = pd.DataFrame()
         if departure_dates_str and selected_departure_statuses:
             try:
-                date_strings = [d.strip() for d in departure_dates_str.split(',') if d.strip()]
-                selected_departure_dates = [pd.to_datetime(d, format='%Y/%m/%d').date() for d in date_strings]
-                departure_df = original_df[(original_df['状态'].isin(selected_departure_statuses)) & (original_df['离开'].dt.date.isin(selected_departure_dates))].copy()
-                if not departure_df.empty:
-                    departure_summary = departure_df.groupby([departure_df['离开'].dt.date, '楼层'])['房数'].sum().unstack(fill_value=0)
-                    departure_summary.index.name = "离店日期"
+                departure_day_keys = parse_date_keys(departure_dates_str)
+                departure_summary = summarize_rooms_by_day(file_key, original_df, '离开日', tuple(sorted(selected_departure_statuses)), departure_day_keys, "离店日期")
+                if not departure_summary.empty:
                     st.dataframe(departure_summary)
                 else:
                     st.warning(f"在所选日期和状态内没有找到离店记录。")
@@ -225,222 +495,53 @@ def run_data_analysis_app():
     # --- 2. 每日在住房间按价格分布矩阵 ---
     st.markdown("---")
     st.header("2. 每日在住房间按价格分布矩阵 (仅统计状态 R 和 I)")
-    if expanded_df is None or expanded_df.empty:
+    if occupancy_cube is None:
         st.warning("没有可用于生成在住价格分布矩阵的数据。请确保上传的文件包含状态为 R 或 I 且入住天数大于0的记录。")
     else:
         with st.expander("点击展开或折叠", expanded=True):
-            default_stay_date = ""
-            if '住店日' in expanded_df.columns and not expanded_df['住店日'].isna().all():
-                try:
-                    default_stay_date = pd.to_datetime(expanded_df['住店日'].min()).strftime('%Y/%m/%d')
-                except Exception:
-                     default_stay_date = date.today().strftime('%Y/%m/%d')
-
-            stay_dates_str = st.text_input("输入住店日期 (用逗号分隔, 格式: YYYY/MM/DD)", default_stay_date, key="stay_date_input")
+            first_stay_day, last_stay_day = cube_day_range(occupancy_cube)
+            selected_stay_days = stay_day_picker(first_stay_day, last_stay_day, "stay")
 
-            selected_stay_dates = []
-            if stay_dates_str:
-                try:
-                    stay_date_strings = [d.strip() for d in stay_dates_str.split(',') if d.strip()]
-                    selected_stay_dates = [pd.to_datetime(d, format='%Y/%m/%d').date() for d in stay_date_strings]
-                except ValueError:
-                    st.error("住店日期格式不正确，请输入 YYYY/MM/DD 格式。")
-                    st.stop() # 操，格式错了就别往下跑了
-                except Exception as e:
-                    st.error(f"处理住店日期时出错: {e}")
-                    st.stop()
-
-            all_market_codes_stay = sorted(expanded_df['市场码'].dropna().unique()) if '市场码' in expanded_df.columns else []
-            selected_market_codes = st.multiselect("选择市场码 (可多选)", options=all_market_codes_stay, default=all_market_codes_stay, key="market_code_select")
+            all_market_codes_stay = sorted(occupancy_cube.group_keys['市场码'].dropna().unique())
+            selected_market_codes = st.multiselect(
+                "选择市场码 (可多选)", options=all_market_codes_stay, default=all_market_codes_stay,
+                format_func=lambda code: code or BLANK_MARKET_LABEL, key="market_code_select"
+            )
 
             st.subheader("自定义价格区间")
             col1, col2 = st.columns(2)
-            with col1: price_bins_jinling_str = st.text_input("金陵楼价格区间 (例: <401, 401-480, >599)", "<401, 401-480, 481-500, 501-550, 551-599, >599", key="bins_jl")
-            with col2: price_bins_yatal_str = st.text_input("亚太楼价格区间 (例: <501, 501-600, >799)", "<501, 501-600, 601-699, 700-749, 750-799, >799", key="bins_yt")
-
-            def parse_price_bins(price_bins_str):
-                """解析价格区间字符串"""
-                if not price_bins_str or not price_bins_str.strip(): return [], [] # 返回空列表
-                intervals = []
-                bins_set = set([-np.inf, np.inf]) # 操，包含无穷
+            with col1: price_bins_jinling_str = st.text_input("金陵楼价格区间 (例: <401, 401-480, >599)", DEFAULT_PRICE_BANDS[BUILDING_JINLING], key="bins_jl")
+            with col2: price_bins_yatal_str = st.text_input("亚太楼价格区间 (例: <501, 501-600, >799)", DEFAULT_PRICE_BANDS[BUILDING_YATAI], key="bins_yt")
+            st.caption("写法：`<x` 小于 x，`a-b` 含两端，`>x` 大于 x，单个数字只算这个价；区间不能重叠，空出来的价格归“未分类”。")
+
+            # 操，区间字符串解析有缓存，改区间只会重新分箱，不会重新读文件
+            valid_band_specs = []
+            for building, price_bins_str in ((BUILDING_JINLING, price_bins_jinling_str), (BUILDING_YATAI, price_bins_yatal_str)):
                 try:
-                    for item in price_bins_str.split(','):
-                        item = item.strip()
-                        if item.startswith('<'):
-                            upper = float(re.search(r'\d+(\.\d+)?', item).group())
-                            intervals.append({'lower': -np.inf, 'upper': upper, 'label': f'< {upper}'})
-                            bins_set.add(upper)
-                        elif item.startswith('>'):
-                            lower = float(re.search(r'\d+(\.\d+)?', item).group())
-                            intervals.append({'lower': lower, 'upper': np.inf, 'label': f'> {lower}'})
-                            bins_set.add(lower)
-                        elif '-' in item:
-                            parts = item.split('-')
-                            lower, upper = float(parts[0]), float(parts[1])
-                            if lower >= upper: raise ValueError(f"价格区间 '{item}' 无效：下限必须小于上限。")
-                            intervals.append({'lower': lower, 'upper': upper, 'label': f'{lower}-{upper}'})
-                            bins_set.add(lower)
-                            bins_set.add(upper)
-                        else:
-                            # 操，尝试解析单个数字作为一个区间
-                            single_val = float(item)
-                            intervals.append({'lower': single_val, 'upper': single_val, 'label': f'{single_val}'})
-                            bins_set.add(single_val)
-
-                    # 操，重新排序和生成标签/bins
-                    sorted_bins = sorted(list(bins_set))
-                    final_bins = []
-                    final_labels = []
-
-                    # 处理最低边界
-                    if sorted_bins[0] == -np.inf:
-                        if len(sorted_bins) > 1 and sorted_bins[1] != np.inf:
-                            final_bins.append(sorted_bins[1])
-                            final_labels.append(f'< {sorted_bins[1]}')
-                        else: # 只有无穷的情况
-                           pass
-                    else: # 没有负无穷，第一个bin是具体数字
-                         final_bins.append(sorted_bins[0])
-                         final_labels.append(f'< {sorted_bins[0]}') # 小于等于第一个数字
-
-                    # 处理中间区间
-                    for i in range(len(sorted_bins) - 1):
-                        lower = sorted_bins[i]
-                        upper = sorted_bins[i+1]
-                        if lower != -np.inf and upper != np.inf:
-                            # 操，检查是否为单个数字区间
-                            is_single_value_interval = any(inv for inv in intervals if inv['lower'] == lower and inv['upper'] == lower and inv['lower'] != -np.inf)
-                            if lower == upper or is_single_value_interval:
-                                 # 如果列表中已经有这个标签，就不加了，避免重复
-                                if f'{lower}' not in final_labels:
-                                     final_bins.append(lower) # 加一个bin点
-                                     final_labels.append(f'{lower}')
-                            elif lower < upper:
-                                 # 如果bins里已经有upper，就不加了
-                                if upper not in final_bins: final_bins.append(upper)
-                                final_labels.append(f'{lower}-{upper}')
-
-                    # 处理最高边界
-                    if sorted_bins[-1] != np.inf:
-                         # 如果最后一个bin不是无穷大，那么添加 > last_bin 的区间
-                         # 如果标签里还没加过
-                         if f'> {sorted_bins[-1]}' not in final_labels:
-                            final_bins.append(np.inf) # 加无穷大作为最后一个bin点
-                            final_labels.append(f'> {sorted_bins[-1]}')
-                    # else: # 如果最后一个已经是inf，在处理中间区间时应该已经包含了 > xxx
-
-                    # 操，去重 final_bins 并排序
-                    final_bins = sorted(list(set(final_bins)))
-                     # 操，确保labels数量比bins少一个
-                    if len(final_labels) == len(final_bins):
-                        # 可能只有一个区间 < inf 或者 > -inf
-                         if len(final_bins) == 2 and final_bins[0] == -np.inf and final_bins[1] == np.inf:
-                              final_labels = ["所有价格"]
-                         elif len(final_bins) > 1 : # 一般情况
-                              final_bins = final_bins # 保持不变
-                              # 操，尝试根据bins重建labels
-                              new_labels = []
-                              if final_bins[0] == -np.inf:
-                                   if final_bins[1] != np.inf: new_labels.append(f'< {final_bins[1]}')
-                                   start_index = 1
-                              else:
-                                   new_labels.append(f'<= {final_bins[0]}') # 第一个区间
-                                   start_index = 0
-
-                              for i in range(start_index, len(final_bins) - 1):
-                                   lower_b = final_bins[i]
-                                   upper_b = final_bins[i+1]
-                                   if upper_b != np.inf:
-                                        new_labels.append(f'{lower_b}-{upper_b}')
-                                   else:
-                                        new_labels.append(f'> {lower_b}')
-                                        break # 到无穷大就结束了
-                              final_labels = new_labels
-
-                    elif len(final_labels) != len(final_bins) -1 :
-                         # 操，数量对不上，可能有问题，返回空
-                         st.warning(f"解析价格区间 '{price_bins_str}' 后，标签和边界数量不匹配 ({len(final_labels)} labels, {len(final_bins)} bins)。请检查格式。")
-                         return [], []
-
-
-                    return final_bins, final_labels
-
-                except Exception as e:
-                    st.error(f"解析价格区间 '{price_bins_str}' 时出错: {e}。请检查格式。")
-                    return [], [] # 返回空列表
-
-            bins_jinling, labels_jinling = parse_price_bins(price_bins_jinling_str)
-            bins_yatal, labels_yatal = parse_price_bins(price_bins_yatal_str)
+                    bands = parse_price_bands(price_bins_str)
+                except ValueError as e:
+                    st.error(f"{building}价格区间设置错误: {e}")
+                    continue
+                if bands.labels:
+                    valid_band_specs.append((building, price_bins_str))
+            bands_by_building = dict(valid_band_specs)
 
             dfs_to_download_matrix = {}
-            if selected_stay_dates and selected_market_codes:
-                matrix_df_filtered = expanded_df[(expanded_df['住店日'].dt.date.isin(selected_stay_dates)) & (expanded_df['市场码'].isin(selected_market_codes))].copy()
+            if selected_stay_days and selected_market_codes:
+                matrix_buildings, price_matrices = compute_price_matrices(file_key, occupancy_cube, selected_stay_days, tuple(sorted(selected_market_codes)), tuple(valid_band_specs))
 
-                if not matrix_df_filtered.empty:
-                    buildings = sorted(matrix_df_filtered['楼层'].unique())
-                    for building in buildings:
+                if matrix_buildings:
+                    for building in matrix_buildings:
                         st.subheader(f"{building} - 在住房间分布")
-                        building_df = matrix_df_filtered[matrix_df_filtered['楼层'] == building].copy()
-                        bins, labels = (bins_jinling, labels_jinling) if building == "金陵楼" else (bins_yatal, labels_yatal)
-
-                        if not building_df.empty and bins and labels:
-                             # 操，确保房价是数字
-                            building_df['房价'] = pd.to_numeric(building_df['房价'], errors='coerce')
-                            building_df.dropna(subset=['房价'], inplace=True)
-
-                            if not building_df.empty:
-                                # 操，使用 pd.cut 进行分箱
-                                # include_lowest=True 确保包含最低值, right=True 表示区间右闭合 (e.g., (401, 480])
-                                # 但是第一个区间 (< x) 需要特殊处理，pd.cut默认左开右闭，除非 include_lowest
-                                # 最后一个区间 (> y) 也是
-                                try:
-                                     # 操，根据bins第一个和最后一个是否是无穷大来调整 include_lowest 和 right
-                                     _include_lowest = bins[0] == -np.inf
-                                     _right = True # 默认右闭合
-
-                                     building_df['价格区间'] = pd.cut(building_df['房价'], bins=bins, labels=labels, right=_right, include_lowest=_include_lowest, ordered=False) # ordered=False 避免后续问题
-
-                                     # 操，处理NaN （价格不在任何区间内）
-                                     building_df['价格区间'] = building_df['价格区间'].astype(str).fillna('未分类') # 转成字符串，NaN填'未分类'
-
-                                     pivot_table = pd.pivot_table(building_df,
-                                                                 index=building_df['住店日'].dt.date, # 使用dt.date确保按日期聚合
-                                                                 columns='价格区间',
-                                                                 values='房数',
-                                                                 aggfunc='sum',
-                                                                 fill_value=0)
-
-                                     if not pivot_table.empty:
-                                        # 操，计算每日总计
-                                        pivot_table['每日总计'] = pivot_table.sum(axis=1)
-                                        # 操，把列按照标签顺序排一下（如果标签是从bins生成的）
-                                        ordered_columns = [l for l in labels if l in pivot_table.columns]
-                                        if '未分类' in pivot_table.columns: ordered_columns.append('未分类')
-                                        ordered_columns.append('每日总计')
-                                        pivot_table = pivot_table[ordered_columns]
-
-                                        st.dataframe(pivot_table.sort_index())
-                                        dfs_to_download_matrix[f"{building}_在住分布"] = pivot_table
-                                     else:
-                                        st.info(f"在 {building} 中，没有找到符合所选条件的在住记录。")
-
-                                except ValueError as ve:
-                                     if "Overlapping bins" in str(ve):
-                                         st.error(f"价格区间设置错误: 区间 '{price_bins_jinling_str if building == '金陵楼' else price_bins_yatal_str}' 存在重叠，请修改。Bins: {bins}")
-                                     elif "Bin edges must be unique" in str(ve):
-                                          st.error(f"价格区间设置错误: 区间边界 '{price_bins_jinling_str if building == '金陵楼' else price_bins_yatal_str}' 存在重复值，请修改。Bins: {bins}")
-                                     else:
-                                          st.error(f"为 {building} 生成价格分布时出错: {ve}. Bins: {bins}, Labels: {labels}")
-
-                                except Exception as e:
-                                     st.error(f"为 {building} 生成价格分布时发生未知错误: {e}. Bins: {bins}, Labels: {labels}")
-                                     st.error(f"Traceback: {traceback.format_exc()}")
-                            else:
-                                 st.info(f"在 {building} 中，筛选后没有带有效房价的在住记录。")
-                        elif not building_df.empty:
-                             st.warning(f"未成功解析 {building} 的价格区间，无法生成分布矩阵。请检查区间格式。")
-                        else:
-                             st.info(f"在 {building} 中，没有找到符合所选条件的在住记录。")
+                        if building not in bands_by_building:
+                            st.warning(f"未成功解析 {building} 的价格区间，无法生成分布矩阵。请检查区间格式。")
+                            continue
+                        pivot_table = price_matrices.get(building)
+                        if pivot_table is None or pivot_table.empty:
+                            st.info(f"在 {building} 中，没有找到符合所选条件的在住记录。")
+                            continue
+                        st.dataframe(pivot_table)
+                        dfs_to_download_matrix[f"{building}_在住分布"] = pivot_table
                 else:
                     st.warning(f"在所选日期和市场码范围内没有找到状态为 R 或 I 的在住记录。")
 
@@ -449,3 +550,98 @@ def run_data_analysis_app():
                 excel_data_matrix = to_excel(dfs_to_download_matrix)
                 st.download_button(label="下载价格分布矩阵为 Excel", data=excel_data_matrix, file_name="price_matrix_summary.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", key="download_matrix")
 
+
+def run_pickup_analysis():
+    """操，Pickup 对比：两份以上系统订单 (上传或者快照)，选一份当基准，看另一份比它多卖/少卖了多少间夜。"""
+    uploaded_files = st.file_uploader(
+        "上传两份或以上系统订单导出 (包含预订号, 状态, 房类, 房数, 到达, 离开, 房价, 市场码)",
+        type=ORDER_EXPORT_UPLOAD_TYPES, accept_multiple_files=True, key="pickup_uploader"
+    )
+    snapshots = ORDER_SNAPSHOTS.list() if PYARROW_AVAILABLE else []
+    selected_snapshots = st.multiselect(
+        "或者选已保存的系统导出快照", snapshots,
+        format_func=lambda s: f"{s.created:%Y-%m-%d %H:%M} · {s.source_name}", key="pickup_snapshots"
+    ) if snapshots else []
+
+    # 操，标签 -> (内容哈希, 上传文件或快照)，快照按时间从旧到新排，上传的按上传顺序排在后面
+    sources = {}
+    for snapshot in sorted(selected_snapshots, key=lambda s: s.created):
+        sources[f"快照 {snapshot.created:%Y-%m-%d %H:%M} · {snapshot.source_name}"] = (snapshot.file_key, snapshot)
+    for uploaded_file in uploaded_files or []:
+        sources[f"上传 · {uploaded_file.name}"] = (content_hash(uploaded_file.getvalue()), uploaded_file)
+    if len(sources) < 2:
+        st.info("请至少上传或选择两份系统订单，才能计算 pickup。")
+        return
+
+    labels = list(sources)
+    col_base, col_compare = st.columns(2)
+    with col_base: base_label = st.selectbox("基准订单 (旧)", labels, index=0, key="pickup_base")
+    with col_compare: compare_label = st.selectbox("对比订单 (新)", labels, index=len(labels) - 1, key="pickup_compare")
+    if base_label == compare_label:
+        st.warning("基准和对比选的是同一份订单，请换一份。")
+        return
+
+    stays_by_label = {}
+    for label, (file_key, source) in sources.items():
+        try:
+            df, missing_cols = load_order_export(source, PICKUP_COLUMN_MAP, snapshot=True)
+        except FileNotFoundError as e:
+            st.error(f"{label}: {e}")
+            return
+        if missing_cols:
+            st.error(f"{label} 缺少必要的列: {', '.join(missing_cols)}")
+            return
+        stays_by_label[label] = prepare_pickup_stays(file_key, df)
+
+    base_key = sources[base_label][0]
+    pickup_cube, change_counts = compute_pickup(base_key, sources[compare_label][0], stays_by_label[base_label], stays_by_label[compare_label])
+
+    metric_cols = st.columns(len(PICKUP_CHANGE_TYPES))
+    for col, change in zip(metric_cols, PICKUP_CHANGE_TYPES):
+        col.metric(f"{change}预订 (行)", change_counts[change])
+    if pickup_cube is None:
+        st.info("两份订单的在住预订完全一样，没有 pickup。")
+        return
+
+    first_day, last_day = cube_day_range(pickup_cube)
+    selected_days = stay_day_picker(first_day, last_day, "pickup")
+    all_market_codes = sorted(pickup_cube.group_keys['市场码'].unique())
+    selected_market_codes = st.multiselect(
+        "选择市场码 (可多选)", options=all_market_codes, default=all_market_codes,
+        format_func=lambda code: code or BLANK_MARKET_LABEL, key="pickup_market_select"
+    )
+    if not selected_days or not selected_market_codes:
+        return
+
+    daily_tables, market_table = query_pickup(pickup_cube, selected_days, selected_market_codes)
+    dfs_to_download = {}
+    for building, table in daily_tables.items():
+        st.subheader(f"{building} - 每日间夜 pickup")
+        st.dataframe(table)
+        dfs_to_download[f"{building}_pickup"] = table.reset_index()
+    if not market_table.empty:
+        st.subheader("按市场码汇总 (所选日期合计)")
+        st.dataframe(market_table)
+        dfs_to_download["市场码汇总"] = market_table.reset_index()
+    if not dfs_to_download:
+        st.warning("在所选日期和市场码范围内没有 pickup。")
+
+    # 操，两份以上的时候，其他每份都跟同一个基准比一下净 pickup，每一对都有缓存
+    if len(sources) > 2:
+        st.subheader("各订单相对基准的净 pickup (所选日期合计)")
+        overview_rows = []
+        for label, (file_key, _) in sources.items():
+            if label == base_label:
+                continue
+            cube, counts = compute_pickup(base_key, file_key, stays_by_label[base_label], stays_by_label[label])
+            net = 0
+            if cube is not None:
+                tables, _ = query_pickup(cube, selected_days, selected_market_codes)
+                net = int(sum(table[PICKUP_NET_LABEL].sum() for table in tables.values()))
+            overview_rows.append({'订单': label, **{f"{change}预订 (行)": counts[change] for change in PICKUP_CHANGE_TYPES}, PICKUP_NET_LABEL: net})
+        overview = pd.DataFrame(overview_rows)
+        st.dataframe(overview, hide_index=True)
+        dfs_to_download["相对基准汇总"] = overview
+
+    if dfs_to_download:
+        st.download_button(label="下载 pickup 结果为 Excel", data=to_excel(dfs_to_download), file_name="pickup_summary.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", key="download_pickup")
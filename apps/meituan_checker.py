@@ -7,88 +7,124 @@ from email.parser import BytesParser
 import chardet
 import io
 import base64
-from utils import find_and_rename_columns, to_excel # 从 utils 导入函数
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from utils import to_excel, content_hash, PARSE_CACHE, parse_date_column, load_order_export, order_export_input # 从 utils 导入函数
 from config import MEITUAN_SYSTEM_COLUMN_MAP # 从 config 导入列名映射
 
-def parse_eml(file_content):
-    """解析 EML 文件内容，提取文本信息，自动检测编码。"""
+# 操，chardet 只看前面这么多字节，整封邮件喂进去慢得要死
+CHARDET_SAMPLE_BYTES = 32 * 1024
+# 操，MIME 头里写 gb2312/gbk 的，实际内容经常超出字符集，统一按超集 gb18030 解
+CHARSET_ALIASES = {'gb2312': 'gb18030', 'gbk': 'gb18030', 'x-gbk': 'gb18030'}
+# 操，文件少于这个数就别开进程池了，开池子比解析还慢
+EML_POOL_MIN_FILES = 8
+
+def decode_payload(payload_bytes, declared_charset=None):
+    """先按 MIME 头声明的编码解，解不了再用 chardet 看一小段样本猜编码。"""
+    if declared_charset:
+        charset = CHARSET_ALIASES.get(declared_charset.lower(), declared_charset)
+        try:
+            return payload_bytes.decode(charset)
+        except (UnicodeDecodeError, LookupError):
+            pass
+    detected_encoding = chardet.detect(payload_bytes[:CHARDET_SAMPLE_BYTES])['encoding']
+    if detected_encoding:
+        detected_encoding = CHARSET_ALIASES.get(detected_encoding.lower(), detected_encoding)
+        try:
+            return payload_bytes.decode(detected_encoding, errors='replace')
+        except LookupError:
+            pass
+    # 如果检测失败，就用 utf-8 硬解
+    return payload_bytes.decode('utf-8', errors='replace')
+
+def _decode_text_part(part, warnings, error_label):
+    """解码一个 text/plain 部分，出错时尝试把原始负载当 base64 再解一次。"""
     try:
-        # 使用 BytesParser 解析原始字节内容
-        msg = BytesParser(policy=policy.default).parsebytes(file_content)
-
-        body_text = ""
-
-        if msg.is_multipart():
-            for part in msg.walk():
-                content_type = part.get_content_type()
-                content_disposition = str(part.get("Content-Disposition"))
-
-                # 跳过附件和非文本部分
-                if part.is_attachment() or "attachment" in content_disposition:
-                    continue
-
-                if content_type == "text/plain":
-                    try:
-                        # 获取原始字节负载
-                        payload_bytes = part.get_payload(decode=True)
-                        # 检测编码
-                        detected_encoding = chardet.detect(payload_bytes)['encoding']
-                        if detected_encoding:
-                            body_text += payload_bytes.decode(detected_encoding, errors='replace')
-                        else:
-                            # 如果检测失败，尝试用 utf-8 或 gbk
-                            try:
-                                body_text += payload_bytes.decode('utf-8', errors='replace')
-                            except UnicodeDecodeError:
-                                body_text += payload_bytes.decode('gbk', errors='replace')
-                        body_text += "\n" # 添加换行符分隔不同部分
-                    except Exception as e_decode:
-                        st.warning(f"解码 text/plain 部分时出错: {e_decode}")
-                        # 如果解码失败，尝试获取原始负载（可能是 base64 编码的）
-                        raw_payload = part.get_payload(decode=False)
-                        if isinstance(raw_payload, str):
-                            try:
-                                decoded_bytes = base64.b64decode(raw_payload)
-                                detected_encoding = chardet.detect(decoded_bytes)['encoding']
-                                if detected_encoding:
-                                     body_text += decoded_bytes.decode(detected_encoding, errors='replace') + "\n"
-                            except Exception:
-                                pass # 忽略解码 base64 失败的情况
-
-                elif content_type == "text/html":
-                     # 可以选择性地处理 HTML 内容，例如提取纯文本，但当前需求只关注 JLG
-                     pass
-        else:
-            # 处理非 multipart 邮件
-            content_type = msg.get_content_type()
-            if content_type == "text/plain":
-                 try:
-                    payload_bytes = msg.get_payload(decode=True)
-                    detected_encoding = chardet.detect(payload_bytes)['encoding']
-                    if detected_encoding:
-                        body_text = payload_bytes.decode(detected_encoding, errors='replace')
-                    else:
-                        try:
-                           body_text = payload_bytes.decode('utf-8', errors='replace')
-                        except UnicodeDecodeError:
-                           body_text = payload_bytes.decode('gbk', errors='replace')
-                 except Exception as e_non_multi:
-                     st.warning(f"解码非 multipart 邮件时出错: {e_non_multi}")
-                     raw_payload = msg.get_payload(decode=False)
-                     if isinstance(raw_payload, str):
-                            try:
-                                decoded_bytes = base64.b64decode(raw_payload)
-                                detected_encoding = chardet.detect(decoded_bytes)['encoding']
-                                if detected_encoding:
-                                     body_text += decoded_bytes.decode(detected_encoding, errors='replace') + "\n"
-                            except Exception:
-                                pass
-
-        return body_text
+        payload_bytes = part.get_payload(decode=True)
+        return decode_payload(payload_bytes, part.get_content_charset())
+    except Exception as e_decode:
+        warnings.append(f"{error_label}: {e_decode}")
+        # 如果解码失败，尝试获取原始负载（可能是 base64 编码的）
+        raw_payload = part.get_payload(decode=False)
+        if isinstance(raw_payload, str):
+            try:
+                decoded_bytes = base64.b64decode(raw_payload)
+                return decode_payload(decoded_bytes)
+            except Exception:
+                pass # 忽略解码 base64 失败的情况
+    return None
+
+def decode_eml_text(file_content):
+    """
+    纯函数版的 EML 解析：不碰 Streamlit，可以扔进进程池里跑。
+    返回 (正文文本, 警告列表)。
+    """
+    # 使用 BytesParser 解析原始字节内容
+    msg = BytesParser(policy=policy.default).parsebytes(file_content)
+    warnings = []
+    body_parts = []
 
+    if msg.is_multipart():
+        for part in msg.walk():
+            content_disposition = str(part.get("Content-Disposition"))
+            # 跳过附件和非文本部分
+            if part.is_attachment() or "attachment" in content_disposition:
+                continue
+            # HTML 部分不管，当前需求只关注 JLG
+            if part.get_content_type() == "text/plain":
+                text = _decode_text_part(part, warnings, "解码 text/plain 部分时出错")
+                if text is not None:
+                    body_parts.append(text + "\n") # 添加换行符分隔不同部分
+    elif msg.get_content_type() == "text/plain":
+        # 处理非 multipart 邮件
+        text = _decode_text_part(msg, warnings, "解码非 multipart 邮件时出错")
+        if text is not None:
+            body_parts.append(text)
+
+    return "".join(body_parts), warnings
+
+def _eml_cache_key(file_content):
+    return "eml:" + content_hash(file_content)
+
+def _decode_eml_worker(file_name, file_content):
+    """进程池里跑的活：解析一封邮件，把异常转成字符串带回主进程。"""
+    try:
+        body_text, warnings = decode_eml_text(file_content)
+        return file_name, body_text, warnings, None
     except Exception as e:
-        st.error(f"解析 EML 文件时发生严重错误: {e}")
-        return None
+        return file_name, None, [], str(e)
+
+def parse_eml_batch(named_contents, max_workers=None):
+    """
+    批量解析 EML：先查缓存，没命中的文件多就丢进进程池并行解，文件少就直接串行跑。
+    named_contents 是 [(文件名, 字节内容), ...]，按完成顺序逐个 yield
+    (文件名, 正文文本, 警告列表, 错误信息)，方便界面实时刷进度条。
+    """
+    pending = []
+    for file_name, file_content in named_contents:
+        cache_key = _eml_cache_key(file_content)
+        cached = PARSE_CACHE.get(cache_key)
+        if cached is not None:
+            body_text, warnings = cached
+            yield file_name, body_text, warnings, None
+        else:
+            pending.append((file_name, file_content, cache_key))
+
+    def remember(result, cache_key):
+        # 操，缓存只在主进程里写，省得一堆进程抢着写同一个目录
+        file_name, body_text, warnings, error = result
+        if error is None:
+            PARSE_CACHE.set(cache_key, (body_text, warnings))
+        return result
+
+    if len(pending) < EML_POOL_MIN_FILES:
+        for file_name, file_content, cache_key in pending:
+            yield remember(_decode_eml_worker(file_name, file_content), cache_key)
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(_decode_eml_worker, file_name, file_content): cache_key for file_name, file_content, cache_key in pending}
+        for future in as_completed(futures):
+            yield remember(future.result(), futures[future])
 
 def extract_jlg_numbers(text):
     """从文本中提取所有 JLG 号码。"""
@@ -101,19 +137,60 @@ def extract_jlg_numbers(text):
     all_numbers = jlg_numbers + jlg_numbers_alt
     return list(set(all_numbers)) # 去重后返回列表
 
-def convert_status_to_status2(status):
-    """操，把状态码转成中文描述"""
-    status_str = str(status).strip().upper() # 转大写，去空格
-    if status_str == 'R':
-        return '预定成功'
-    elif status_str == 'I':
-        return '在住'
-    elif status_str in ['D', 'S', 'O']:
-        return '离店'
-    elif status_str == 'X':
-        return '无效'
-    else:
-        return '未知状态' # 操，防止有其他傻逼状态码
+# 操，状态码 -> 中文描述
+STATUS2_MAP = {'R': '预定成功', 'I': '在住', 'D': '离店', 'S': '离店', 'O': '离店', 'X': '无效'}
+UNKNOWN_STATUS2 = '未知状态' # 操，防止有其他傻逼状态码
+
+def format_stay_dates(series):
+    """
+    操，整列格式化到达/离开：有时间(不是午夜0点)的给 YY/MM/DD HH:MM，否则只给 YY/MM/DD。
+    转换不了的保留原始字符串，空值给 None。
+    """
+    raw_str = series.astype(str).str.strip()
+    dt, _ = parse_date_column(series)
+    has_time = (dt.dt.hour != 0) | (dt.dt.minute != 0) | (dt.dt.second != 0)
+    formatted = dt.dt.strftime('%y/%m/%d').where(~has_time, dt.dt.strftime('%y/%m/%d %H:%M'))
+    result = formatted.where(dt.notna(), raw_str)
+    return result.where(series.notna(), None)
+
+def lookup_jlg_numbers(jlg_numbers, system_df, cols_to_extract):
+    """
+    操，把所有 JLG 号码和系统订单的 '预订号' 一次性 merge 起来，不再一个号码扫一遍全表。
+    同一个预订号有多行时只取第一行。返回 (结果表, 没找到的 JLG 号码列表)。
+    """
+    jlg_df = pd.DataFrame({'JLG号码': jlg_numbers})
+    jlg_df['_匹配键'] = jlg_df['JLG号码'].str.strip()
+
+    # 操，预订号本身也在要提取的列里，merge 前先加个前缀，免得撞车
+    system_first = system_df.drop_duplicates(subset='预订号', keep='first')[cols_to_extract].add_prefix('_系统_')
+    system_first['_匹配键'] = system_first['_系统_预订号']
+    merged = jlg_df.merge(system_first, on='_匹配键', how='left', indicator=True)
+    found_mask = merged['_merge'] == 'both'
+    not_found_jlg = merged.loc[~found_mask, 'JLG号码'].tolist()
+    found = merged[found_mask].reset_index(drop=True)
+
+    result_df = pd.DataFrame({'JLG号码': found['JLG号码']})
+    for col in cols_to_extract:
+        values = found[f'_系统_{col}']
+        if col in ['到达', '离开']:
+            result_df[col] = format_stay_dates(values)
+        elif col == '状态':
+            status_str = values.astype(str).str.strip().str.upper()
+            result_df[col] = status_str.where(values.notna(), None) # 原始状态码
+            result_df['状态2'] = status_str.map(STATUS2_MAP).fillna(UNKNOWN_STATUS2).where(values.notna()) # 中文状态
+        else:
+            # 操，其他列直接转字符串，防止出现奇怪的类型
+            result_df[col] = values.astype(str).str.strip().where(values.notna(), None)
+
+    # 如果原始数据里就没有状态列，也给它加上空的状态2
+    if '状态' not in cols_to_extract:
+        result_df['状态'] = None
+        result_df['状态2'] = None
+    # 如果原始数据里就没有第三方预定号列，也给它加上空的
+    if '第三方预定号' not in cols_to_extract:
+        result_df['第三方预定号'] = None
+
+    return result_df, not_found_jlg
 
 def run_meituan_checker_app():
     """运行美团邮件审核工具的 Streamlit 界面。"""
@@ -130,26 +207,28 @@ def run_meituan_checker_app():
     with col1:
         uploaded_eml_files = st.file_uploader("上传美团 EML 邮件文件 (.eml)", type=["eml"], accept_multiple_files=True, key="meituan_eml_uploader")
     with col2:
-        uploaded_system_excel = st.file_uploader("上传系统订单 Excel 文件 (.xlsx)", type=["xlsx"], key="meituan_system_uploader")
+        uploaded_system_excel = order_export_input("上传系统订单 Excel 文件 (.xlsx)", key="meituan_system_uploader")
 
     if st.button("开始匹配", type="primary", disabled=(not uploaded_eml_files or not uploaded_system_excel)):
         if not uploaded_eml_files: st.warning("操，你他妈的还没上传 EML 文件呢！"); st.stop()
         if not uploaded_system_excel: st.warning("操，你他妈的还没上传系统订单 Excel 文件呢！"); st.stop()
 
         all_jlg_numbers, eml_parsing_errors = [], []
-        with st.spinner("正在解析 EML 文件..."):
-            for eml_file in uploaded_eml_files:
-                try:
-                    content_bytes = eml_file.getvalue()
-                    eml_text = parse_eml(content_bytes)
-                    if eml_text:
-                        jlg_found = extract_jlg_numbers(eml_text)
-                        if jlg_found: all_jlg_numbers.extend(jlg_found)
-                        else: st.warning(f"文件 '{eml_file.name}' 中没有找到 `(JLG)` 或 `JLG)` 号码。") # 操，改了提示
-                    else: eml_parsing_errors.append(eml_file.name)
-                except Exception as e:
-                    st.error(f"处理文件 '{eml_file.name}' 时出错: {e}")
-                    eml_parsing_errors.append(eml_file.name)
+        named_contents = [(eml_file.name, eml_file.getvalue()) for eml_file in uploaded_eml_files]
+        progress_bar = st.progress(0.0, text="正在解析 EML 文件...")
+        for done_count, (file_name, eml_text, warnings, error) in enumerate(parse_eml_batch(named_contents), start=1):
+            progress_bar.progress(done_count / len(named_contents), text=f"正在解析 EML 文件... ({done_count}/{len(named_contents)})")
+            for warning in warnings:
+                st.warning(f"文件 '{file_name}': {warning}")
+            if error:
+                st.error(f"处理文件 '{file_name}' 时出错: {error}")
+                eml_parsing_errors.append(file_name)
+            elif eml_text:
+                jlg_found = extract_jlg_numbers(eml_text)
+                if jlg_found: all_jlg_numbers.extend(jlg_found)
+                else: st.warning(f"文件 '{file_name}' 中没有找到 `(JLG)` 或 `JLG)` 号码。") # 操，改了提示
+            else: eml_parsing_errors.append(file_name)
+        progress_bar.empty()
         if eml_parsing_errors: st.error(f"以下 EML 文件解析失败，已被跳过: {', '.join(eml_parsing_errors)}")
 
         unique_jlg_numbers = list(set(all_jlg_numbers))
@@ -157,36 +236,17 @@ def run_meituan_checker_app():
         st.info(f"从 EML 文件中成功提取到 {len(unique_jlg_numbers)} 个唯一的 JLG 号码。")
 
         try:
-            # --- 操，强制把可能的列读成字符串，特别是'预订号', '房号', '第三方预定号' ---
-            possible_cols = (
-                MEITUAN_SYSTEM_COLUMN_MAP.get('预订号', []) +
-                MEITUAN_SYSTEM_COLUMN_MAP.get('房号', []) +
-                MEITUAN_SYSTEM_COLUMN_MAP.get('第三方预定号', [])
-            )
-            # --- 操，还要把日期列也考虑进去，免得被读成数字 ---
-            date_cols = MEITUAN_SYSTEM_COLUMN_MAP.get('到达', []) + MEITUAN_SYSTEM_COLUMN_MAP.get('离开', [])
-            all_possible_str_cols = list(set(possible_cols + date_cols)) # 合并并去重
-            dtype_map = {col: str for col in all_possible_str_cols} # 给所有可能的列名设置 dtype=str
-
-            # --- 操，读Excel的时候就用dtype_map，并且保留日期格式 ---
-            system_df = pd.read_excel(uploaded_system_excel, dtype=dtype_map, parse_dates=False) # parse_dates=False 防止pandas自作聪明
-            system_df.columns = system_df.columns.str.strip() # 清理列名中的空格
-            missing_cols = find_and_rename_columns(system_df, MEITUAN_SYSTEM_COLUMN_MAP)
+            # --- 操，共用的订单导入：同一份系统 Excel 只解析一次，号码保持文本，日期已经转好 ---
+            system_df, missing_cols = load_order_export(uploaded_system_excel, MEITUAN_SYSTEM_COLUMN_MAP, snapshot=True)
             # 操，第三方预定号不是必须的了，从报错里去掉
             required_check_cols = [col for col in MEITUAN_SYSTEM_COLUMN_MAP.keys() if col != '第三方预定号']
             missing_required = [col for col in required_check_cols if col not in system_df.columns]
             if missing_required: st.error(f"操！系统订单 Excel 文件里找不到必需的列: {', '.join(missing_required)}。没法继续了。"); st.stop()
 
-            # if '预订号' not in system_df.columns: st.error(f"操！在系统订单 Excel 文件里找不到 '预订号' 列（或其别名）。"); st.stop() # 上面检查过了
-            system_df['预订号'] = system_df['预订号'].astype(str).str.strip() # 再次确保是字符串并清理空白
-            # 操，第三方预定号也处理一下，如果没有就算了
-            if '第三方预定号' in system_df.columns:
-                 system_df['第三方预定号'] = system_df['第三方预定号'].astype(str).str.strip()
 
         except Exception as e:
             st.error(f"读取或处理系统订单 Excel 文件时出错: {e}"); st.stop()
 
-        results, found_count, not_found_jlg = [], 0, []
         with st.spinner("正在系统订单中匹配 JLG 号码..."):
             # 操，这是你要的那几列, 但要先检查它们是不是真的存在于 system_df 里
             base_required_info_cols = ['姓名', '状态', '房号', '到达', '离开', '预订号', '第三方预定号'] # 操，把第三方预定号加回来
@@ -195,58 +255,12 @@ def run_meituan_checker_app():
             missing_extract_cols = [col for col in base_required_info_cols if col not in cols_to_extract]
             if missing_extract_cols: st.warning(f"系统订单中缺少以下列，结果中将不包含这些信息: {', '.join(missing_extract_cols)}")
 
-            for jlg_number in unique_jlg_numbers:
-                # --- 操，核心匹配逻辑在这里：用JLG号码匹配 '预订号' 列 ---
-                match = system_df[system_df['预订号'] == jlg_number.strip()]
-                if not match.empty:
-                    found_count += 1
-                    match_data = match.iloc[0]
-                    result_entry = {'JLG号码': jlg_number} # 操，把JLG号码也加进去，方便核对
-                    for col in cols_to_extract: # 只处理实际存在的列
-                         # --- 操，日期格式在这里改！尝试按 YY/MM/DD HH:MM 格式化 ---
-                         if col in ['到达', '离开'] and pd.notna(match_data[col]):
-                             try:
-                                 # 尝试多种可能的输入格式进行转换
-                                 dt_obj = pd.to_datetime(match_data[col], errors='coerce', infer_datetime_format=True)
-                                 if pd.notna(dt_obj):
-                                     # 如果包含时间信息 (不是午夜0点)，则保留时间
-                                     if dt_obj.hour != 0 or dt_obj.minute != 0 or dt_obj.second != 0:
-                                         result_entry[col] = dt_obj.strftime('%y/%m/%d %H:%M')
-                                     else: # 否则只保留日期
-                                         result_entry[col] = dt_obj.strftime('%y/%m/%d')
-                                 else: # 如果转换失败，直接用原始字符串
-                                     result_entry[col] = str(match_data[col]).strip() # 操，加上strip
-                             except Exception: # 保底措施，如果上面都失败了，直接转字符串
-                                 result_entry[col] = str(match_data[col]).strip() # 操，加上strip
-                         # 操，状态列要特殊处理一下
-                         elif col == '状态' and pd.notna(match_data[col]):
-                             result_entry[col] = str(match_data[col]).strip().upper() # 原始状态码
-                             result_entry['状态2'] = convert_status_to_status2(match_data[col]) # 中文状态
-                         # 操，第三方预定号直接取值就行
-                         elif col == '第三方预定号' and pd.notna(match_data[col]):
-                              result_entry[col] = str(match_data[col]).strip() # 操，加上strip
-                         elif pd.notna(match_data[col]):
-                             # 操，其他列直接转字符串，防止出现奇怪的类型
-                             result_entry[col] = str(match_data[col]).strip()
-                         else:
-                             result_entry[col] = None # 如果是空的，就填 None
-
-                    # 如果原始数据里就没有状态列，也给它加上空的状态2
-                    if '状态' not in cols_to_extract:
-                        result_entry['状态'] = None
-                        result_entry['状态2'] = None
-                    # 如果原始数据里就没有第三方预定号列，也给它加上空的
-                    if '第三方预定号' not in cols_to_extract:
-                        result_entry['第三方预定号'] = None
-
-                    results.append(result_entry)
-                else:
-                    not_found_jlg.append(jlg_number)
+            result_df, not_found_jlg = lookup_jlg_numbers(unique_jlg_numbers, system_df, cols_to_extract)
+            found_count = len(result_df)
 
         st.success(f"匹配完成！共找到 {found_count} 个匹配项。")
 
-        if results:
-            result_df = pd.DataFrame(results)
+        if not result_df.empty:
             # 操，按照你指定的傻逼顺序排好，把第三方预定号也加进来
             final_cols_order = ['姓名', '状态', '状态2', '房号', '到达', '离开', '预订号', '第三方预定号', 'JLG号码']
             # 只保留实际存在的列
@@ -1,73 +1,40 @@
 import streamlit as st
 import pandas as pd
 import re
-import io
-import json
+import time
+from concurrent.futures import as_completed
 from PIL import Image
 
 # Import configurations from the central config file
-from config import TEAM_TYPE_MAP, DEFAULT_TEAM_TYPE, ALL_ROOM_CODES
+from config import TEAM_TYPE_MAP, DEFAULT_TEAM_TYPE, OCR_BATCH_MAX_FILES, OCR_PREPROCESS_ENABLED, OCR_MAX_CONCURRENCY
+from utils import room_code_pattern, to_excel
+from ocr_service import resolve_ocr_backends, describe_skipped_backends, submit_upload, describe_ocr_run
 
-# --- SDK Dependency Check ---
-try:
-    from alibabacloud_ocr_api20210707.client import Client as OcrClient
-    from alibabacloud_tea_openapi import models as open_api_models
-    from alibabacloud_ocr_api20210707 import models as ocr_models
-    ALIYUN_SDK_AVAILABLE = True
-except ImportError:
-    ALIYUN_SDK_AVAILABLE = False
+OCR_MODE_SINGLE = "单张识别"
+OCR_MODE_BATCH = "批量识别"
+ROOM_COLUMNS = ['房型', '房数', '定价']
 
 # --- Core OCR and Parsing Logic ---
 
-def get_ocr_text_from_aliyun(image: Image.Image) -> str:
+def get_ocr_text_from_aliyun(image_bytes: bytes, preprocess: bool = OCR_PREPROCESS_ENABLED, use_cache: bool = True) -> str:
     """
-    Calls the Aliyun OCR API to extract text from an image.
-    Handles credential checking and error reporting within the Streamlit app.
+    Extracts text from an uploaded image through the shared OCR service (pooled client, retries on throttling).
+    Aliyun is tried first; local engines in config.OCR_BACKEND_CHAIN take over when it fails.
+    Identical or near-identical images come from the shared OCR cache; otherwise the image is shrunk by
+    ocr_preprocess first. Bytes saved and end-to-end latency are reported in the app.
     """
-    if not ALIYUN_SDK_AVAILABLE:
-        st.error("错误：阿里云 SDK 未安装。请运行 'pip install alibabacloud_ocr_api20210707' 进行安装。")
+    backends, skipped = resolve_ocr_backends()
+    if not backends:
+        st.error("没有可用的 OCR 引擎：\n" + describe_skipped_backends(skipped))
         return None
-    
-    if "aliyun_credentials" not in st.secrets:
-        st.error("错误：阿里云凭证未在 .streamlit/secrets.toml 中配置。")
-        return None
-    
-    access_key_id = st.secrets.aliyun_credentials.get("access_key_id")
-    access_key_secret = st.secrets.aliyun_credentials.get("access_key_secret")
 
-    if not access_key_id or not access_key_secret:
-        st.error("错误：阿里云 AccessKey ID 或 Secret 未在 Secrets 中正确配置。")
+    run = submit_upload(image_bytes, backends, preprocess, use_cache).result()
+    if run.result.error:
+        st.error(run.result.error)
         return None
-        
-    try:
-        config = open_api_models.Config(
-            access_key_id=access_key_id,
-            access_key_secret=access_key_secret,
-            endpoint='ocr-api.cn-hangzhou.aliyuncs.com'
-        )
-        client = OcrClient(config)
-
-        buffered = io.BytesIO()
-        # Ensure image is in RGB format, as RGBA can cause issues
-        image_to_save = image.convert('RGB') if image.mode == 'RGBA' else image
-        
-        image_format = "JPEG"
-        image_to_save.save(buffered, format=image_format)
-        buffered.seek(0)
-        
-        request = ocr_models.RecognizeGeneralRequest(body=buffered)
-        response = client.recognize_general(request)
-
-        if response.status_code == 200 and response.body and response.body.data:
-            data = json.loads(response.body.data)
-            return data.get('content', '')
-        else:
-            error_message = response.body.message if response.body and hasattr(response.body, 'message') else '无详细信息'
-            raise Exception(f"阿里云 OCR API 返回错误: {error_message}")
+    st.caption(describe_ocr_run(run))
+    return run.result.text
 
-    except Exception as e:
-        st.error(f"调用阿里云 OCR API 失败: {e}")
-        return None
 
 def extract_booking_info(ocr_text: str):
     """
@@ -87,8 +54,7 @@ def extract_booking_info(ocr_text: str):
         return "错误：无法识别出有效的日期。"
     arrival_date, departure_date = unique_dates[0], unique_dates[-1]
 
-    room_codes_pattern_str = '|'.join(ALL_ROOM_CODES)
-    room_finder_pattern = re.compile(f'({room_codes_pattern_str})\\s*(\\d+)', re.IGNORECASE)
+    room_finder_pattern = room_code_pattern()
     price_finder_pattern = re.compile(r'\b(\d+\.\d{2})\b')
 
     found_rooms = [(m.group(1).upper(), int(m.group(2)), m.span()) for m in room_finder_pattern.finditer(ocr_text)]
@@ -144,11 +110,139 @@ def format_notification_speech(team_name, team_type, arrival_date, departure_dat
     return f"新增{team_type} {team_name} {date_range_string} {room_string}。销售通知"
 
 
+def run_batch_ocr(named_images, backends, preprocess=OCR_PREPROCESS_ENABLED, use_cache=True, progress_callback=None):
+    """
+    Sends every (name, raw image bytes) to the shared OCR pool at once (pre-processing included) and parses each
+    result with extract_booking_info. The pool runs at most OCR_MAX_CONCURRENCY calls at a time (shared with every
+    other OCR request in the process), so wall time is roughly ceil(n / OCR_MAX_CONCURRENCY) rounds of calls.
+    Returns (team rows, room rows, raw texts, stats).
+    """
+    start = time.perf_counter()
+    futures = {submit_upload(image_bytes, backends, preprocess, use_cache): position for position, (_, image_bytes) in enumerate(named_images)}
+    runs = [None] * len(named_images)
+    for done, future in enumerate(as_completed(futures), start=1):
+        runs[futures[future]] = future.result()
+        if progress_callback:
+            progress_callback(done, len(named_images))
+    wall_time = time.perf_counter() - start
+    results = [run.result for run in runs]
+
+    team_rows, room_rows, raw_texts = [], [], {}
+    for position, ((name, _), result) in enumerate(zip(named_images, results), start=1):
+        row = {"序号": position, "文件": name, "团队名称": "", "团队类型": DEFAULT_TEAM_TYPE, "到达日期": "", "离开日期": "", "提示": ""}
+        raw_texts[position] = result.text or ""
+        if result.error:
+            row["提示"] = result.error
+        else:
+            info = extract_booking_info(result.text)
+            if isinstance(info, str):
+                row["提示"] = info
+            else:
+                row.update({"团队名称": info["team_name"], "团队类型": info["team_type"],
+                            "到达日期": info["arrival_date"], "离开日期": info["departure_date"]})
+                room_rows.extend({"序号": position, **room} for room in info["room_dataframe"].to_dict('records'))
+        team_rows.append(row)
+
+    stats = {
+        "图片数": len(results),
+        "并发上限": OCR_MAX_CONCURRENCY,
+        "总耗时(秒)": round(wall_time, 2),
+        "最慢一张(秒)": round(max((run.latency for run in runs), default=0.0), 2),
+        "逐张累计(秒)": round(sum(run.latency for run in runs), 2),
+        "失败": sum(1 for r in results if r.error),
+        "缓存命中": sum(1 for run in runs if run.cache_hit),
+        "原图(KB)": round(sum(run.prepared.original_bytes for run in runs if run.prepared) / 1024),
+        "发送(KB)": round(sum(run.prepared.prepared_bytes for run in runs if run.prepared) / 1024),
+    }
+    return pd.DataFrame(team_rows), pd.DataFrame(room_rows, columns=['序号'] + ROOM_COLUMNS), raw_texts, stats
+
+def build_batch_speeches(teams_df, rooms_df):
+    """One notification line per queued booking that has a team name; rooms are matched by 序号."""
+    rooms_by_position = {position: group[ROOM_COLUMNS] for position, group in rooms_df.dropna(subset=['序号']).groupby('序号')}
+    empty_rooms = pd.DataFrame(columns=ROOM_COLUMNS)
+    speeches = []
+    for team in teams_df.to_dict('records'):
+        if not str(team.get("团队名称") or "").strip():
+            continue
+        room_df = rooms_by_position.get(team["序号"], empty_rooms)
+        speech = format_notification_speech(team["团队名称"], team["团队类型"], team["到达日期"], team["离开日期"], room_df)
+        speeches.append({"序号": team["序号"], "文件": team["文件"], "话术": speech})
+    return pd.DataFrame(speeches, columns=["序号", "文件", "话术"])
+
+
 # --- Streamlit UI ---
 
+def run_batch_ocr_app():
+    """Renders the batch mode: many screenshots in, one editable queue and all notification lines out."""
+    uploaded_files = st.file_uploader(
+        f"上传多张截图 (最多 {OCR_BATCH_MAX_FILES} 张)", type=["png", "jpg", "jpeg", "bmp"],
+        accept_multiple_files=True, key="ocr_batch_uploader"
+    )
+    if uploaded_files and len(uploaded_files) > OCR_BATCH_MAX_FILES:
+        st.error(f"一次最多 {OCR_BATCH_MAX_FILES} 张，当前 {len(uploaded_files)} 张，请分批上传。")
+        return
+
+    preprocess = st.checkbox("发送前压缩图片 (转正、缩小、灰度、裁到有字的区域)", value=OCR_PREPROCESS_ENABLED, key="ocr_batch_preprocess")
+    skip_cache = st.checkbox("跳过缓存，强制重新识别", value=False, key="ocr_batch_skip_cache")
+    if uploaded_files and st.button(f"批量提取 {len(uploaded_files)} 张图片 (阿里云 OCR)", type="primary"):
+        backends, skipped = resolve_ocr_backends()
+        if not backends:
+            st.error("没有可用的 OCR 引擎：\n" + describe_skipped_backends(skipped))
+            return
+        named_images = [(f.name, f.getvalue()) for f in uploaded_files]
+        progress_bar = st.progress(0.0, text=f"正在并发识别 (同时最多 {OCR_MAX_CONCURRENCY} 张)...")
+        teams_df, rooms_df, raw_texts, stats = run_batch_ocr(
+            named_images, backends, preprocess, not skip_cache,
+            progress_callback=lambda done, total: progress_bar.progress(done / total, text=f"已完成 {done}/{total}")
+        )
+        progress_bar.empty()
+        st.session_state['ocr_batch'] = {"teams": teams_df, "rooms": rooms_df, "raw_texts": raw_texts, "stats": stats}
+
+    batch = st.session_state.get('ocr_batch')
+    if not batch:
+        return
+
+    stats = batch["stats"]
+    st.caption(f"共 {stats['图片数']} 张 (同时最多识别 {stats['并发上限']} 张)，总耗时 {stats['总耗时(秒)']} 秒 (最慢一张 {stats['最慢一张(秒)']} 秒，逐张累计 {stats['逐张累计(秒)']} 秒)，失败 {stats['失败']} 张，命中缓存 {stats['缓存命中']} 张；图片 {stats['原图(KB)']:,} KB → {stats['发送(KB)']:,} KB。")
+
+    st.markdown("---")
+    st.subheader("核对与编辑队列")
+    st.markdown("##### 团队信息 (团队名称留空的行不生成话术)")
+    team_types = sorted(set(TEAM_TYPE_MAP.values()) | {DEFAULT_TEAM_TYPE})
+    edited_teams = st.data_editor(
+        batch["teams"], hide_index=True, use_container_width=True, key="ocr_batch_teams",
+        disabled=["序号", "文件", "提示"],
+        column_config={"团队类型": st.column_config.SelectboxColumn("团队类型", options=team_types)}
+    )
+    st.markdown("##### 房间详情 (按序号对应上面的团队，可增删行)")
+    edited_rooms = st.data_editor(batch["rooms"], num_rows="dynamic", hide_index=True, use_container_width=True, key="ocr_batch_rooms")
+
+    with st.expander("原始识别结果 (供参考)", expanded=False):
+        for position, name in zip(batch["teams"]["序号"], batch["teams"]["文件"]):
+            st.text_area(f"{position}. {name}", batch["raw_texts"].get(position, ""), height=120, key=f"ocr_batch_raw_{position}")
+
+    if st.button("生成全部话术"):
+        speeches = build_batch_speeches(edited_teams, edited_rooms)
+        if speeches.empty:
+            st.warning("队列里没有填了团队名称的记录。")
+            return
+        st.subheader(f"生成成功！共 {len(speeches)} 条")
+        all_lines = "\n".join(speeches["话术"])
+        st.code(all_lines, language=None)
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("下载话术 (TXT)", data=all_lines.encode("utf-8"), file_name="销售通知话术.txt", mime="text/plain", key="ocr_batch_download_txt")
+        with col2:
+            st.download_button("下载话术和队列 (Excel)", data=to_excel({"话术": speeches, "团队信息": edited_teams, "房间详情": edited_rooms}),
+                               file_name="销售通知话术.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", key="ocr_batch_download_xlsx")
+
 def run_ocr_app():
     """Renders the Streamlit UI for the OCR Tool."""
     st.title("金陵工具箱 - OCR 工具")
+    ocr_mode = st.radio("识别模式", [OCR_MODE_SINGLE, OCR_MODE_BATCH], horizontal=True, key="ocr_mode")
+    if ocr_mode == OCR_MODE_BATCH:
+        run_batch_ocr_app()
+        return
     
     st.markdown("""
     **全新工作流**：
@@ -162,6 +256,8 @@ def run_ocr_app():
     if uploaded_file:
         image = Image.open(uploaded_file)
         st.image(image, caption="上传的图片", width=300)
+        preprocess = st.checkbox("发送前压缩图片 (转正、缩小、灰度、裁到有字的区域)", value=OCR_PREPROCESS_ENABLED, key="ocr_preprocess")
+        skip_cache = st.checkbox("跳过缓存，强制重新识别", value=False, key="ocr_skip_cache")
 
         if st.button("从图片提取信息 (阿里云 OCR)", type="primary"):
             # Clear old state before processing a new image
@@ -169,7 +265,7 @@ def run_ocr_app():
             st.session_state.pop('booking_info', None)
             
             with st.spinner('正在调用阿里云 OCR API 识别中...'):
-                ocr_text = get_ocr_text_from_aliyun(image)
+                ocr_text = get_ocr_text_from_aliyun(uploaded_file.getvalue(), preprocess, not skip_cache)
                 if ocr_text:
                     st.session_state['raw_ocr_text'] = ocr_text
                     result = extract_booking_info(ocr_text)
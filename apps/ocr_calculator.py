@@ -3,7 +3,6 @@ import pandas as pd
 import re
 import io
 import traceback
-import json
 from PIL import Image
 from datetime import date, timedelta
 from docx import Document
@@ -11,15 +10,14 @@ from docx.shared import Pt, Inches
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.oxml.ns import qn
 
-# --- 新增 V5 依赖 (Alibaba Cloud) ---
-try:
-    from alibabacloud_ocr_api20210707.client import Client as OcrClient
-    from alibabacloud_tea_openapi import models as open_api_models
-    from alibabacloud_ocr_api20210707 import models as ocr_models
-    ALIYUN_SDK_AVAILABLE = True
-except ImportError:
-    ALIYUN_SDK_AVAILABLE = False
-    # 在UI中会显示错误
+# --- V5 依赖 (Alibaba Cloud)：客户端、重试、并发、本机引擎兜底都在 ocr_service 里 ---
+from ocr_service import (
+    OCR_BACKEND_LABELS, resolve_ocr_backends, describe_skipped_backends, submit_upload, describe_ocr_run
+)
+from config import OCR_PREPROCESS_ENABLED, OCR_BACKEND_CHAIN
+
+# 操，引擎下拉框里的“自动”：按 config.OCR_BACKEND_CHAIN 的顺序，前一个失败换下一个
+OCR_BACKEND_AUTO = "auto"
 
 # --- 移除 V4 依赖 (OpenAI) ---
 # from openai import OpenAI
@@ -29,79 +27,38 @@ except ImportError:
 # --- [核心功能 V5: Alibaba Cloud General OCR] ---
 # ==============================================================================
 
-def get_aliyun_ocr(image: Image.Image) -> str:
+def get_aliyun_ocr(image_bytes: bytes, preprocess: bool = OCR_PREPROCESS_ENABLED, use_cache: bool = True,
+                   backend_names=OCR_BACKEND_CHAIN) -> str:
     """
-    V5: 调用阿里云通用文字识别 (RecognizeGeneral)，并从 st.secrets 读取密钥。
+    V5: 调用阿里云通用文字识别 (RecognizeGeneral)，走 ocr_service 共用的客户端、线程池和结果缓存。
+    阿里云网慢/额度用完的时候按 backend_names 的顺序换本机引擎 (Tesseract / PaddleOCR) 兜底，早报不停。
+    发送前先用 ocr_preprocess 瘦身 (关掉 preprocess 就跟以前一样原图 quality 95)。
     """
-    st.write("正在调用 Alibaba Cloud General OCR API...")
-    
-    if not ALIYUN_SDK_AVAILABLE:
-        st.error("错误：你没有安装阿里云SDK！请运行: pip install alibabacloud_ocr_api20210707")
-        return None
-    
-    # 1. 从 st.secrets 读取密钥 (*** V5 修改 ***)
-    try:
-        access_key_id = st.secrets["aliyun"]["access_key_id"]
-        access_key_secret = st.secrets["aliyun"]["access_key_secret"]
-    except (KeyError, AttributeError):
-        st.error("错误：没在 .streamlit/secrets.toml 里找到 [aliyun] -> access_key_id 或 access_key_secret！")
-        st.code("请在 .streamlit/secrets.toml 文件中添加：\n\n[aliyun]\naccess_key_id = \"YOUR_KEY_ID\"\naccess_key_secret = \"YOUR_KEY_SECRET\"\n")
+    # 1. 按顺序挑出能用的引擎 (阿里云的密钥从 st.secrets 读)
+    backends, skipped = resolve_ocr_backends(backend_names)
+    if not backends:
+        st.error("没有可用的 OCR 引擎：\n" + describe_skipped_backends(skipped))
         return None
+    st.write(f"正在调用 {' → '.join(backend.label for backend in backends)} ...")
 
-    if not access_key_id or not access_key_secret:
-        st.error("错误：你 .streamlit/secrets.toml 里的阿里云密钥是空的！")
+    # 2. 预处理 + 发起请求 (限流会自动退避重试，失败换下一个引擎)
+    run = submit_upload(image_bytes, backends, preprocess, use_cache).result()
+    if run.result.error:
+        st.error(run.result.error)
         return None
+    if run.result.fallbacks:
+        st.warning("前面的引擎失败了：\n" + describe_skipped_backends(run.result.fallbacks))
+    st.write(f"识别成功，获取到文本内容。{describe_ocr_run(run)}")
+    return run.result.text
 
-    # 2. 初始化客户端
-    try:
-        config = open_api_models.Config(
-            access_key_id=access_key_id,
-            access_key_secret=access_key_secret,
-            endpoint='ocr-api.cn-hangzhou.aliyuncs.com'
-        )
-        client = OcrClient(config)
-    except Exception as e:
-        st.error(f"初始化阿里云客户端失败: {e}")
-        return None
-        
-    # 3. 准备图片
-    buffered = io.BytesIO()
-    if image.mode == 'RGBA':
-        image = image.convert('RGB')
-    
-    # 不压缩，使用高质量
-    image.save(buffered, format="JPEG", quality=95)
-    buffered.seek(0)
-    
-    # 4. 发起请求
-    request = ocr_models.RecognizeGeneralRequest(body=buffered)
-    
-    try:
-        response = client.recognize_general(request)
-
-        if response.status_code == 200 and response.body and response.body.data:
-            data = json.loads(response.body.data)
-            content = data.get('content', '')
-            if content:
-                st.write("API 调用成功，获取到文本内容。")
-                return content
-            else:
-                st.error("阿里云 OCR API 返回了空内容。")
-                st.json(data) # 显示返回的JSON
-                return None
-        else:
-            error_message = '无详细信息'
-            if response.body and hasattr(response.body, 'message'):
-                error_message = response.body.message
-            elif response.body:
-                error_message = str(response.body)
-            st.error(f"阿里云 OCR API 返回错误 (Code: {response.status_code}): {error_message}")
-            return None
 
-    except Exception as e:
-        st.error(f"调用阿里云 OCR API 失败: {e}")
-        st.code(traceback.format_exc())
-        return None
+def backend_option_label(name: str) -> str:
+    """引擎下拉框里显示的名字，“自动”把回退顺序写出来。"""
+    if name == OCR_BACKEND_AUTO:
+        chain = " → ".join(OCR_BACKEND_LABELS.get(n, n) for n in OCR_BACKEND_CHAIN)
+        return f"自动 (按顺序回退: {chain})"
+    return OCR_BACKEND_LABELS[name]
+
 
 def parse_ocr_to_dataframe(ocr_text: str, building_name: str) -> pd.DataFrame:
     """
@@ -371,7 +328,7 @@ def create_word_doc(jl_df, yt_df, jl_summary, yt_summary):
 def run_ocr_calculator_app():
     st.title("OCR出租率计算器 (V5 - Alibaba Cloud)")
     st.markdown("1. 上传手写表格的照片。")
-    st.markdown("2. 使用 **Alibaba Cloud 通用识别 API** 解析表格。")
+    st.markdown("2. 使用 **Alibaba Cloud 通用识别 API** 解析表格 (阿里云用不了的时候自动换本机 Tesseract / PaddleOCR)。")
     st.markdown("3. **人工核对**下方的可编辑表格，修正识别错误的数字。")
     st.markdown("4. 点击“计算”按钮，生成最终报表并下载Word文档。")
 
@@ -380,33 +337,38 @@ def run_ocr_calculator_app():
     if uploaded_file:
         image = Image.open(uploaded_file)
         st.image(image, caption="上传的图片", width=300)
+        preprocess = st.checkbox("发送前压缩图片 (转正、缩小、灰度、裁到有字的区域)", value=OCR_PREPROCESS_ENABLED, key="ocr_calc_preprocess")
+        skip_cache = st.checkbox("跳过缓存，强制重新识别", value=False, key="ocr_calc_skip_cache")
+        backend_choice = st.selectbox(
+            "OCR 引擎", [OCR_BACKEND_AUTO] + list(OCR_BACKEND_LABELS),
+            format_func=backend_option_label,
+            key="ocr_calc_backend"
+        )
+        backend_names = OCR_BACKEND_CHAIN if backend_choice == OCR_BACKEND_AUTO else [backend_choice]
+
+        if st.button("开始识别", type="primary"): # 新按钮
+            with st.spinner('正在识别...'):
+
+                try:
+                    ocr_text = get_aliyun_ocr(uploaded_file.getvalue(), preprocess, not skip_cache, backend_names)
+                except Exception as e:
+                    st.error(f"运行OCR任务时出错: {e}")
+                    ocr_text = None
 
-        if st.button("开始识别 (Alibaba OCR)", type="primary"): # 新按钮
-            if not ALIYUN_SDK_AVAILABLE:
-                st.error("错误：阿里云SDK未安装。请在 requirements.txt 中添加 alibabacloud_ocr_api20210707")
-            else:
-                with st.spinner('正在调用 Alibaba Cloud OCR API...'):
-                    
-                    try:
-                        ocr_text = get_aliyun_ocr(image)
-                    except Exception as e:
-                        st.error(f"运行Alibaba OCR任务时出错: {e}")
-                        ocr_text = None
-                    
-                    if ocr_text:
-                        st.session_state.ocr_text = ocr_text
-                        st.info("API调用成功，正在解析返回的文本...")
-                        
-                        st.session_state.jl_df = parse_ocr_to_dataframe(ocr_text, "金陵楼")
-                        st.session_state.yt_df = parse_ocr_to_dataframe(ocr_text, "亚太商务楼")
-                        st.success("解析完成！请检查下面的表格，手动修正错误。")
-                        
-                        with st.expander("查看 Alibaba OCR 返回的原始文本"):
-                            st.text_area("OCR 纯文本结果", ocr_text, height=300)
-                    else:
-                        st.error("Alibaba OCR API 未返回有效文本数据。")
-                        st.session_state.jl_df = parse_ocr_to_dataframe(None, "金陵楼") # 生成空表
-                        st.session_state.yt_df = parse_ocr_to_dataframe(None, "亚太商务楼")
+                if ocr_text:
+                    st.session_state.ocr_text = ocr_text
+                    st.info("识别成功，正在解析返回的文本...")
+
+                    st.session_state.jl_df = parse_ocr_to_dataframe(ocr_text, "金陵楼")
+                    st.session_state.yt_df = parse_ocr_to_dataframe(ocr_text, "亚太商务楼")
+                    st.success("解析完成！请检查下面的表格，手动修正错误。")
+
+                    with st.expander("查看 OCR 返回的原始文本"):
+                        st.text_area("OCR 纯文本结果", ocr_text, height=300)
+                else:
+                    st.error("OCR 未返回有效文本数据。")
+                    st.session_state.jl_df = parse_ocr_to_dataframe(None, "金陵楼") # 生成空表
+                    st.session_state.yt_df = parse_ocr_to_dataframe(None, "亚太商务楼")
     
     # --- 表格编辑区 ---
     if 'jl_df' in st.session_state:
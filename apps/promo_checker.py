@@ -1,14 +1,13 @@
 import streamlit as st
 import pandas as pd
-from utils import find_and_rename_columns
-from config import PROMO_CHECKER_COLUMN_MAP
+from utils import load_order_export
+from config import PROMO_CHECKER_COLUMN_MAP, ORDER_EXPORT_UPLOAD_TYPES
 
-def perform_promo_check(df):
+def perform_promo_check(df, missing_cols):
     """
     Performs the check for the "Consecutive Stay Benefit" promotion.
+    Expects a frame already renamed with PROMO_CHECKER_COLUMN_MAP by load_order_export.
     """
-    # 动态查找并重命名列
-    missing_cols = find_and_rename_columns(df, PROMO_CHECKER_COLUMN_MAP)
     if missing_cols:
         return f"错误：上传的文件中缺少以下必需的列: {', '.join(missing_cols)}"
 
@@ -50,7 +49,7 @@ def run_promo_checker_app():
 
     uploaded_file = st.file_uploader(
         "上传您的携程订单 Excel 文件 (.xlsx)", 
-        type=["xlsx"], 
+        type=ORDER_EXPORT_UPLOAD_TYPES, 
         key="promo_checker_uploader"
     )
 
@@ -58,8 +57,8 @@ def run_promo_checker_app():
         if st.button("开始审核", type="primary"):
             with st.spinner("正在审核中，请稍候..."):
                 try:
-                    df = pd.read_excel(uploaded_file)
-                    result = perform_promo_check(df)
+                    df, missing_cols = load_order_export(uploaded_file, PROMO_CHECKER_COLUMN_MAP)
+                    result = perform_promo_check(df, missing_cols)
 
                     if isinstance(result, str):
                         st.error(result)
@@ -1,7 +1,5 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-from utils import find_and_rename_columns, to_excel # 从 utils 导入函数
+from utils import load_order_export, order_export_input, to_excel # 从 utils 导入函数
 from config import UPGRADE_FINDER_COLUMN_MAP # 从 config 导入列名映射 (这个名字不改了，懒得动config)
 
 def run_upgrade_finder_app():
@@ -17,27 +15,15 @@ def run_upgrade_finder_app():
     # --- 操，加个输入框让你填关键字 ---
     search_keyword = st.text_input("输入你要在“备注”列查找的关键字", value="升级")
 
-    uploaded_system_excel = st.file_uploader("上传系统订单 Excel 文件 (.xlsx)", type=["xlsx"], key="upgrade_system_uploader")
+    uploaded_system_excel = order_export_input("上传系统订单 Excel 文件 (.xlsx)", key="upgrade_system_uploader")
 
     if st.button("开始查找", type="primary", disabled=(not uploaded_system_excel)):
         if not uploaded_system_excel: st.warning("操，你他妈的还没上传系统订单 Excel 文件呢！"); st.stop()
         if not search_keyword: st.warning("操，你他妈的还没输入要查找的关键字呢！"); st.stop() # 操，加个检查
 
         try:
-            # --- 操，强制把可能的列读成字符串 ---
-            possible_cols = (
-                UPGRADE_FINDER_COLUMN_MAP.get('预订号', []) +
-                UPGRADE_FINDER_COLUMN_MAP.get('第三方预定号', []) +
-                UPGRADE_FINDER_COLUMN_MAP.get('最近修改人', []) +
-                UPGRADE_FINDER_COLUMN_MAP.get('备注', [])
-            )
-            dtype_map = {col: str for col in possible_cols}
-
-            system_df = pd.read_excel(uploaded_system_excel, dtype=dtype_map, parse_dates=False)
-            system_df.columns = system_df.columns.str.strip()
-
-            # --- 操，检查并重命名列 ---
-            missing_cols = find_and_rename_columns(system_df, UPGRADE_FINDER_COLUMN_MAP)
+            # --- 操，共用的订单导入，已经按列名映射重命名好，号码和备注都是文本 ---
+            system_df, missing_cols = load_order_export(uploaded_system_excel, UPGRADE_FINDER_COLUMN_MAP, snapshot=True)
             required_cols = ['备注', '预订号', '最近修改人']
             missing_required = [col for col in required_cols if col not in system_df.columns]
             if missing_required: st.error(f"操！系统订单 Excel 文件里找不到必需的列: {', '.join(missing_required)}。没法继续了。"); st.stop()
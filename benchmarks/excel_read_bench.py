@@ -0,0 +1,105 @@
+"""
+操，订单表读取基准：生成跟 PMS 导出差不多的假数据，比较 openpyxl / calamine / 只读映射列 / CSV / Parquet 的耗时。
+
+用法 (在仓库根目录):
+    python benchmarks/excel_read_bench.py
+    python benchmarks/excel_read_bench.py --rows 20000 50000 --repeat 3
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import MEITUAN_SYSTEM_COLUMN_MAP, JINLING_ROOM_TYPES, YATAI_ROOM_TYPES  # noqa: E402
+from utils import CALAMINE_AVAILABLE, build_column_projection, read_table_bytes  # noqa: E402
+
+# 操，真实导出大概四十来列，映射里用到的只有七八列
+FILLER_COLUMNS = [f"备用字段{i}" for i in range(30)]
+
+
+def make_synthetic_export(rows, seed=0):
+    """生成一份长得像系统订单导出的 DataFrame。"""
+    rng = np.random.default_rng(seed)
+    arrival = pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 90, rows), unit="D")
+    nights = rng.integers(1, 6, rows)
+    df = pd.DataFrame({
+        "预订号": rng.integers(10**8, 10**9, rows).astype(str),
+        "第三方预订号": rng.integers(10**15, 10**16, rows).astype(str),
+        "姓名": [f"客人{i}" for i in range(rows)],
+        "状态": rng.choice(["R", "I", "O", "X", "S"], rows),
+        "房类": rng.choice(JINLING_ROOM_TYPES + YATAI_ROOM_TYPES, rows),
+        "房号": rng.integers(1000, 3000, rows),
+        "到达": arrival,
+        "离开": arrival + pd.to_timedelta(nights, unit="D"),
+        "房价": rng.integers(300, 3000, rows).astype(float),
+        "市场码": rng.choice(["OTA", "COR", "GRP", "WLK"], rows),
+        "备注": rng.choice(["", "升级", "含早餐 吉祥物", "延迟退房"], rows),
+    })
+    for col in FILLER_COLUMNS:
+        df[col] = rng.integers(0, 10**6, rows).astype(str)
+    return df
+
+
+def to_bytes(df, table_format):
+    buf = io.BytesIO()
+    if table_format == "xlsx":
+        df.to_excel(buf, index=False)
+    elif table_format == "csv":
+        df.to_csv(buf, index=False, encoding="utf-8-sig")
+    elif table_format == "parquet":
+        df.to_parquet(buf, index=False)
+    return buf.getvalue()
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run(rows_list, repeat):
+    projection = build_column_projection(MEITUAN_SYSTEM_COLUMN_MAP)
+    print(f"calamine 可用: {CALAMINE_AVAILABLE}")
+    print(f"{'行数':>8}  {'方式':<28} {'耗时(s)':>9} {'相对openpyxl':>12}")
+    for rows in rows_list:
+        df = make_synthetic_export(rows)
+        xlsx = to_bytes(df, "xlsx")
+        cases = [
+            ("openpyxl 全列", lambda: read_table_bytes(xlsx, engine="openpyxl")),
+            ("openpyxl 只读映射列", lambda: read_table_bytes(xlsx, usecols=projection, engine="openpyxl")),
+        ]
+        if CALAMINE_AVAILABLE:
+            cases += [
+                ("calamine 全列", lambda: read_table_bytes(xlsx, engine="calamine")),
+                ("calamine 只读映射列", lambda: read_table_bytes(xlsx, usecols=projection, engine="calamine")),
+            ]
+        csv = to_bytes(df, "csv")
+        cases.append(("CSV 只读映射列", lambda: read_table_bytes(csv, usecols=projection)))
+        try:
+            parquet = to_bytes(df, "parquet")
+            cases.append(("Parquet 只读映射列", lambda: read_table_bytes(parquet, usecols=projection)))
+        except ImportError:
+            pass
+
+        baseline = None
+        for label, func in cases:
+            seconds = best_of(repeat, func)
+            baseline = baseline or seconds
+            print(f"{rows:>8}  {label:<28} {seconds:>9.3f} {baseline / seconds:>11.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="订单表读取基准")
+    parser.add_argument("--rows", type=int, nargs="+", default=[20000, 50000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.rows, args.repeat)
@@ -0,0 +1,177 @@
+"""
+操，OCR 引擎横向对比：拿一个文件夹的手写表格照片，每个能用的引擎 (阿里云 / Tesseract / PaddleOCR) 各认一遍，
+比耗时和准确率，决定 config.OCR_BACKEND_CHAIN 怎么排。
+
+文件夹里放图片 (png/jpg/jpeg/bmp)，想算准确率就在旁边放同名的 .txt 当标准答案 (人工核对过的全文)：
+    samples/0301.jpg  samples/0301.txt
+    samples/0302.jpg  samples/0302.txt
+没有 .txt 的图只算耗时。准确率两个：
+    字符准确率 = 1 - 编辑距离 / 标准答案字数 (去掉空白再比，不管换行空格)
+    数字召回率 = 标准答案里的数字 (出租率、房价) 有多少个原样认出来了，计算器主要靠这些
+
+用法 (在仓库根目录):
+    python benchmarks/ocr_backend_bench.py samples/
+    python benchmarks/ocr_backend_bench.py samples/ --backends tesseract paddle --detail
+    python benchmarks/ocr_backend_bench.py samples/ --endpoint 127.0.0.1:8765 --protocol http   # 阿里云换成本地假服务
+
+阿里云密钥先找 .streamlit/secrets.toml，找不到再读环境变量 ALIBABA_CLOUD_ACCESS_KEY_ID / ALIBABA_CLOUD_ACCESS_KEY_SECRET。
+"""
+import argparse
+import os
+import re
+import sys
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import OCR_BACKEND_CHAIN, OCR_ENDPOINT, OCR_PROTOCOL, OCR_PREPROCESS_ENABLED  # noqa: E402
+from ocr_preprocess import prepare_ocr_payload  # noqa: E402
+from ocr_service import (  # noqa: E402
+    OCR_BACKENDS, OCR_BACKEND_LABELS, AliyunBackend, AliyunCredentials, OcrError, load_aliyun_credentials,
+    recognize_bytes
+)
+
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".bmp"}
+NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+
+
+def edit_distance(a, b):
+    """字符级编辑距离，只留一行滚动算，几千字的表格也就一两秒。"""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def char_accuracy(text, truth):
+    text, truth = re.sub(r"\s+", "", text or ""), re.sub(r"\s+", "", truth)
+    if not truth:
+        return np.nan
+    return max(0.0, 1 - edit_distance(text, truth) / len(truth))
+
+
+def number_recall(text, truth):
+    expected = Counter(NUMBER_PATTERN.findall(truth))
+    if not expected:
+        return np.nan
+    found = Counter(NUMBER_PATTERN.findall(text or ""))
+    return sum((expected & found).values()) / sum(expected.values())
+
+
+def load_samples(folder):
+    """返回 [(文件名, 图片字节, 标准答案或 None), ...]，按文件名排序。"""
+    samples = []
+    for path in sorted(Path(folder).iterdir()):
+        if path.suffix.lower() not in IMAGE_SUFFIXES:
+            continue
+        truth_path = path.with_suffix(".txt")
+        truth = truth_path.read_text(encoding="utf-8") if truth_path.exists() else None
+        samples.append((path.name, path.read_bytes(), truth))
+    return samples
+
+
+def aliyun_credentials(endpoint=None, protocol=None):
+    """返回 (密钥, 找不到时的原因)：secrets 里没有就读环境变量，endpoint/protocol 可以覆盖。"""
+    try:
+        credentials = load_aliyun_credentials()
+    except OcrError as e:
+        key_id = os.environ.get("ALIBABA_CLOUD_ACCESS_KEY_ID")
+        key_secret = os.environ.get("ALIBABA_CLOUD_ACCESS_KEY_SECRET")
+        if not key_id or not key_secret:
+            return None, f"{e}\n(或者设环境变量 ALIBABA_CLOUD_ACCESS_KEY_ID / ALIBABA_CLOUD_ACCESS_KEY_SECRET)"
+        credentials = AliyunCredentials(key_id, key_secret, OCR_ENDPOINT, OCR_PROTOCOL)
+    return credentials._replace(endpoint=endpoint or credentials.endpoint, protocol=protocol or credentials.protocol), None
+
+
+def build_backends(names, endpoint=None, protocol=None):
+    """按 names 建引擎，返回 (能用的, [(名字, 用不了的原因), ...])。"""
+    backends, skipped = [], []
+    for name in names:
+        backend = AliyunBackend(*aliyun_credentials(endpoint, protocol)) if name == AliyunBackend.name else OCR_BACKENDS[name]()
+        reason = backend.unavailable_reason()
+        if reason:
+            skipped.append((name, reason))
+        else:
+            backends.append(backend)
+    return backends, skipped
+
+
+def run_bench(samples, backends, preprocess=OCR_PREPROCESS_ENABLED, repeat=1):
+    """每张图预处理一次，每个引擎认 repeat 遍取最快的一次。返回逐张的明细 DataFrame。"""
+    rows = []
+    for name, raw_bytes, truth in samples:
+        prepared = prepare_ocr_payload(raw_bytes, enabled=preprocess)
+        for backend in backends:
+            # 操，单个引擎单独测，不走兜底、不走缓存，不然测的不是它
+            results = [recognize_bytes(prepared.data, (backend,)) for _ in range(repeat)]
+            result = min(results, key=lambda r: (r.error is not None, r.latency))
+            rows.append({
+                "图片": name,
+                "引擎": backend.label,
+                "耗时(秒)": result.latency,
+                "失败": result.error,
+                "字符准确率": char_accuracy(result.text, truth) if truth is not None else np.nan,
+                "数字召回率": number_recall(result.text, truth) if truth is not None else np.nan,
+            })
+    return pd.DataFrame(rows)
+
+
+def summarize(detail):
+    """逐张明细 -> 每个引擎一行：张数、失败、平均/P95 耗时、平均准确率 (失败的按 0 分算)。"""
+    detail = detail.copy()
+    failed = detail["失败"].notna()
+    for col in ["字符准确率", "数字召回率"]:
+        detail.loc[failed & detail[col].isna(), col] = 0.0
+    ok_latency = detail["耗时(秒)"].where(~failed)
+    grouped = detail.assign(成功耗时=ok_latency, 失败数=failed).groupby("引擎", sort=False)
+    return pd.DataFrame({
+        "张数": grouped.size(),
+        "失败": grouped["失败数"].sum(),
+        "平均耗时(秒)": grouped["成功耗时"].mean().round(3),
+        "P95耗时(秒)": grouped["成功耗时"].quantile(0.95).round(3),
+        "字符准确率": grouped["字符准确率"].mean().round(3),
+        "数字召回率": grouped["数字召回率"].mean().round(3),
+    })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OCR 引擎耗时/准确率横向对比")
+    parser.add_argument("folder", help="放样张 (和同名 .txt 标准答案) 的文件夹")
+    parser.add_argument("--backends", nargs="+", default=OCR_BACKEND_CHAIN, choices=list(OCR_BACKEND_LABELS))
+    parser.add_argument("--no-preprocess", action="store_true", help="不做预处理，原图直接认")
+    parser.add_argument("--repeat", type=int, default=1, help="每张图每个引擎认几遍，取最快的")
+    parser.add_argument("--endpoint", help="覆盖阿里云 endpoint，比如 127.0.0.1:8765 (benchmarks/ocr_stub_server.py)")
+    parser.add_argument("--protocol", help="覆盖阿里云 protocol，本地假服务用 http")
+    parser.add_argument("--detail", action="store_true", help="把逐张的结果也打出来")
+    parser.add_argument("--csv", help="逐张明细另存一份 CSV")
+    args = parser.parse_args()
+
+    samples = load_samples(args.folder)
+    if not samples:
+        sys.exit(f"{args.folder} 里没有图片")
+    backends, skipped = build_backends(args.backends, args.endpoint, args.protocol)
+    for name, reason in skipped:
+        print(f"跳过 {OCR_BACKEND_LABELS.get(name, name)}: {reason}")
+    if not backends:
+        sys.exit("没有可用的 OCR 引擎")
+
+    labelled = sum(truth is not None for _, _, truth in samples)
+    print(f"{len(samples)} 张图 ({labelled} 张有标准答案)，引擎: {', '.join(b.label for b in backends)}\n")
+    detail = run_bench(samples, backends, preprocess=not args.no_preprocess, repeat=args.repeat)
+    pd.set_option("display.unicode.east_asian_width", True)
+    print(summarize(detail).to_string())
+    if args.detail:
+        print()
+        print(detail.round(3).to_string(index=False))
+    if args.csv:
+        detail.to_csv(args.csv, index=False, encoding="utf-8-sig")
+        print(f"\n明细已存到 {args.csv}")
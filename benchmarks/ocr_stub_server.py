@@ -0,0 +1,144 @@
+"""
+操，本地假的阿里云 RecognizeGeneral 服务，用来测 ocr_service 的并发上限、限流重试和耗时统计，不花真钱。
+
+返回的 JSON 跟真接口一个样：{"RequestId": ..., "Data": "{\"content\": ...}"}；
+同时在处理的请求超过 --max-inflight，或者按 --throttle-rate 的概率，返回 429 + Code=Throttling.User。
+
+用法 (在仓库根目录):
+    python benchmarks/ocr_stub_server.py --port 8765 --latency 0.3 --max-inflight 2
+    然后在 .streamlit/secrets.toml 的 [aliyun_credentials] 里加上
+        endpoint = "127.0.0.1:8765"
+        protocol = "http"
+
+    python benchmarks/ocr_stub_server.py --bench 40      # 起服务的同时用 ocr_service 打 40 张图，打印统计
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_TEXT = "团队名称: 测试会议团\n到达: 10/17 离开: 10/19\nSTN 10 间 480\nDKN 5 间 520"
+
+
+def make_handler(latency, throttle_rate, max_inflight, text):
+    inflight = {"count": 0}
+    lock = threading.Lock()
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json;charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            with lock:
+                inflight["count"] += 1
+                too_busy = max_inflight and inflight["count"] > max_inflight
+            try:
+                request_id = str(uuid.uuid4()).upper()
+                if too_busy or random.random() < throttle_rate:
+                    self._send_json(429, {
+                        "RequestId": request_id, "Code": "Throttling.User",
+                        "Message": "Request was denied due to user flow control."
+                    })
+                    return
+                time.sleep(latency)
+                data = {"content": text, "height": 1000, "width": 800, "orgHeight": 1000, "orgWidth": 800,
+                        "prism_wnum": len(text.split()), "prism_wordsInfo": []}
+                self._send_json(200, {"RequestId": request_id, "Data": json.dumps(data, ensure_ascii=False)})
+            finally:
+                with lock:
+                    inflight["count"] -= 1
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def run_stub_server(port=8765, latency=0.3, throttle_rate=0.0, max_inflight=0, text=DEFAULT_TEXT):
+    """起一个后台线程跑假服务，返回 server (用完 server.shutdown())。"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(latency, throttle_rate, max_inflight, text))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_test_image(size=(3000, 4000), serial=0):
+    """随便画几行字的大图，模拟手机拍的照片。serial 不同画出来的房价就不同，每张图都不一样。"""
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGB", size, (235, 230, 220))
+    draw = ImageDraw.Draw(image)
+    for row in range(20):
+        y = 600 + row * 120
+        draw.line([(400, y), (2600, y)], fill=(40, 40, 40), width=4)
+        draw.text((450, y + 30), f"STN {row} {480 + serial}.00 #{serial}", fill=(20, 20, 20))
+    buffered = io.BytesIO()
+    image.save(buffered, format="JPEG", quality=95)
+    return buffered.getvalue()
+
+
+def run_bench(port, count):
+    import ocr_service
+    from ocr_service import AliyunBackend, AliyunCredentials, OCR_METRICS, OcrResultCache, recognize_many
+    from utils import DiskCache
+
+    backends = (AliyunBackend(AliyunCredentials("stub-id", "stub-secret", f"127.0.0.1:{port}", "http")),)
+    # 操，每张图都不一样，不然除了第一张全是缓存命中，测的就不是并发了
+    images = [make_test_image(serial=i) for i in range(count)]
+    # 操，不读缓存 (use_cache=False)，写回的也写进临时目录，跑完就删，不往真的 ./.ocr_cache 里塞假结果
+    real_cache = ocr_service.OCR_CACHE
+    with tempfile.TemporaryDirectory(prefix="ocr_bench_") as cache_dir:
+        ocr_service.OCR_CACHE = OcrResultCache(
+            DiskCache(cache_dir, real_cache.disk_cache.max_bytes), real_cache.max_distance,
+            real_cache.pixel_threshold, real_cache.max_changed_pixels, real_cache.index_max
+        )
+        try:
+            start = time.perf_counter()
+            runs = recognize_many(images, backends, use_cache=False)
+            elapsed = time.perf_counter() - start
+        finally:
+            ocr_service.OCR_CACHE = real_cache
+    errors = [run.result.error for run in runs if run.result.error]
+    print(f"{count} 张图，总耗时 {elapsed:.2f}s，失败 {len(errors)} 张")
+    if runs and runs[0].prepared:
+        print(f"  每张 {runs[0].prepared.original_bytes / 1024:,.0f} KB → {runs[0].prepared.prepared_bytes / 1024:,.0f} KB")
+    for key, value in OCR_METRICS.summary().items():
+        print(f"  {key}: {value}")
+    if errors:
+        print(f"  第一个错误: {errors[0]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="假的阿里云 RecognizeGeneral 服务")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.3, help="每个请求处理多久 (秒)")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="随机返回限流的概率")
+    parser.add_argument("--max-inflight", type=int, default=0, help="同时处理超过这么多就限流，0 表示不限")
+    parser.add_argument("--bench", type=int, default=0, help="起服务后用 ocr_service 并发打这么多张图")
+    args = parser.parse_args()
+
+    stub = run_stub_server(args.port, args.latency, args.throttle_rate, args.max_inflight)
+    print(f"假 OCR 服务在 http://127.0.0.1:{args.port}")
+    if args.bench:
+        run_bench(args.port, args.bench)
+        stub.shutdown()
+    else:
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            stub.shutdown()
@@ -11,24 +11,95 @@ TEAM_TYPE_MAP = {
     "WA": "婚宴团"
 }
 DEFAULT_TEAM_TYPE = "旅游团"
-ALL_ROOM_CODES = [
-    "DETN", "DKN", "DQN", "DQS", "DSKN", "DSTN", "DTN", "EKN", "EKS", "ESN", "ESS",
-    "ETN", "ETS", "FSN", "FSB", "FSC", "OTN", "PSA", "PSB", "RSN", "SKN",
-    "SQN", "SQS", "SSN", "SSS", "STN", "STS", "JDEN", "JDKN", "JDKS", "JEKN",
-    "JESN", "JESS", "JETN", "JETS", "JKN", "JLKN", "JTN", "JTS", "PSC", "PSD",
-    "VCKN", "VCKD", "SITN", "JEN", "JIS", "JTIN"
-]
+# 操，批量识别一次最多传这么多张截图
+OCR_BATCH_MAX_FILES = 50
 
-# --- [团队到店统计] 配置 ---
-JINLING_ROOM_TYPES = [
-    'DETN', 'DKN', 'DKS', 'DQN', 'DQS', 'DSKN', 'DSTN', 'DTN',
-    'EKN', 'EKS', 'ESN', 'ESS', 'ETN', 'ETS', 'FSB', 'FSC', 'FSN',
-    'STN', 'STS', 'SKN', 'RSN', 'SQS', 'SQN'
-]
-YATAI_ROOM_TYPES = [
-    'JDEN', 'JDKN', 'JDKS', 'JEKN', 'JESN', 'JESS', 'JETN', 'JETS',
-    'JKN', 'JLKN', 'JTN', 'JTS', 'VCKD', 'VCKN'
-]
+# --- [阿里云OCR服务] 配置 ---
+# 操，两个 OCR 工具共用 ocr_service.py。endpoint/protocol 也可以在 secrets 里覆盖，
+# 比如指到 benchmarks/ocr_stub_server.py 起的本地假服务上压测
+OCR_ENDPOINT = "ocr-api.cn-hangzhou.aliyuncs.com"
+OCR_PROTOCOL = "https"
+# 操，secrets 里按这个顺序找阿里云密钥的段
+OCR_CREDENTIAL_SECTIONS = ["aliyun_credentials", "aliyun"]
+OCR_CONNECT_TIMEOUT_MS = 5000
+OCR_READ_TIMEOUT_MS = 20000
+# 操，同时最多几个 OCR 请求在飞，整个进程共用
+OCR_MAX_CONCURRENCY = 4
+# 操，被限流 (或者 5xx) 的时候最多重试几次，等待时间从 base 开始翻倍，封顶 max
+OCR_MAX_RETRIES = 4
+OCR_BACKOFF_BASE_SECONDS = 0.5
+OCR_BACKOFF_MAX_SECONDS = 8.0
+OCR_JPEG_QUALITY = 95
+
+# --- [OCR引擎] 配置 ---
+# 操，阿里云网慢或者额度用光的时候早报不能停：按这个顺序试，前一个没装/没配/识别失败就换下一个。
+# "aliyun" 阿里云通用文字识别，"tesseract" 本机 Tesseract (要装 tesseract 程序和 chi_sim 语言包)，
+# "paddle" 本机 PaddleOCR CPU 版。没装的引擎自动跳过，页面上也可以只选其中一个
+OCR_BACKEND_CHAIN = ["aliyun", "tesseract", "paddle"]
+OCR_TESSERACT_LANG = "chi_sim+eng"
+# 操，--psm 6 把整张图当一个文本块按行读，手写表格一行一行出来，计算器按行解析正合适
+OCR_TESSERACT_CONFIG = "--psm 6"
+# 操，Windows 上 tesseract.exe 不在 PATH 里就在这写全路径，比如 r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+OCR_TESSERACT_CMD = None
+OCR_PADDLE_LANG = "ch"
+# 操，PaddleOCR 按文字框返回，纵向中心差不到框高的这个比例就算同一行，拼成一行文本
+OCR_PADDLE_LINE_MERGE_RATIO = 0.5
+
+# --- [OCR图片预处理] 配置 ---
+# 操，手机原图动不动 8~12 MB，上传比识别还慢。发之前先：按 EXIF 转正 -> 缩到 OCR 够用的分辨率
+# -> 转灰度 -> 拉对比度 (或者二值化) -> 裁到有字的区域，再用低一点的质量压 JPEG
+OCR_PREPROCESS_ENABLED = True
+OCR_MAX_SIDE = 2048
+# 操，"autocontrast" 拉伸对比度 (手写的推荐这个)，"binarize" 直接黑白，"none" 不动
+OCR_CONTRAST_MODE = "autocontrast"
+OCR_BINARIZE_THRESHOLD = 160
+OCR_CROP_TO_CONTENT = True
+# 操，比这个灰度值暗的算“有字”，裁剪框外面再留一圈边 (按边长的比例)
+OCR_CROP_INK_THRESHOLD = 128
+OCR_CROP_MARGIN_RATIO = 0.03
+# 操，有字的区域比原图的这个比例还小，多半是噪点，就不裁了
+OCR_CROP_MIN_AREA_RATIO = 0.05
+OCR_PREPROCESS_JPEG_QUALITY = 85
+
+# --- [OCR结果缓存] 配置 ---
+# 操，同一张图 (文件一模一样，或者同一张图换了格式/压缩重新存的) 不再花钱调阿里云。两个 OCR 工具共用，
+# 每个引擎的结果分开存；排在后面的引擎兜底识别出来的不存，免得阿里云恢复以后还拿本机识别的结果。
+# 近似的判断分两步：预处理后尺寸一样、dHash (横竖各 16×16，共 512 位) 汉明距离不超过 DHASH_MAX_DISTANCE 的先挑出来，
+# 再逐像素比，灰度差超过 PIXEL_DIFF_THRESHOLD 的像素不超过 MAX_CHANGED_PIXELS 个才算同一张。
+# 别放宽：同一个模板的截图改一个数字也就一百多个像素不一样，放宽了会拿别的订单的识别结果
+OCR_CACHE_DIR = "./.ocr_cache"
+OCR_CACHE_MAX_MB = 64
+OCR_CACHE_TTL_HOURS = 72
+# 操，按 512 位算的：同一张图重新压缩/换格式一般差 10 位以内，换了版面的差七八十位
+OCR_CACHE_DHASH_MAX_DISTANCE = 64
+OCR_CACHE_PIXEL_DIFF_THRESHOLD = 96
+OCR_CACHE_MAX_CHANGED_PIXELS = 16
+# 操，近似查找的索引最多记这么多张，多了丢最老的
+OCR_CACHE_INDEX_MAX = 2000
+
+# --- [房型目录] 配置 ---
+# 操，所有工具共用这一份房型目录：楼栋 -> 房型代码。OCR、团队到店统计、数据分析都从这里拿。
+# 以前三个地方各写一份，互相对不上 (OTN/PSA/PSB/SSN/SSS/PSC/PSD/DKS 各缺一边)，现在合成一份
+BUILDING_JINLING = "金陵楼"
+BUILDING_YATAI = "亚太楼"
+BUILDING_OTHER = "其他楼"
+ROOM_CATALOGUE = {
+    BUILDING_JINLING: [
+        'DETN', 'DKN', 'DKS', 'DQN', 'DQS', 'DSKN', 'DSTN', 'DTN',
+        'EKN', 'EKS', 'ESN', 'ESS', 'ETN', 'ETS', 'FSB', 'FSC', 'FSN',
+        'OTN', 'PSA', 'PSB', 'RSN', 'SKN', 'SQN', 'SQS', 'SSN', 'SSS', 'STN', 'STS'
+    ],
+    BUILDING_YATAI: [
+        'JDEN', 'JDKN', 'JDKS', 'JEKN', 'JESN', 'JESS', 'JETN', 'JETS',
+        'JKN', 'JLKN', 'JTN', 'JTS', 'PSC', 'PSD', 'VCKD', 'VCKN'
+    ],
+    # 操，OCR 单子上会出现、但不算进哪栋楼的
+    None: ['SITN', 'JEN', 'JIS', 'JTIN'],
+}
+# 操，老名字留着，从目录里生成
+JINLING_ROOM_TYPES = ROOM_CATALOGUE[BUILDING_JINLING]
+YATAI_ROOM_TYPES = ROOM_CATALOGUE[BUILDING_YATAI]
+ALL_ROOM_CODES = [code for codes in ROOM_CATALOGUE.values() for code in codes]
 
 # --- [携程审单 & 对日期] 配置 ---
 CTRIP_AUDIT_COLUMN_MAP_CTRIP = {
@@ -85,6 +156,56 @@ CTRIP_PDF_SYSTEM_COLUMN_MAP = {
     '第三方预订号': ['第三方预定号', '第三方预订号']
 }
 
+# --- [数据分析] 配置 ---
+# 操，在住价格分布矩阵默认的价格区间，写法见 price_bands.py
+DEFAULT_PRICE_BANDS = {
+    BUILDING_JINLING: "<401, 401-480, 481-500, 501-550, 551-599, >599",
+    BUILDING_YATAI: "<501, 501-600, 601-699, 700-749, 750-799, >799",
+}
+# 操，住店日期按范围看的时候的默认跨度和上限 (天)
+STAY_RANGE_DEFAULT_DAYS = 30
+STAY_ROLLING_DEFAULT_DAYS = 90
+STAY_RANGE_MAX_DAYS = 731
+# 操，pickup 对比读系统订单用的列名映射，预订号用来对上两份快照里的同一个预订
+PICKUP_COLUMN_MAP = {
+    '预订号': ['预订号', '预定号'],
+    '状态': ['状态', 'STATUS'],
+    '房类': ['房类', '房型', 'ROOM CATEGORY'],
+    '房数': ['房数', 'ROOMS'],
+    '到达': ['到达', 'ARRIVAL'],
+    '离开': ['离开', 'DEPARTURE'],
+    '房价': ['房价', 'RATE'],
+    '市场码': ['市场码', 'MARKET']
+}
+
+# --- [解析缓存] 配置 ---
+# 操，重复上传的邮件/PDF按内容哈希缓存解析结果，目录超过这个大小就按最近最少使用清理
+PARSE_CACHE_DIR = "./.parse_cache"
+PARSE_CACHE_MAX_MB = 256
+
+# --- [系统订单导入] 配置 ---
+# 操，上传的订单 Excel 按内容哈希只解析一次，读进来统一按下面这些列转类型，其余列一律保持文本
+ORDER_EXPORT_ID_COLS = ['预订号', '预定号', '第三方预定号', '第三方预订号', '订单号', '确认号']
+ORDER_EXPORT_CATEGORY_COLS = ['状态', '房类', '市场码']
+ORDER_EXPORT_DATE_COLS = ['到达', '离开']
+ORDER_EXPORT_NUMERIC_COLS = ['房价', '房数']
+ORDER_EXPORT_CACHE_ENTRIES = 16
+# 操，读 Excel 用哪个引擎："auto" 装了 python-calamine 就用 calamine (Rust写的，快好几倍)，没装就用 openpyxl
+EXCEL_READ_ENGINE = "auto"
+# 操，给了列名映射的时候只解码映射里提到的列，其他几十列直接不读
+ORDER_EXPORT_PROJECT_COLUMNS = True
+# 操，CSV 按这个顺序试编码
+CSV_ENCODINGS = ['utf-8-sig', 'gb18030']
+# 操，订单表上传框接受的格式，Excel 以外 CSV 和 Parquet 也直接认
+ORDER_EXPORT_UPLOAD_TYPES = ["xlsx", "xls", "csv", "parquet"]
+
+# --- [系统订单快照] 配置 ---
+# 操，上传过的订单表存成带日期的 Parquet 快照，各个页面可以直接下拉选，不用再传再解析
+# 超过保留天数或者超过个数上限的老快照自动删掉
+SNAPSHOT_DIR = "./.order_snapshots"
+SNAPSHOT_RETENTION_DAYS = 14
+SNAPSHOT_MAX_FILES = 30
+
 # --- [常用话术] 配置 ---
 COMMON_PHRASES = [
     "CA RM TO CREDIT FM",
@@ -0,0 +1,111 @@
+import io
+import time
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from config import (
+    OCR_JPEG_QUALITY, OCR_MAX_SIDE, OCR_CONTRAST_MODE, OCR_BINARIZE_THRESHOLD, OCR_CROP_TO_CONTENT,
+    OCR_CROP_INK_THRESHOLD, OCR_CROP_MARGIN_RATIO, OCR_CROP_MIN_AREA_RATIO, OCR_PREPROCESS_JPEG_QUALITY
+)
+
+# ==============================================================================
+# --- [OCR图片预处理] ---
+# ==============================================================================
+# 操，发给 OCR 之前把图片瘦身：转正、缩小、灰度、拉对比度、裁到有字的地方。
+# 每一步都在 Pillow 里做，不引别的库；返回的 PreparedImage 带着压缩前后的字节数和耗时，页面上直接显示。
+
+# data: 发给 OCR 的 JPEG 字节；original_bytes/prepared_bytes: 上传的原文件和处理后的大小；
+# size: 处理后的 (宽, 高)；seconds: 预处理耗时；dhash: 处理后图片的差值哈希 (默认 hash_size=16，横竖各比一次，共 2×16² = 512 位)，查近似缓存用
+PreparedImage = namedtuple('PreparedImage', ['data', 'original_bytes', 'prepared_bytes', 'size', 'seconds', 'dhash'])
+# 操，找裁剪框不用全尺寸，在这么大的缩略图上找完再按比例放回去；一行/一列里墨迹超过这个比例才算有字
+CROP_PROBE_SIDE = 512
+CROP_MIN_INK_FRACTION = 0.01
+
+def encode_jpeg(image, quality=OCR_JPEG_QUALITY):
+    """PIL 图片转成 JPEG 字节，RGBA/P 之类的先转 RGB。"""
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    buffered = io.BytesIO()
+    image.save(buffered, format="JPEG", quality=quality)
+    return buffered.getvalue()
+
+def downscale(image, max_side=OCR_MAX_SIDE):
+    """最长边超过 max_side 就等比缩小，本来就小的不放大。"""
+    if max(image.size) <= max_side:
+        return image
+    image = image.copy()
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    return image
+
+def normalize_contrast(gray, mode=OCR_CONTRAST_MODE, threshold=OCR_BINARIZE_THRESHOLD):
+    if mode == "autocontrast":
+        return ImageOps.autocontrast(gray, cutoff=1)
+    if mode == "binarize":
+        return ImageOps.autocontrast(gray, cutoff=1).point(lambda p: 255 if p >= threshold else 0)
+    return gray
+
+def content_bbox(gray, ink_threshold=OCR_CROP_INK_THRESHOLD, margin_ratio=OCR_CROP_MARGIN_RATIO, min_area_ratio=OCR_CROP_MIN_AREA_RATIO):
+    """
+    操，找有字的区域：比 ink_threshold 暗的像素当墨迹，按块缩到 CROP_PROBE_SIDE 左右 (块里有墨迹就算有)，
+    墨迹占比超过 CROP_MIN_INK_FRACTION 的行/列才算数，零星噪点就被滤掉了，细表格线也不会丢。
+    取这些行列的外框按比例放回原图再加一圈边；找不到或者框小得离谱的时候返回 None (不裁)。
+    """
+    factor = max(1, -(-max(gray.size) // CROP_PROBE_SIDE))
+    ink = np.asarray(gray.point(lambda p: 255 if p < ink_threshold else 0).reduce(factor)) > 0
+    rows = np.flatnonzero(ink.mean(axis=1) > CROP_MIN_INK_FRACTION)
+    cols = np.flatnonzero(ink.mean(axis=0) > CROP_MIN_INK_FRACTION)
+    if not rows.size or not cols.size:
+        return None
+    width, height = gray.size
+    left, right = cols[0] * factor, min((cols[-1] + 1) * factor, width)
+    top, bottom = rows[0] * factor, min((rows[-1] + 1) * factor, height)
+    if (right - left) * (bottom - top) < min_area_ratio * width * height:
+        return None
+    margin_x, margin_y = int(width * margin_ratio), int(height * margin_ratio)
+    return max(left - margin_x, 0), max(top - margin_y, 0), min(right + margin_x, width), min(bottom + margin_y, height)
+
+def dhash(image, hash_size=16):
+    """
+    操，差值哈希：缩成 (hash_size+1) × (hash_size+1) 的灰度图，每个像素跟右边、跟下边的各比一次大小，
+    拼成一个 2 × hash_size² 位的整数。横竖都比，表格的横线竖线都算进去。
+    重新截图、轻微缩放/压缩的同一张图哈希差不了几位。
+    """
+    small = np.asarray(ImageOps.grayscale(image).resize((hash_size + 1, hash_size + 1), Image.BILINEAR), dtype=np.int16)
+    horizontal = small[:hash_size, 1:] > small[:hash_size, :-1]
+    vertical = small[1:, :hash_size] > small[:-1, :hash_size]
+    return int.from_bytes(np.packbits(np.concatenate([horizontal.ravel(), vertical.ravel()])).tobytes(), "big")
+
+def hamming_distance(hash_a, hash_b):
+    return bin(hash_a ^ hash_b).count("1")
+
+def count_changed_pixels(payload_a, payload_b, threshold):
+    """两份发给 OCR 的 JPEG 解码后逐像素比，返回灰度差超过 threshold 的像素个数；尺寸不一样返回 None。"""
+    pixels_a = np.asarray(ImageOps.grayscale(Image.open(io.BytesIO(payload_a))), dtype=np.int16)
+    pixels_b = np.asarray(ImageOps.grayscale(Image.open(io.BytesIO(payload_b))), dtype=np.int16)
+    if pixels_a.shape != pixels_b.shape:
+        return None
+    return int(np.count_nonzero(np.abs(pixels_a - pixels_b) > threshold))
+
+def prepare_ocr_payload(raw_bytes, enabled=True, crop=OCR_CROP_TO_CONTENT):
+    """
+    操，上传的原始字节 -> 发给 OCR 的 JPEG。enabled=False 的时候跟以前一样：只按 EXIF 转正，原分辨率 quality 95。
+    """
+    start = time.perf_counter()
+    image = Image.open(io.BytesIO(raw_bytes))
+    if enabled:
+        # 操，JPEG 解码的时候直接按 1/2、1/4 缩小并解成灰度，比先解全尺寸彩色再缩快好几倍
+        image.draft("L", (OCR_MAX_SIDE, OCR_MAX_SIDE))
+    image = ImageOps.exif_transpose(image)
+    if enabled:
+        image = downscale(image)
+        image = normalize_contrast(ImageOps.grayscale(image))
+        if crop:
+            bbox = content_bbox(image)
+            if bbox:
+                image = image.crop(bbox)
+        data = encode_jpeg(image, OCR_PREPROCESS_JPEG_QUALITY)
+    else:
+        data = encode_jpeg(image, OCR_JPEG_QUALITY)
+    return PreparedImage(data, len(raw_bytes), len(data), image.size, time.perf_counter() - start, dhash(image))
@@ -0,0 +1,571 @@
+import importlib.util
+import io
+import json
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import namedtuple, deque, Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+import streamlit as st
+from PIL import Image
+
+from config import (
+    OCR_ENDPOINT, OCR_PROTOCOL, OCR_CREDENTIAL_SECTIONS, OCR_CONNECT_TIMEOUT_MS, OCR_READ_TIMEOUT_MS,
+    OCR_MAX_CONCURRENCY, OCR_MAX_RETRIES, OCR_BACKOFF_BASE_SECONDS, OCR_BACKOFF_MAX_SECONDS, OCR_PREPROCESS_ENABLED,
+    OCR_CACHE_DIR, OCR_CACHE_MAX_MB, OCR_CACHE_TTL_HOURS, OCR_CACHE_DHASH_MAX_DISTANCE,
+    OCR_CACHE_PIXEL_DIFF_THRESHOLD, OCR_CACHE_MAX_CHANGED_PIXELS, OCR_CACHE_INDEX_MAX,
+    OCR_BACKEND_CHAIN, OCR_TESSERACT_LANG, OCR_TESSERACT_CONFIG, OCR_TESSERACT_CMD, OCR_PADDLE_LANG,
+    OCR_PADDLE_LINE_MERGE_RATIO
+)
+from ocr_preprocess import prepare_ocr_payload, hamming_distance, count_changed_pixels
+from utils import DiskCache, content_hash
+
+# --- 操，阿里云 SDK 是可选的，没装的时候调用直接报 OcrError ---
+try:
+    from alibabacloud_ocr_api20210707.client import Client as OcrClient
+    from alibabacloud_tea_openapi import models as open_api_models
+    from alibabacloud_ocr_api20210707 import models as ocr_models
+    ALIYUN_SDK_AVAILABLE = True
+except ImportError:
+    ALIYUN_SDK_AVAILABLE = False
+
+# --- 操，本机引擎也是可选的。pytesseract 只是个壳，还得装 tesseract 程序，真能不能用在 unavailable_reason 里查 ---
+try:
+    import pytesseract
+    TESSERACT_AVAILABLE = True
+except ImportError:
+    TESSERACT_AVAILABLE = False
+
+# 操，paddleocr 一 import 就把 paddle 整个拉起来，好几秒，所以这里只看装没装，第一次识别的时候才真 import
+PADDLE_AVAILABLE = importlib.util.find_spec("paddleocr") is not None
+
+# ==============================================================================
+# --- [阿里云OCR] 共用服务 ---
+# ==============================================================================
+# 操，两个 OCR 工具以前每点一次按钮就新建一个 OcrClient，然后同步调一次 recognize_general。
+# 现在：同一套密钥/endpoint 只建一个客户端；请求丢进进程共用的线程池，池子大小就是并发上限；
+# 被限流就按指数退避 (带抖动) 重试；每次调用的耗时、尝试次数都记到 OCR_METRICS 里。
+# 阿里云只是其中一个引擎 (OcrBackend)，本机的 Tesseract / PaddleOCR 也是，按 OCR_BACKEND_CHAIN 的顺序兜底。
+
+# 操，这些错误码/HTTP 状态码算“等一会儿再试”，别的错误直接失败
+THROTTLING_CODE_PREFIXES = ("Throttling", "ServiceUnavailable")
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# 操，dHash 挑出来的候选最多逐像素验这么多张
+CACHE_VERIFY_CANDIDATES = 3
+METRICS_WINDOW = 500
+
+AliyunCredentials = namedtuple('AliyunCredentials', ['access_key_id', 'access_key_secret', 'endpoint', 'protocol'])
+# text: 识别出的全文；latency: 含重试、含兜底的总耗时 (秒)；attempts: 调了几次；error: 失败原因，成功是 None；
+# backend: 最后是哪个引擎识别出来的 (名字，比如 "tesseract")；fallbacks: 前面失败了的引擎 [(名字, 失败原因), ...]
+OcrResult = namedtuple('OcrResult', ['text', 'latency', 'attempts', 'error', 'backend', 'fallbacks'])
+# 一张上传图片从预处理到识别完的全过程：prepared 是 PreparedImage (完全命中缓存的时候是 None)，
+# latency 是端到端耗时 (秒)，cache_hit 是 None / CACHE_HIT_EXACT / CACHE_HIT_SIMILAR
+OcrRun = namedtuple('OcrRun', ['prepared', 'result', 'latency', 'cache_hit'])
+CACHE_HIT_EXACT = "完全相同"
+CACHE_HIT_SIMILAR = "近似图片"
+
+class OcrError(Exception):
+    """OCR 调用失败 (没装 SDK、没配密钥、API 返回错误)，消息直接给用户看。"""
+
+class OcrThrottledError(OcrError):
+    """被限流或者服务端临时不可用，可以重试。"""
+
+def load_aliyun_credentials(sections=OCR_CREDENTIAL_SECTIONS):
+    """
+    操，从 st.secrets 里按顺序找阿里云密钥，两个工具以前各读各的段，现在哪个段有就用哪个。
+    段里还可以写 endpoint / protocol 覆盖 config 里的默认值。找不到抛 OcrError。
+    """
+    for section in sections:
+        try:
+            secret = st.secrets[section]
+        except (KeyError, FileNotFoundError, AttributeError):
+            continue
+        access_key_id = secret.get("access_key_id")
+        access_key_secret = secret.get("access_key_secret")
+        if not access_key_id or not access_key_secret:
+            raise OcrError(f"错误：.streamlit/secrets.toml 里 [{section}] 的 access_key_id 或 access_key_secret 是空的！")
+        return AliyunCredentials(
+            access_key_id, access_key_secret,
+            secret.get("endpoint", OCR_ENDPOINT), secret.get("protocol", OCR_PROTOCOL)
+        )
+    raise OcrError(
+        "错误：没在 .streamlit/secrets.toml 里找到阿里云密钥！请添加：\n\n"
+        f"[{sections[0]}]\naccess_key_id = \"YOUR_KEY_ID\"\naccess_key_secret = \"YOUR_KEY_SECRET\"\n"
+    )
+
+@lru_cache(maxsize=8)
+def get_ocr_client(credentials):
+    """操，每套 (密钥, endpoint, protocol) 只建一个客户端，进程里一直复用。"""
+    if not ALIYUN_SDK_AVAILABLE:
+        raise OcrError("错误：阿里云 SDK 未安装。请运行 'pip install alibabacloud_ocr_api20210707' 进行安装。")
+    config = open_api_models.Config(
+        access_key_id=credentials.access_key_id,
+        access_key_secret=credentials.access_key_secret,
+        endpoint=credentials.endpoint,
+        protocol=credentials.protocol,
+        connect_timeout=OCR_CONNECT_TIMEOUT_MS,
+        read_timeout=OCR_READ_TIMEOUT_MS
+    )
+    return OcrClient(config)
+
+def _status_code(error):
+    status = getattr(error, "statusCode", None)
+    data = getattr(error, "data", None)
+    if status is None and isinstance(data, dict):
+        status = data.get("statusCode")
+    return status
+
+def _is_retryable(error):
+    code = str(getattr(error, "code", "") or "")
+    return code.startswith(THROTTLING_CODE_PREFIXES) or _status_code(error) in RETRYABLE_STATUS_CODES
+
+def _call_recognize_general(client, image_bytes):
+    """调一次 RecognizeGeneral，返回识别出的全文。限流抛 OcrThrottledError，别的错误抛 OcrError。"""
+    request = ocr_models.RecognizeGeneralRequest(body=io.BytesIO(image_bytes))
+    try:
+        response = client.recognize_general(request)
+    except Exception as e:
+        if _is_retryable(e):
+            raise OcrThrottledError(f"阿里云 OCR 限流或暂时不可用: {getattr(e, 'message', e)}") from e
+        raise OcrError(f"调用阿里云 OCR API 失败: {getattr(e, 'message', e)}") from e
+
+    if response.status_code in RETRYABLE_STATUS_CODES:
+        raise OcrThrottledError(f"阿里云 OCR 限流或暂时不可用 (Code: {response.status_code})")
+    if response.status_code == 200 and response.body and response.body.data:
+        content = json.loads(response.body.data).get('content', '')
+        if not content:
+            raise OcrError("阿里云 OCR API 返回了空内容。")
+        return content
+    error_message = getattr(response.body, 'message', None) or '无详细信息'
+    raise OcrError(f"阿里云 OCR API 返回错误 (Code: {response.status_code}): {error_message}")
+
+def backoff_delay(attempt, base=OCR_BACKOFF_BASE_SECONDS, cap=OCR_BACKOFF_MAX_SECONDS):
+    """第 attempt 次重试前等多久：base * 2^attempt 封顶 cap，再乘 0.5~1 的随机抖动，免得一起重试又一起被限流。"""
+    return min(cap, base * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+# ==============================================================================
+# --- [OCR引擎] 阿里云 / 本机 Tesseract / 本机 PaddleOCR ---
+# ==============================================================================
+# 操，每个引擎就两件事：unavailable_reason() 说清楚现在为啥用不了 (能用返回 None)，
+# recognize(image_bytes) 把预处理好的 JPEG 认成按行分开的全文。失败抛 OcrError，限流抛 OcrThrottledError (会退避重试)。
+
+class OcrBackend(ABC):
+    name = ""
+    label = ""
+
+    @property
+    def cache_id(self):
+        """缓存键里用的引擎身份：同一个 cache_id 认出来的结果才能互相顶替。"""
+        return self.name
+
+    def unavailable_reason(self):
+        return None
+
+    @abstractmethod
+    def recognize(self, image_bytes):
+        """预处理好的 JPEG 字节 -> 按行分开的全文。"""
+
+class AliyunBackend(OcrBackend):
+    name = "aliyun"
+    label = "阿里云 OCR"
+
+    def __init__(self, credentials=None, credential_error=None):
+        # 操，credentials 没有的时候 credential_error 是 load_aliyun_credentials 报的错，原样给用户看
+        self.credentials = credentials
+        self.credential_error = credential_error
+
+    @property
+    def cache_id(self):
+        # 操，换了 endpoint (本地假服务) 或者换了账号认出来的不能混进真阿里云的缓存，带上这俩的哈希
+        if self.credentials is None:
+            return self.name
+        identity = f"{self.credentials.protocol}://{self.credentials.endpoint}|{self.credentials.access_key_id}"
+        return f"{self.name}-{content_hash(identity.encode('utf-8'))[:12]}"
+
+    def unavailable_reason(self):
+        if not ALIYUN_SDK_AVAILABLE:
+            return "阿里云 SDK 未安装 (pip install alibabacloud_ocr_api20210707)"
+        if self.credentials is None:
+            return self.credential_error or "没配阿里云密钥"
+        return None
+
+    def recognize(self, image_bytes):
+        return _call_recognize_general(get_ocr_client(self.credentials), image_bytes)
+
+@lru_cache(maxsize=1)
+def _tesseract_languages():
+    if OCR_TESSERACT_CMD:
+        pytesseract.pytesseract.tesseract_cmd = OCR_TESSERACT_CMD
+    return frozenset(pytesseract.get_languages(config=""))
+
+class TesseractBackend(OcrBackend):
+    name = "tesseract"
+    label = "Tesseract (本机)"
+
+    def __init__(self, lang=OCR_TESSERACT_LANG, config=OCR_TESSERACT_CONFIG):
+        self.lang = lang
+        self.config = config
+
+    def unavailable_reason(self):
+        if not TESSERACT_AVAILABLE:
+            return "pytesseract 未安装 (pip install pytesseract)"
+        try:
+            languages = _tesseract_languages()
+        except Exception as e:
+            return f"找不到 tesseract 程序，装上或者在 config.OCR_TESSERACT_CMD 里写路径: {e}"
+        missing = [lang for lang in self.lang.split("+") if lang not in languages]
+        if missing:
+            return f"tesseract 缺语言包: {', '.join(missing)}"
+        return None
+
+    def recognize(self, image_bytes):
+        image = Image.open(io.BytesIO(image_bytes))
+        try:
+            text = pytesseract.image_to_string(
+                image, lang=self.lang, config=self.config, timeout=OCR_READ_TIMEOUT_MS / 1000
+            )
+        except Exception as e:
+            raise OcrError(f"Tesseract 识别失败: {e}") from e
+        # 操，tesseract 会吐一堆空行，去掉，跟阿里云返回的一样一行一段
+        text = "\n".join(line.strip() for line in text.splitlines() if line.strip())
+        if not text:
+            raise OcrError("Tesseract 没认出任何文字。")
+        return text
+
+@lru_cache(maxsize=2)
+def _paddle_engine(lang):
+    from paddleocr import PaddleOCR
+    return PaddleOCR(lang=lang)
+
+def _paddle_boxes(result):
+    """
+    操，PaddleOCR 2.x 返回 [[[框四个点, (文字, 置信度)], ...]] (一页一个列表，没字是 [None])，
+    3.x 返回一页一个结果对象，里面 rec_polys / rec_texts。统一成 [(框四个点, 文字), ...]。
+    """
+    boxes = []
+    for page in result or []:
+        if not page:
+            continue
+        if hasattr(page, "get") and "rec_texts" in page:
+            boxes.extend(zip(page["rec_polys"], page["rec_texts"]))
+        else:
+            boxes.extend((item[0], item[1][0]) for item in page)
+    return boxes
+
+def join_boxes_into_lines(boxes, merge_ratio=OCR_PADDLE_LINE_MERGE_RATIO):
+    """
+    操，按文字框拼回一行一行：按纵向中心排序，跟当前行的中心差不到框高 × merge_ratio 的算同一行，
+    行内按横坐标从左到右用空格连起来。手写表格一格一个框，不拼的话计算器按行解析全乱了。
+    """
+    items = []
+    for points, text in boxes:
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        top, bottom = points[:, 1].min(), points[:, 1].max()
+        items.append(((top + bottom) / 2, max(bottom - top, 1.0), points[:, 0].min(), str(text).strip()))
+    lines = []
+    for center, height, left, text in sorted(items):
+        if not text:
+            continue
+        if lines and abs(center - lines[-1]["center"]) <= max(height, lines[-1]["height"]) * merge_ratio:
+            lines[-1]["words"].append((left, text))
+        else:
+            lines.append({"center": center, "height": height, "words": [(left, text)]})
+    return "\n".join(" ".join(text for _, text in sorted(line["words"])) for line in lines)
+
+class PaddleBackend(OcrBackend):
+    name = "paddle"
+    label = "PaddleOCR (本机 CPU)"
+
+    def __init__(self, lang=OCR_PADDLE_LANG):
+        self.lang = lang
+        # 操，同一个 PaddleOCR 对象多线程同时跑不安全，线程池里排队用
+        self._lock = threading.Lock()
+
+    def unavailable_reason(self):
+        if not PADDLE_AVAILABLE:
+            return "PaddleOCR 未安装 (pip install paddlepaddle paddleocr)"
+        return None
+
+    def recognize(self, image_bytes):
+        pixels = np.asarray(Image.open(io.BytesIO(image_bytes)).convert("RGB"))
+        try:
+            with self._lock:
+                result = _paddle_engine(self.lang).ocr(pixels)
+        except Exception as e:
+            raise OcrError(f"PaddleOCR 识别失败: {e}") from e
+        text = join_boxes_into_lines(_paddle_boxes(result))
+        if not text:
+            raise OcrError("PaddleOCR 没认出任何文字。")
+        return text
+
+OCR_BACKENDS = {backend.name: backend for backend in (AliyunBackend, TesseractBackend, PaddleBackend)}
+OCR_BACKEND_LABELS = {name: backend.label for name, backend in OCR_BACKENDS.items()}
+
+@lru_cache(maxsize=4)
+def _local_backend(name):
+    # 操，本机引擎没状态 (Paddle 的模型也在 _paddle_engine 里缓存)，每种建一个一直复用，锁才管用
+    return OCR_BACKENDS[name]()
+
+def resolve_ocr_backends(names=OCR_BACKEND_CHAIN):
+    """
+    操，按 names 的顺序把能用的引擎建出来，返回 (能用的引擎元组, [(名字, 用不了的原因), ...])。
+    阿里云的密钥在这读 (要 st.secrets)，所以要在页面线程里调，别在线程池里调。
+    """
+    backends, skipped = [], []
+    for name in names:
+        if name not in OCR_BACKENDS:
+            skipped.append((name, "不认识的 OCR 引擎，看 config.OCR_BACKEND_CHAIN"))
+            continue
+        if name == AliyunBackend.name:
+            try:
+                backend = AliyunBackend(load_aliyun_credentials())
+            except OcrError as e:
+                backend = AliyunBackend(credential_error=str(e))
+        else:
+            backend = _local_backend(name)
+        reason = backend.unavailable_reason()
+        if reason:
+            skipped.append((name, reason))
+        else:
+            backends.append(backend)
+    return tuple(backends), skipped
+
+def describe_skipped_backends(skipped):
+    """[(名字, 原因), ...] -> 给页面看的一段话，一个引擎一行。"""
+    return "\n".join(f"- {OCR_BACKEND_LABELS.get(name, name)}：{reason}" for name, reason in skipped)
+
+class OcrMetrics:
+    """操，OCR 调用统计，线程安全。只留最近 METRICS_WINDOW 次的耗时算分位数。"""
+
+    def __init__(self, window=METRICS_WINDOW):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.cache_hits = 0
+        self.fallbacks = 0
+        self.by_backend = Counter()
+
+    def record(self, result):
+        with self._lock:
+            self.calls += 1
+            # 操，换引擎不算重试：每个试过的引擎第一次调用不算
+            tried = len(result.fallbacks) + (0 if result.error else 1)
+            self.retries += max(result.attempts - tried, 0)
+            if result.error:
+                self.failures += 1
+            else:
+                self._latencies.append(result.latency)
+                self.by_backend[result.backend] += 1
+                if result.fallbacks:
+                    self.fallbacks += 1
+
+    def record_cache_hit(self):
+        with self._lock:
+            self.cache_hits += 1
+
+    def summary(self):
+        """返回 {调用次数, 失败次数, 重试次数, 缓存命中, 兜底次数, 各引擎识别张数, 平均/P50/P95 耗时(秒)}，给页面上显示。"""
+        with self._lock:
+            latencies = np.array(self._latencies, dtype=float)
+            summary = {"调用次数": self.calls, "失败次数": self.failures, "重试次数": self.retries, "缓存命中": self.cache_hits,
+                       "兜底次数": self.fallbacks}
+            for name, count in self.by_backend.items():
+                summary[f"{OCR_BACKEND_LABELS.get(name, name)}识别"] = count
+        if latencies.size:
+            summary.update({
+                "平均耗时(秒)": round(float(latencies.mean()), 3),
+                "P50耗时(秒)": round(float(np.percentile(latencies, 50)), 3),
+                "P95耗时(秒)": round(float(np.percentile(latencies, 95)), 3),
+            })
+        return summary
+
+OCR_METRICS = OcrMetrics()
+
+class OcrResultCache:
+    """
+    操，OCR 结果的磁盘缓存，两级：
+    1. 上传文件字节的哈希完全一样 -> 连图片都不用解码，直接返回；
+    2. 预处理后尺寸一样、dHash 接近的先挑出来，再逐像素验一遍，几乎没变的当成同一张 (换了格式、重新压缩)。
+    每条缓存存 (识别文本, 发给 OCR 的 JPEG)，JPEG 是逐像素验的时候用的。
+    近似查找靠一份 {缓存键: (dHash, 是否预处理, 尺寸)} 的索引，跟结果存在同一个 DiskCache 里，过期/淘汰的顺手清掉。
+    预处理开关不同、引擎不同的结果分开存，不串。
+    """
+    INDEX_KEY = "__dhash_index__"
+
+    def __init__(self, disk_cache, max_distance, pixel_threshold, max_changed_pixels, index_max):
+        self.disk_cache = disk_cache
+        self.max_distance = max_distance
+        self.pixel_threshold = pixel_threshold
+        self.max_changed_pixels = max_changed_pixels
+        self.index_max = index_max
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _prefix(backend, preprocess):
+        return f"ocr:{backend}:{int(bool(preprocess))}:"
+
+    def get_exact(self, raw_key, preprocess, backend):
+        entry = self.disk_cache.get(self._prefix(backend, preprocess) + raw_key)
+        return entry[0] if entry else None
+
+    def get_similar(self, prepared, preprocess, backend):
+        with self._lock:
+            index = self.disk_cache.get(self.INDEX_KEY, {})
+        prefix = self._prefix(backend, preprocess)
+        candidates = sorted(
+            (hamming_distance(prepared.dhash, entry_hash), key)
+            for key, (entry_hash, entry_preprocess, entry_size) in index.items()
+            if key.startswith(prefix) and tuple(entry_size) == tuple(prepared.size)
+        )
+        stale_keys = []
+        text = None
+        for distance, key in candidates[:CACHE_VERIFY_CANDIDATES]:
+            if distance > self.max_distance:
+                break
+            entry = self.disk_cache.get(key)
+            if entry is None:
+                stale_keys.append(key)
+                continue
+            changed = count_changed_pixels(entry[1], prepared.data, self.pixel_threshold)
+            if changed is not None and changed <= self.max_changed_pixels:
+                text = entry[0]
+                break
+        if stale_keys:
+            with self._lock:
+                index = self.disk_cache.get(self.INDEX_KEY, {})
+                for key in stale_keys:
+                    index.pop(key, None)
+                self.disk_cache.set(self.INDEX_KEY, index)
+        return text
+
+    def set(self, raw_key, preprocess, backend, prepared, text):
+        key = self._prefix(backend, preprocess) + raw_key
+        self.disk_cache.set(key, (text, prepared.data))
+        with self._lock:
+            index = self.disk_cache.get(self.INDEX_KEY, {})
+            index.pop(key, None)
+            index[key] = (prepared.dhash, bool(preprocess), tuple(prepared.size))
+            while len(index) > self.index_max:
+                index.pop(next(iter(index)))
+            self.disk_cache.set(self.INDEX_KEY, index)
+
+OCR_CACHE = OcrResultCache(
+    DiskCache(OCR_CACHE_DIR, OCR_CACHE_MAX_MB * 1024 * 1024, ttl_seconds=OCR_CACHE_TTL_HOURS * 3600),
+    OCR_CACHE_DHASH_MAX_DISTANCE, OCR_CACHE_PIXEL_DIFF_THRESHOLD, OCR_CACHE_MAX_CHANGED_PIXELS, OCR_CACHE_INDEX_MAX
+)
+
+def _recognize_with_retries(backend, image_bytes, max_retries):
+    """一个引擎认一张图，限流就退避重试。返回 (文本, 调了几次, 失败原因)，成功的时候失败原因是 None。"""
+    attempts = 0
+    while True:
+        attempts += 1
+        try:
+            return backend.recognize(image_bytes), attempts, None
+        except OcrThrottledError as e:
+            if attempts > max_retries:
+                return None, attempts, f"{e} (已重试 {max_retries} 次)"
+            time.sleep(backoff_delay(attempts - 1))
+        except OcrError as e:
+            return None, attempts, str(e)
+        except Exception as e:
+            return None, attempts, f"调用{backend.label}失败: {e}"
+
+def recognize_bytes(image_bytes, backends, max_retries=OCR_MAX_RETRIES):
+    """
+    操，识别一张图 (已经编码好的字节)：按 backends 的顺序试，前一个失败 (限流重试完了也算) 就换下一个。
+    不抛异常，全失败的时候把每个引擎的原因拼在 OcrResult.error 里，所以可以直接丢进线程池跑，不碰任何 st.* 调用。
+    """
+    start = time.perf_counter()
+    attempts = 0
+    fallbacks = []
+    text, backend_name = None, None
+    for backend in backends:
+        text, backend_attempts, error = _recognize_with_retries(backend, image_bytes, max_retries)
+        attempts += backend_attempts
+        if error is None:
+            backend_name = backend.name
+            break
+        fallbacks.append((backend.name, error))
+    if text is not None:
+        error = None
+    elif not backends:
+        error = "没有可用的 OCR 引擎。"
+    elif len(fallbacks) == 1:
+        error = fallbacks[0][1]
+    else:
+        error = "所有 OCR 引擎都失败了：\n" + describe_skipped_backends(fallbacks)
+    result = OcrResult(text, time.perf_counter() - start, attempts, error, backend_name, fallbacks)
+    OCR_METRICS.record(result)
+    return result
+
+@lru_cache(maxsize=1)
+def _ocr_executor():
+    # 操，整个进程就这一个池子，所有页面、所有用户的 OCR 请求加起来也不超过 OCR_MAX_CONCURRENCY 个
+    return ThreadPoolExecutor(max_workers=OCR_MAX_CONCURRENCY, thread_name_prefix="ocr")
+
+def recognize_upload(raw_bytes, backends, preprocess=OCR_PREPROCESS_ENABLED, use_cache=True):
+    """
+    操，上传的原始图片：先查缓存，没有再预处理瘦身、按 backends 的顺序识别，识别成功的写回缓存。返回 OcrRun。
+    缓存只认排第一的引擎 (按 cache_id，阿里云连 endpoint 和账号一起算)：后面的引擎兜底认出来的不存，也不拿它的缓存顶替第一个引擎。
+    图片打不开也不抛异常，写在 result.error 里。use_cache=False 强制重新识别 (结果照样写回缓存)。
+    """
+    start = time.perf_counter()
+    raw_key = content_hash(raw_bytes)
+    primary = backends[0].name if backends else None
+    cache_id = backends[0].cache_id if backends else None
+    use_cache = use_cache and primary is not None
+    if use_cache:
+        text = OCR_CACHE.get_exact(raw_key, preprocess, cache_id)
+        if text is not None:
+            OCR_METRICS.record_cache_hit()
+            return OcrRun(None, OcrResult(text, 0.0, 0, None, primary, []), time.perf_counter() - start, CACHE_HIT_EXACT)
+    try:
+        prepared = prepare_ocr_payload(raw_bytes, enabled=preprocess)
+    except Exception as e:
+        result = OcrResult(None, 0.0, 0, f"图片无法打开或处理: {e}", None, [])
+        return OcrRun(None, result, time.perf_counter() - start, None)
+    if use_cache:
+        text = OCR_CACHE.get_similar(prepared, preprocess, cache_id)
+        if text is not None:
+            OCR_METRICS.record_cache_hit()
+            OCR_CACHE.set(raw_key, preprocess, cache_id, prepared, text) # 操，下次同一个文件直接走完全命中
+            result = OcrResult(text, 0.0, 0, None, primary, [])
+            return OcrRun(prepared, result, time.perf_counter() - start, CACHE_HIT_SIMILAR)
+    result = recognize_bytes(prepared.data, backends)
+    if not result.error and result.backend == primary:
+        OCR_CACHE.set(raw_key, preprocess, cache_id, prepared, result.text)
+    return OcrRun(prepared, result, time.perf_counter() - start, None)
+
+def submit_upload(raw_bytes, backends, preprocess=OCR_PREPROCESS_ENABLED, use_cache=True):
+    """把一张上传图片 (查缓存 + 预处理 + 识别) 整个丢进共用线程池，返回 Future[OcrRun]。预处理也在池子里并发跑。"""
+    return _ocr_executor().submit(recognize_upload, raw_bytes, backends, preprocess, use_cache)
+
+def describe_ocr_run(run):
+    """给页面上显示的一句话：哪个引擎认的 (兜底的说一声前面为啥失败)、字节数省了多少、各步耗时；命中缓存的说一声没调 OCR。"""
+    label = OCR_BACKEND_LABELS.get(run.result.backend, run.result.backend)
+    if run.cache_hit:
+        return f"命中 {label} 的 OCR 缓存 ({run.cache_hit})，没有重新识别，耗时 {run.latency:.2f} 秒。"
+    fallback_note = ""
+    if run.result.fallbacks and not run.result.error:
+        failed = "、".join(OCR_BACKEND_LABELS.get(name, name) for name, _ in run.result.fallbacks)
+        fallback_note = f"{failed} 失败，已改用 {label}。"
+    if run.prepared is None:
+        return f"{fallback_note}端到端耗时 {run.latency:.2f} 秒。"
+    prepared = run.prepared
+    saved_ratio = 1 - prepared.prepared_bytes / prepared.original_bytes if prepared.original_bytes else 0.0
+    return (
+        f"{fallback_note}图片 {prepared.original_bytes / 1024:,.0f} KB → {prepared.prepared_bytes / 1024:,.0f} KB (省 {saved_ratio:.0%})，"
+        f"预处理 {prepared.seconds:.2f} 秒 + {label} {run.result.latency:.2f} 秒 (共请求 {run.result.attempts} 次)，"
+        f"端到端 {run.latency:.2f} 秒。"
+    )
+
+def recognize_many(raw_images, backends, preprocess=OCR_PREPROCESS_ENABLED, use_cache=True):
+    """操，一批上传图片并发预处理 + 识别，OcrRun 按传进来的顺序返回。"""
+    futures = [submit_upload(raw_bytes, backends, preprocess, use_cache) for raw_bytes in raw_images]
+    return [future.result() for future in futures]
@@ -0,0 +1,91 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# ==============================================================================
+# --- [价格区间] 解析 & 分箱 ---
+# ==============================================================================
+# 操，区间写法 (逗号分隔)：
+#   <401      房价 < 401          (开区间)
+#   401-480   401 <= 房价 <= 480  (闭区间)
+#   >599      房价 > 599          (开区间)
+#   500       房价 == 500         (单点)
+# 区间之间不许重叠，空出来的价格归 未分类。
+UNBINNED_LABEL = '未分类'
+TOTAL_LABEL = '每日总计'
+NUMBER_PATTERN = re.compile(r'^\d+(?:\.\d+)?$')
+
+# labels: 按价格从低到高排好的标签；lower/upper: 每个区间换算成闭区间后的上下界
+PriceBands = namedtuple('PriceBands', ['labels', 'lower', 'upper'])
+
+def _parse_number(text, item):
+    text = text.strip()
+    if not NUMBER_PATTERN.match(text):
+        raise ValueError(f"价格区间 '{item}' 里的 '{text}' 不是有效的数字。")
+    return float(text)
+
+def _parse_band(item):
+    """单个区间 -> (标签, 闭区间下界, 闭区间上界)。开区间的边界用 nextafter 挪一个最小浮点步长变成闭区间。"""
+    label = re.sub(r'\s+', '', item)
+    if label.startswith('<'):
+        upper = _parse_number(label[1:], item)
+        return label, -np.inf, np.nextafter(upper, -np.inf)
+    if label.startswith('>'):
+        lower = _parse_number(label[1:], item)
+        return label, np.nextafter(lower, np.inf), np.inf
+    if '-' in label:
+        lower_text, upper_text = label.split('-', 1)
+        lower, upper = _parse_number(lower_text, item), _parse_number(upper_text, item)
+        if lower >= upper:
+            raise ValueError(f"价格区间 '{item}' 无效：下限必须小于上限。")
+        return label, lower, upper
+    value = _parse_number(label, item)
+    return label, value, value
+
+@lru_cache(maxsize=64)
+def parse_price_bands(spec):
+    """
+    操，解析价格区间字符串，同一个字符串只解析一次。
+    返回按价格排好序的 PriceBands；区间重叠或者格式不对抛 ValueError。空字符串返回没有区间的 PriceBands。
+    """
+    bands = [_parse_band(item) for item in (spec or '').split(',') if item.strip()]
+    bands.sort(key=lambda band: (band[1], band[2]))
+    for (label_a, _, upper_a), (label_b, lower_b, _) in zip(bands, bands[1:]):
+        if lower_b <= upper_a:
+            raise ValueError(f"价格区间 '{label_a}' 和 '{label_b}' 重叠了，请修改。")
+    labels = tuple(band[0] for band in bands)
+    lower = np.array([band[1] for band in bands], dtype=float)
+    upper = np.array([band[2] for band in bands], dtype=float)
+    lower.flags.writeable = False
+    upper.flags.writeable = False
+    return PriceBands(labels, lower, upper)
+
+def assign_price_bands(prices, bands):
+    """
+    操，整列房价一次 searchsorted 分箱：先找下界不超过房价的最后一个区间，再看房价有没有超过它的上界。
+    返回标签数组，落在区间空隙里 (或者房价是空) 的给 未分类。
+    """
+    prices = np.asarray(prices, dtype=float)
+    labels = np.full(prices.shape, UNBINNED_LABEL, dtype=object)
+    if not bands.labels:
+        return labels
+    band_index = np.searchsorted(bands.lower, prices, side='right') - 1
+    safe_index = np.clip(band_index, 0, None)
+    inside = (band_index >= 0) & (prices <= bands.upper[safe_index])
+    labels[inside] = np.asarray(bands.labels, dtype=object)[band_index[inside]]
+    return labels
+
+def sum_by_price_band(prices, values, bands):
+    """
+    操，按价格区间把多行加起来：prices 是每行一个房价，values 是 行 × 天 的矩阵 (比如在住房数)。
+    返回 (标签列表，最后一个是 未分类, 区间 × 天 的合计矩阵)。
+    """
+    values = np.asarray(values)
+    label_order = list(bands.labels) + [UNBINNED_LABEL]
+    band_codes = pd.Categorical(assign_price_bands(prices, bands), categories=label_order).codes
+    totals = np.zeros((len(label_order), values.shape[1]), dtype=values.dtype)
+    np.add.at(totals, band_codes, values)
+    return label_order, totals
@@ -1,6 +1,40 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import io
+import os
+import hashlib
+import pickle
+import tempfile
+import datetime
+import re
+import time
+from collections import namedtuple
+from functools import lru_cache
+from config import (
+    PARSE_CACHE_DIR, PARSE_CACHE_MAX_MB,
+    ORDER_EXPORT_ID_COLS, ORDER_EXPORT_CATEGORY_COLS, ORDER_EXPORT_DATE_COLS,
+    ORDER_EXPORT_NUMERIC_COLS, ORDER_EXPORT_CACHE_ENTRIES,
+    EXCEL_READ_ENGINE, ORDER_EXPORT_PROJECT_COLUMNS, CSV_ENCODINGS, ORDER_EXPORT_UPLOAD_TYPES,
+    SNAPSHOT_DIR, SNAPSHOT_RETENTION_DAYS, SNAPSHOT_MAX_FILES,
+    CTRIP_AUDIT_COLUMN_MAP_CTRIP, CTRIP_AUDIT_COLUMN_MAP_SYSTEM, PROMO_CHECKER_COLUMN_MAP,
+    MEITUAN_SYSTEM_COLUMN_MAP, UPGRADE_FINDER_COLUMN_MAP, CTRIP_PDF_SYSTEM_COLUMN_MAP, PICKUP_COLUMN_MAP,
+    ROOM_CATALOGUE, BUILDING_OTHER
+)
+
+# --- 操，可选的 calamine 引擎，装了就用，没装就老老实实用 openpyxl ---
+try:
+    import python_calamine  # noqa: F401
+    CALAMINE_AVAILABLE = True
+except ImportError:
+    CALAMINE_AVAILABLE = False
+
+# --- 操，快照要 pyarrow 写 Parquet，没装就不存快照，其他照常 ---
+try:
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
 
 def check_password():
     """返回 True 如果用户已登录, 否则返回 False."""
@@ -42,35 +76,445 @@ def to_excel(df_dict):
     processed_data = output.getvalue()
     return processed_data
 
-def find_and_rename_columns(df, column_map):
+def content_hash(data):
+    """算上传内容的 SHA-256，当缓存键用。"""
+    return hashlib.sha256(data).hexdigest()
+
+class DiskCache:
     """
-    动态查找并重命名DataFrame的列。
-    首先尝试精确匹配，然后尝试模糊（包含）匹配。
+    按键存 pickle 文件的磁盘缓存，总大小超过上限时按最近最少使用淘汰。
+    读命中会刷新文件的修改时间，淘汰时先删修改时间最早的。
+    给了 ttl_seconds 的话值跟写入时间一起存，过期的读的时候当没有并删掉。
+    """
+    def __init__(self, cache_dir, max_bytes, ttl_seconds=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode('utf-8')).hexdigest() + ".pkl")
+
+    def get(self, key, default=None):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+            if self.ttl_seconds is not None:
+                created, value = value
+                if time.time() - created > self.ttl_seconds:
+                    os.remove(path)
+                    return default
+            os.utime(path) # 操，刷新一下，证明最近用过
+            return value
+        except (OSError, pickle.UnpicklingError, EOFError, TypeError, ValueError):
+            return default
+
+    def set(self, key, value):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # 操，先写临时文件再替换，别让并发读到写了一半的文件
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump((time.time(), value) if self.ttl_seconds is not None else value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".pkl"):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue # 操，别的线程刚删掉了
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total_bytes -= size
+            except OSError:
+                pass
+
+# 操，邮件正文和PDF订单表共用这一个缓存
+PARSE_CACHE = DiskCache(PARSE_CACHE_DIR, PARSE_CACHE_MAX_MB * 1024 * 1024)
+
+# 操，常见的日期格式，检测的时候拿样本挨个试，成功最多的那个用来转整列
+DATE_FORMAT_CANDIDATES = [
+    '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d',
+    '%Y/%m/%d %H:%M:%S', '%Y/%m/%d %H:%M', '%Y/%m/%d',
+    '%y/%m/%d %H:%M:%S', '%y/%m/%d %H:%M', '%y/%m/%d',
+    '%y-%m-%d', '%Y.%m.%d', '%Y年%m月%d日',
+    '%m/%d/%Y %H:%M', '%m/%d/%Y',
+]
+DATE_SAMPLE_SIZE = 200
+# 操，纯数字的日期按原文的位数认：6位当 YYMMDD，8位当 YYYYMMDD (前导0照算)；
+# 其他位数只在 1990~2100 年之间的才当 Excel 序列号 (从1899-12-30开始数天)，剩下的都算转不了
+EXCEL_EPOCH = pd.Timestamp('1899-12-30')
+EXCEL_SERIAL_RANGE = (
+    (pd.Timestamp('1990-01-01') - EXCEL_EPOCH).days,
+    (pd.Timestamp('2101-01-01') - EXCEL_EPOCH).days,
+)
+
+def _parse_numeric_dates(text, numbers):
+    """把纯数字的日期 (YYMMDD / YYYYMMDD / Excel 序列号) 整列转成日期，text 是原文，numbers 是转好的数。"""
+    result = pd.Series(pd.NaT, index=numbers.index, dtype='datetime64[ns]')
+    # 操，Excel 数字单元格按文本读出来可能带个 .0，去掉再数位数
+    digits = text.str.replace(r'\.0+$', '', regex=True)
+
+    yymmdd = digits.str.fullmatch(r'\d{6}')
+    if yymmdd.any():
+        result[yymmdd] = pd.to_datetime(digits[yymmdd], format='%y%m%d', errors='coerce')
+
+    yyyymmdd = digits.str.fullmatch(r'\d{8}')
+    if yyyymmdd.any():
+        result[yyyymmdd] = pd.to_datetime(digits[yyyymmdd], format='%Y%m%d', errors='coerce')
+
+    serial = ~yymmdd & ~yyyymmdd & (numbers >= EXCEL_SERIAL_RANGE[0]) & (numbers < EXCEL_SERIAL_RANGE[1])
+    if serial.any():
+        result[serial] = pd.to_datetime(numbers[serial], unit='D', origin=EXCEL_EPOCH, errors='coerce')
+    return result
+
+def _detect_date_format(sample, formats):
+    """拿一小段样本把每种格式都试一遍，按能转成功的个数从多到少排好返回。"""
+    scored = []
+    for fmt in formats:
+        hits = pd.to_datetime(sample, format=fmt, errors='coerce').notna().sum()
+        if hits:
+            scored.append((hits, fmt))
+    # 操，成功个数一样的按候选顺序来，sorted 是稳定的
+    return [fmt for hits, fmt in sorted(scored, key=lambda item: -item[0])]
+
+def parse_date_column(series, formats=DATE_FORMAT_CANDIDATES, sample_size=DATE_SAMPLE_SIZE):
     """
+    操，整列日期一次性转换，所有工具共用。
+    - 已经是日期类型的直接用；单元格是 datetime/Timestamp 对象的也直接转。
+    - 纯数字的 (含数字字符串) 按原文位数当 YYMMDD / YYYYMMDD，其他位数在 1990~2100 年范围里的当 Excel 序列号，
+      范围外的 (比如一个孤零零的 3) 算转不了。
+    - 其他字符串先拿样本检测格式，用命中最多的格式转整列，剩下转不了的再按次优格式补一遍。
+    返回 (datetime64 的 Series, 有值但转不了的行的布尔掩码)。
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series, pd.Series(False, index=series.index)
+
+    result = pd.Series(pd.NaT, index=series.index, dtype='datetime64[ns]')
+    has_value = series.notna()
+
+    is_datetime_obj = series.map(lambda v: isinstance(v, (pd.Timestamp, datetime.datetime, datetime.date)), na_action='ignore').fillna(False).astype(bool)
+    if is_datetime_obj.any():
+        result[is_datetime_obj] = pd.to_datetime(series[is_datetime_obj], errors='coerce')
+
+    text = series[has_value & ~is_datetime_obj].astype(str).str.strip()
+    text = text[text != '']
+    numbers = pd.to_numeric(text, errors='coerce')
+    is_number = numbers.notna()
+    if is_number.any():
+        result[numbers[is_number].index] = _parse_numeric_dates(text[is_number], numbers[is_number])
+
+    remaining = text[~is_number]
+    if not remaining.empty:
+        for fmt in _detect_date_format(remaining.head(sample_size), formats):
+            parsed = pd.to_datetime(remaining, format=fmt, errors='coerce')
+            result[parsed.index] = result[parsed.index].fillna(parsed)
+            remaining = remaining[parsed.isna()]
+            if remaining.empty:
+                break
+
+    blank = series.astype(str).str.strip().eq('')
+    unparsed = has_value & ~blank & result.isna()
+    return result, unparsed
+
+def _freeze_column_map(column_map):
+    """把 {标准列名: [别名...]} 冻成能当缓存键的元组，顺序不变 (顺序就是优先级)。"""
+    return tuple((standard_name, tuple(possible_names)) for standard_name, possible_names in column_map.items())
+
+# 操，config 里的列名映射 import 的时候就冻好，每次上传不用再转
+_FROZEN_COLUMN_MAPS = {
+    id(column_map): _freeze_column_map(column_map)
+    for column_map in (
+        CTRIP_AUDIT_COLUMN_MAP_CTRIP, CTRIP_AUDIT_COLUMN_MAP_SYSTEM, PROMO_CHECKER_COLUMN_MAP,
+        MEITUAN_SYSTEM_COLUMN_MAP, UPGRADE_FINDER_COLUMN_MAP, CTRIP_PDF_SYSTEM_COLUMN_MAP, PICKUP_COLUMN_MAP
+    )
+}
+
+@lru_cache(maxsize=256)
+def resolve_column_names(headers, frozen_map):
+    """
+    操，只看表头元组算出重命名以后的表头，同样的表头布局第二次直接命中缓存。
+    规则跟以前一样：按映射顺序处理每个标准列，先按别名顺序精确匹配，再按别名顺序、列顺序找包含的，
+    前面改过名的列后面的标准列能看到。返回 (新表头元组, 缺失的标准列元组)。
+    """
+    current = list(headers)
     missing_standard_cols = []
-    for standard_name, possible_names in column_map.items():
-        found_col = None
+    for standard_name, possible_names in frozen_map:
+        present = set(current)
         # 第一步：尝试精确匹配
-        for name in possible_names:
-            if name in df.columns:
-                found_col = name
-                break
+        found_col = next((name for name in possible_names if name in present), None)
         # 第二步：如果精确匹配失败，尝试模糊（包含）匹配
-        if not found_col:
-            for name in possible_names:
-                for col in df.columns:
-                    if name in col:
-                        found_col = col
-                        break
-                if found_col:
-                    break
-        
-        if found_col:
-            if found_col != standard_name:
-                df.rename(columns={found_col: standard_name}, inplace=True)
-        else:
+        if found_col is None:
+            found_col = next((col for name in possible_names for col in current if name in str(col)), None)
+        if found_col is None:
             missing_standard_cols.append(standard_name)
-    return missing_standard_cols
+        elif found_col != standard_name:
+            current = [standard_name if col == found_col else col for col in current]
+    return tuple(current), tuple(missing_standard_cols)
+
+def find_and_rename_columns(df, column_map):
+    """
+    动态查找并重命名DataFrame的列。
+    首先尝试精确匹配，然后尝试模糊（包含）匹配，最后一次性改列名。
+    """
+    frozen_map = _FROZEN_COLUMN_MAPS.get(id(column_map)) or _freeze_column_map(column_map)
+    headers = tuple(df.columns)
+    new_headers, missing_standard_cols = resolve_column_names(headers, frozen_map)
+    if new_headers != headers:
+        df.columns = list(new_headers)
+    return list(missing_standard_cols)
+
+def normalize_order_export(df, column_map=None):
+    """
+    操，把刚读进来的订单表整理成统一格式：列名去空格，按 column_map 重命名，
+    号码列去空格保持文本，状态/房类/市场码转 category，到达/离开转日期，房价/房数转数字。
+    直接改传进来的 df，返回 (df, 缺失的标准列列表)。
+    """
+    df.columns = df.columns.astype(str).str.strip()
+    missing_cols = find_and_rename_columns(df, column_map) if column_map else []
+
+    for col in ORDER_EXPORT_ID_COLS:
+        if col in df.columns:
+            df[col] = df[col].str.strip()
+    for col in ORDER_EXPORT_DATE_COLS:
+        if col in df.columns:
+            df[col], _ = parse_date_column(df[col])
+    for col in ORDER_EXPORT_NUMERIC_COLS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    for col in ORDER_EXPORT_CATEGORY_COLS:
+        if col in df.columns:
+            df[col] = df[col].str.strip().astype('category')
+    return df, missing_cols
+
+def resolve_excel_engine(engine=EXCEL_READ_ENGINE):
+    """把配置里的引擎名翻译成 pandas 认的名字，'auto' 的时候有 calamine 就用 calamine。"""
+    if engine == "auto":
+        return "calamine" if CALAMINE_AVAILABLE else "openpyxl"
+    return engine
+
+def detect_table_format(data):
+    """操，看文件头几个字节判断格式：xlsx (zip)、xls (OLE)、parquet，剩下的当 CSV。"""
+    if data[:4] == b"PAR1":
+        return "parquet"
+    if data[:2] == b"PK":
+        return "xlsx"
+    if data[:8] == b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1":
+        return "xls"
+    return "csv"
+
+def build_column_projection(column_map, keep_cols=()):
+    """
+    操，按列名映射生成一个 usecols 判断函数：列名 (去空格后) 包含任何一个别名就读。
+    find_and_rename_columns 也是先精确再包含，所以这里读进来的列是它可能选中的列的超集，重命名结果不变。
+    """
+    aliases = [alias for names in column_map.values() for alias in names] + list(keep_cols)
+    def wanted(col_name):
+        col_name = str(col_name).strip()
+        return any(alias in col_name for alias in aliases)
+    return wanted
+
+def read_table_bytes(data, usecols=None, engine=EXCEL_READ_ENGINE):
+    """
+    操，所有订单表的底层读取：自动识别 Excel/CSV/Parquet，全部按文本读。
+    usecols 是一个 列名 -> bool 的函数，只解码要用的列。
+    """
+    table_format = detect_table_format(data)
+    if table_format == "parquet":
+        df = pd.read_parquet(io.BytesIO(data))
+        if usecols is not None:
+            df = df[[col for col in df.columns if usecols(col)]]
+        return df.astype(str).where(df.notna())
+    if table_format == "csv":
+        last_error = None
+        for encoding in CSV_ENCODINGS:
+            try:
+                return pd.read_csv(io.BytesIO(data), dtype=str, usecols=usecols, encoding=encoding)
+            except UnicodeDecodeError as e:
+                last_error = e
+        raise last_error
+    # 操，xls 老格式 calamine 也能读，openpyxl 不行，交给 pandas 自己挑
+    excel_engine = resolve_excel_engine(engine)
+    if table_format == "xls" and excel_engine == "openpyxl":
+        excel_engine = None
+    return pd.read_excel(io.BytesIO(data), dtype=str, usecols=usecols, engine=excel_engine)
+
+OrderSnapshot = namedtuple('OrderSnapshot', ['path', 'file_key', 'source_name', 'created'])
+
+class SnapshotStore:
+    """
+    操，系统导出的快照：第一次上传时把全部列 (文本) 存成 Parquet，文件名带时间、内容哈希和原文件名。
+    各工具的列名映射不一样，所以存的是没重命名的原始表，读出来再各自 normalize_order_export。
+    只有系统订单的上传框会存 (load_order_export(snapshot=True))，携程表、活动表之类的不进来，
+    所以下拉框里列出来的全是系统导出。
+    """
+    SUFFIX = ".system.parquet"
+    # 操，老版本什么上传都存、后缀是光秃秃的 .parquet，分不清是不是系统导出，不列出来，清理的时候顺手删掉
+    LEGACY_SUFFIX = ".parquet"
+
+    def __init__(self, snapshot_dir, retention_days, max_files):
+        self.snapshot_dir = snapshot_dir
+        self.retention_days = retention_days
+        self.max_files = max_files
+
+    def _parse(self, filename):
+        # 文件名: 20250102_093000__<内容哈希>__<原文件名>.system.parquet
+        parts = filename[:-len(self.SUFFIX)].split("__", 2)
+        if len(parts) != 3:
+            return None
+        try:
+            created = datetime.datetime.strptime(parts[0], "%Y%m%d_%H%M%S")
+        except ValueError:
+            return None
+        return OrderSnapshot(os.path.join(self.snapshot_dir, filename), parts[1], parts[2], created)
+
+    def list(self):
+        """所有快照，最新的在前。"""
+        if not os.path.isdir(self.snapshot_dir):
+            return []
+        snapshots = [self._parse(name) for name in os.listdir(self.snapshot_dir) if name.endswith(self.SUFFIX)]
+        return sorted([s for s in snapshots if s], key=lambda s: s.created, reverse=True)
+
+    def find(self, file_key):
+        return next((s for s in self.list() if s.file_key == file_key), None)
+
+    def save(self, file_key, df, source_name):
+        if not PYARROW_AVAILABLE or self.find(file_key):
+            return
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        safe_name = re.sub(r'[^\w.-]+', '_', os.path.splitext(source_name or "export")[0])[:60]
+        filename = f"{datetime.datetime.now():%Y%m%d_%H%M%S}__{file_key}__{safe_name}{self.SUFFIX}"
+        fd, tmp_path = tempfile.mkstemp(dir=self.snapshot_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, os.path.join(self.snapshot_dir, filename))
+        except Exception:
+            # 操，列名重复之类的存不了就算了，快照只是加速用的
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        self.cleanup()
+
+    def read(self, snapshot, usecols=None):
+        columns = None
+        if usecols is not None:
+            columns = [name for name in pq.read_schema(snapshot.path).names if usecols(name)]
+        return pd.read_parquet(snapshot.path, columns=columns, memory_map=True)
+
+    def cleanup(self):
+        """删掉超过保留天数的快照，剩下的超过个数上限就从最老的开始删；老版本留下的快照直接删。"""
+        cutoff = datetime.datetime.now() - datetime.timedelta(days=self.retention_days)
+        stale = [s.path for i, s in enumerate(self.list()) if s.created < cutoff or i >= self.max_files]
+        stale += [
+            os.path.join(self.snapshot_dir, name) for name in os.listdir(self.snapshot_dir)
+            if name.endswith(self.LEGACY_SUFFIX) and not name.endswith(self.SUFFIX)
+        ]
+        for path in stale:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+ORDER_SNAPSHOTS = SnapshotStore(SNAPSHOT_DIR, SNAPSHOT_RETENTION_DAYS, SNAPSHOT_MAX_FILES)
+
+@st.cache_data(show_spinner=False, max_entries=ORDER_EXPORT_CACHE_ENTRIES)
+def _load_order_export_cached(file_key, _data, _source_name, column_map, keep_cols, project, snapshot):
+    # 操，全当文本读，号码不会被读成浮点数，类型统一在 normalize_order_export 里转
+    usecols = build_column_projection(column_map, keep_cols) if (column_map and project) else None
+    stored = ORDER_SNAPSHOTS.find(file_key) if PYARROW_AVAILABLE else None
+    if stored:
+        df = ORDER_SNAPSHOTS.read(stored, usecols=usecols)
+    elif _data is None:
+        raise FileNotFoundError("这个快照已经被清理掉了，请重新上传系统订单。")
+    elif snapshot and PYARROW_AVAILABLE:
+        # 操，第一次见到这份系统导出：整表读整表存，以后谁拿快照要什么列都有；再按这次的映射挑列
+        df = read_table_bytes(_data)
+        df.columns = df.columns.astype(str).str.strip()
+        ORDER_SNAPSHOTS.save(file_key, df, _source_name)
+        if usecols is not None:
+            df = df[[col for col in df.columns if usecols(col)]]
+    else:
+        df = read_table_bytes(_data, usecols=usecols)
+    return normalize_order_export(df, column_map)
+
+def load_order_export(source, column_map=None, keep_cols=(), project=ORDER_EXPORT_PROJECT_COLUMNS, snapshot=False):
+    """
+    操，所有工具读订单表都走这里。source 可以是上传的文件，也可以是下拉框里选的 OrderSnapshot。
+    同一份文件按内容哈希只解析一次，之后换页面、再点按钮都直接拿缓存里整理好的表
+    (st.cache_data 每次返回副本，随便改)；重启以后再传同一份文件直接读快照。
+    给了 column_map 时默认只读映射里的列，映射外还要用的列放 keep_cols 里。
+    snapshot=True 只给系统订单的上传框用：第一次上传时顺手存快照；携程表、活动表之类的别传。
+    返回 (df, 缺失的标准列列表)。
+    """
+    if isinstance(source, OrderSnapshot):
+        return _load_order_export_cached(
+            source.file_key, None, source.source_name, column_map, tuple(keep_cols), project, snapshot
+        )
+    data = source.getvalue()
+    return _load_order_export_cached(content_hash(data), data, source.name, column_map, tuple(keep_cols), project, snapshot)
+
+def order_export_input(label, key):
+    """
+    操，系统订单的输入框：上传文件，或者从下拉框里选之前存过的快照 (当天有快照就默认选最新的)。
+    返回上传的文件 / OrderSnapshot / None，直接丢给 load_order_export。
+    """
+    uploaded_file = st.file_uploader(label, type=ORDER_EXPORT_UPLOAD_TYPES, key=key)
+    if uploaded_file is not None:
+        return uploaded_file
+    snapshots = ORDER_SNAPSHOTS.list() if PYARROW_AVAILABLE else []
+    if not snapshots:
+        return None
+    options = [None] + snapshots
+    default_index = 1 if snapshots[0].created.date() == datetime.date.today() else 0
+    return st.selectbox(
+        "或者直接用已保存的系统导出快照",
+        options,
+        index=default_index,
+        format_func=lambda s: "不用快照" if s is None else f"{s.created:%Y-%m-%d %H:%M} · {s.source_name}",
+        key=f"{key}_snapshot"
+    )
+
+# --- 操，房型目录 import 的时候编译一次：代码 -> 楼栋的字典、楼栋的 category 类型 ---
+ROOM_TO_BUILDING = {code: building for building, codes in ROOM_CATALOGUE.items() for code in codes}
+BUILDING_DTYPE = pd.CategoricalDtype([building for building in ROOM_CATALOGUE if building] + [BUILDING_OTHER])
+
+def lookup_buildings(room_types, unknown_codes=None):
+    """
+    操，整列房型代码查楼栋，返回 category 类型的 Series；不归哪栋楼的、目录里没有的都算 其他楼。
+    传了 unknown_codes (Counter) 就把目录里没有的非空代码计数进去，方便提醒更新目录。
+    房型代码先自己去空格/转大写好再传进来。
+    """
+    codes = room_types.astype(str)
+    buildings = codes.map(ROOM_TO_BUILDING).fillna(BUILDING_OTHER).astype(BUILDING_DTYPE)
+    if unknown_codes is not None:
+        is_unknown = ~codes.isin(ROOM_TO_BUILDING.keys()) & (codes != '') & (codes.str.lower() != 'nan')
+        unknown_codes.update(codes[is_unknown].value_counts().to_dict())
+    return buildings
+
+@lru_cache(maxsize=1)
+def room_code_pattern():
+    """操，识别 "房型代码 + 房数" 的正则，只编译一次。长代码排前面，免得短代码抢先匹配。"""
+    alternation = '|'.join(sorted(ROOM_TO_BUILDING, key=len, reverse=True))
+    return re.compile(f'({alternation})\\s*(\\d+)', re.IGNORECASE)
 
 def generate_ticker_html(text):
     """生成一个横向滚动的股票代码式信息栏的HTML和CSS。"""